@@ -0,0 +1,383 @@
+#!/usr/bin/env python3
+"""
+Offline benchmarks for the download, detection and catalog paths.
+
+    python3 -m benchmarks.run --output results.json
+    python3 -m benchmarks.run --baseline results.json --fail-threshold 20
+
+Everything runs against a local HTTP server (benchmarks/server.py) and
+temporary directories, so no network access or root is needed and the
+host's .relay state is left alone. Results are written as JSON; with
+--baseline, every metric is compared against an earlier run. Metrics ending
+in _s are durations (lower is better), metrics ending in _mbps are
+throughputs (higher is better).
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import contextlib
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+from benchmarks.server import BenchmarkServer
+from toolbox.config import load_catalog
+from toolbox.detect import Detector
+from toolbox.download_collections import GalaxyClient, resolve_closure, download_collection, DEFAULT_JOBS, \
+    main as download_collections_main
+from toolbox.http_cache import HTTPCache
+from toolbox.http_client import ConnectionPool
+from toolbox.mirrors import MirrorRankings, MirrorSelector
+from toolbox.state import StateDB
+from toolbox.transfer import download_file, segmented_download
+from toolbox.versions import VersionResolver
+
+RESULTS_VERSION = 1
+MB = 1024 * 1024
+DEFAULT_SIZES = '8,64'
+DEFAULT_LATENCY = 0.02
+DEFAULT_COLLECTIONS = 50
+DEFAULT_TOOLS = 1000
+DEFAULT_REPEAT = 3
+# Tools with a version definition, each with its own release feed
+VERSION_FEEDS = 20
+
+
+def measure(func: Callable[[], Any], repeat: int, setup: Optional[Callable[[], None]] = None) -> float:
+    """Median wall time of func over repeat runs; setup runs untimed before each."""
+    timings = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+@contextlib.contextmanager
+def quiet():
+    """Discards the progress messages the code under test prints."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+def _remove(path: str):
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    elif os.path.exists(path):
+        os.remove(path)
+
+
+def bench_downloads(server: BenchmarkServer, workdir: str, sizes: List[int], latency: float,
+                    repeat: int) -> Dict[str, float]:
+    metrics = {}
+    dest = os.path.join(workdir, 'artifact.bin')
+    pool = ConnectionPool()
+    try:
+        for size_mb in sizes:
+            size = size_mb * MB
+            for ranges in (True, False):
+                url = server.artifact_url(size, ranges=ranges, latency=latency)
+                suffix = f"{size_mb}mb_{'ranges' if ranges else 'noranges'}"
+                for mode, func in (
+                        ('single', lambda: download_file(url, dest, pool=pool, progress=False)),
+                        ('segmented', lambda: segmented_download(url, dest, pool=pool, progress=False))):
+                    def run():
+                        with quiet():
+                            if not func():
+                                raise RuntimeError(f"download of {url} failed")
+                    seconds = measure(run, repeat, setup=lambda: _remove(dest))
+                    metrics[f"download_{mode}_{suffix}_s"] = round(seconds, 4)
+                    metrics[f"download_{mode}_{suffix}_mbps"] = round(size / MB / seconds, 2)
+    finally:
+        pool.close()
+    _remove(dest)
+    return metrics
+
+
+def bench_collections(server: BenchmarkServer, workdir: str, count: int, repeat: int) -> Dict[str, float]:
+    """
+    Resolution and download of count collections, without and with cached
+    metadata, and of their dependency closure, resolved and then locked.
+    """
+    collections = [f"bench.collection{i:04d}" for i in range(count)]
+    output_dir = os.path.join(workdir, 'collections')
+    cache_dir = os.path.join(workdir, 'http-cache')
+
+    def run(cache):
+        # What toolbox.download_collections does with --no-deps, minus the lockfile
+        client = GalaxyClient(server.url, cache=cache)
+        with quiet():
+            closure, failed = resolve_closure(client, collections, DEFAULT_JOBS, dependencies=False)
+            with ThreadPoolExecutor(max_workers=DEFAULT_JOBS) as pool:
+                results = list(pool.map(
+                    lambda item: download_collection(client, item[0], item[1]["download_url"],
+                                                     item[1]["artifact"]["sha256"], output_dir, False),
+                    closure.items()))
+        client.pool.close()
+        if failed or not all(results):
+            raise RuntimeError("collection download failed")
+
+    def reset():
+        _remove(output_dir)
+        _remove(cache_dir)
+        os.makedirs(output_dir)
+
+    metrics = {
+        # The cold runs leave the tarballs and cached metadata the warm runs reuse
+        'collections_cold_s': measure(lambda: run(HTTPCache(cache_dir)), repeat, setup=reset),
+        # Metadata is revalidated (ttl=0) and every tarball is already up to date
+        'collections_warm_revalidate_s': measure(lambda: run(HTTPCache(cache_dir, ttl=0)), repeat),
+        'collections_warm_cached_s': measure(lambda: run(HTTPCache(cache_dir)), repeat),
+    }
+
+    def run_closure():
+        with quiet():
+            download_collections_main(['--output-dir', output_dir, '--galaxy-url', server.url, '--no-cache',
+                                       *collections])
+
+    # The first run resolves the closure and writes the lockfile; the second reuses the lock
+    metrics['collections_closure_resolve_s'] = measure(run_closure, repeat, setup=reset)
+    metrics['collections_closure_locked_s'] = measure(run_closure, repeat)
+    _remove(output_dir)
+    return {key: round(value, 4) for key, value in metrics.items()}
+
+
+def bench_versions(server: BenchmarkServer, workdir: str, repeat: int) -> Dict[str, float]:
+    """Version resolution of VERSION_FEEDS tools: feeds fetched, revalidated, cached, and versions pinned."""
+    tools = [{'name': f"tool{i:03d}", 'version': {'github': f"bench/tool{i:03d}", 'spec': '>=2.0.0', 'default': '2.0.0'}}
+             for i in range(VERSION_FEEDS)]
+    lock_path = os.path.join(workdir, 'versions.lock.json')
+    cache_dir = os.path.join(workdir, 'http-cache')
+
+    def run(ttl, update=True):
+        resolver = VersionResolver(lock_path, cache=HTTPCache(cache_dir, ttl=ttl), github_api=server.url)
+        with quiet():
+            versions = resolver.resolve(tools, update=update)
+        resolver.save()
+        resolver.close()
+        if set(versions.values()) != {'2.1.0'}:
+            raise RuntimeError(f"version resolution failed: {versions}")
+
+    def reset():
+        _remove(lock_path)
+        _remove(cache_dir)
+
+    metrics = {
+        'versions_cold_s': measure(lambda: run(3600), repeat, setup=reset),
+        'versions_warm_revalidate_s': measure(lambda: run(0), repeat),
+        'versions_warm_cached_s': measure(lambda: run(3600), repeat),
+        # Every tool is pinned, so no feed is consulted
+        'versions_locked_s': measure(lambda: run(3600, update=False), repeat),
+    }
+    reset()
+    return {key: round(value, 4) for key, value in metrics.items()}
+
+
+def bench_mirrors(workdir: str, size_mb: int, latency: float, repeat: int) -> Dict[str, float]:
+    """
+    Download from four mirrors: a slow one, a fast one that drops every
+    connection after a third of the file, a healthy one and one answering
+    503. The first run
+    probes them and fails over mid-transfer; later runs start from the
+    stored rankings.
+    """
+    size = size_mb * MB
+    dest = os.path.join(workdir, 'mirrored.bin')
+    rankings_path = os.path.join(workdir, 'mirrors.json')
+    with BenchmarkServer(latency=max(latency, 0.01) * 10) as slow, BenchmarkServer() as flaky, \
+            BenchmarkServer(latency=latency) as healthy, BenchmarkServer() as broken:
+        urls = [slow.artifact_url(size), flaky.artifact_url(size, cut=size // 3),
+                healthy.artifact_url(size), broken.artifact_url(size, fail=503)]
+
+        def run():
+            selector = MirrorSelector(MirrorRankings(rankings_path))
+            with quiet():
+                if not selector.download(urls, dest, progress=False):
+                    raise RuntimeError("mirrored download failed")
+            selector.pool.close()
+
+        def reset():
+            _remove(dest)
+            _remove(rankings_path)
+
+        metrics = {
+            'mirrors_probe_failover_s': measure(run, repeat, setup=reset),
+            'mirrors_ranked_s': measure(run, repeat, setup=lambda: _remove(dest)),
+        }
+    _remove(dest)
+    return {key: round(value, 4) for key, value in metrics.items()}
+
+
+def generate_tools(tools_dir: str, count: int):
+    """Writes count synthetic tool definitions shaped like the ones in tools/."""
+    os.makedirs(tools_dir, exist_ok=True)
+    for i in range(count):
+        name = f"bench-tool-{i:04d}"
+        tool = {
+            "name": name,
+            "description": f"Synthetic tool {i} for benchmarks",
+            "idempotency_check": "true" if i % 2 else "false",
+            "download_steps": [
+                {"type": "shell", "command": f"mkdir -p {{download_dir}}/{name}"},
+                {"type": "http_get", "url": f"https://example.invalid/{name}.tar.gz",
+                 "dest": f"{{download_dir}}/{name}.tar.gz"},
+            ],
+            "install_steps": [
+                {"id": "extract", "type": "extract", "archive": f"{{download_dir}}/{name}.tar.gz", "dest": "/opt/bench"},
+                {"id": "link", "type": "shell", "command": f"ln -sf /opt/bench/{name} /usr/local/bin/{name}",
+                 "after": "extract"},
+            ],
+        }
+        with open(os.path.join(tools_dir, f"{name}.json"), 'w', encoding='utf-8') as f:
+            json.dump(tool, f, indent=4)
+
+
+def bench_catalog(workdir: str, count: int, repeat: int) -> Dict[str, float]:
+    tools_dir = os.path.join(workdir, 'tools')
+    cache_path = os.path.join(workdir, 'catalog.json')
+    generate_tools(tools_dir, count)
+
+    def load():
+        with quiet():
+            catalog = load_catalog(tools_dir, cache_path)
+        if catalog is None or len(catalog) != count:
+            raise RuntimeError("catalog did not load every tool")
+        return catalog
+
+    def load_full():
+        for tool in load().tools:
+            tool['install_steps']
+
+    metrics = {
+        'catalog_compile_s': measure(load, repeat, setup=lambda: _remove(cache_path)),
+        'catalog_cached_s': measure(load, repeat),
+        'catalog_cached_full_access_s': measure(load_full, repeat),
+    }
+    return {key: round(value, 4) for key, value in metrics.items()}
+
+
+def bench_detection(workdir: str, count: int, repeat: int) -> Dict[str, float]:
+    """Startup detection of count tools whose idempotency checks are stubbed with true/false."""
+    tools = [{"name": f"bench-tool-{i:04d}", "idempotency_check": "true" if i % 2 else "false"}
+             for i in range(count)]
+    state_path = os.path.join(workdir, 'state.json')
+
+    def detect(state=None):
+        results = Detector().detect(tools, state)
+        if sum(1 for installed in results.values() if installed) != count // 2:
+            raise RuntimeError("unexpected detection results")
+        if state is not None:
+            state.save()
+
+    detect(StateDB(state_path))  # Records the results the warm runs reuse
+    metrics = {
+        'detect_cold_s': measure(detect, repeat),
+        'detect_warm_s': measure(lambda: detect(StateDB(state_path)), repeat),
+    }
+    return {key: round(value, 4) for key, value in metrics.items()}
+
+
+def compare(baseline: Dict[str, float], current: Dict[str, float], threshold: Optional[float]) -> List[str]:
+    """Prints a comparison table. Returns the metrics that regressed by more than threshold percent."""
+    regressions = []
+    print(f"\n{'Metric':<48} {'Baseline':>12} {'Current':>12} {'Change':>9}")
+    for name in sorted(current):
+        if name not in baseline or not baseline[name]:
+            print(f"{name:<48} {'-':>12} {current[name]:>12} {'new':>9}")
+            continue
+        change = (current[name] - baseline[name]) / baseline[name] * 100
+        # Positive means worse, whatever the direction of the metric
+        worse = -change if name.endswith('_mbps') else change
+        print(f"{name:<48} {baseline[name]:>12} {current[name]:>12} {change:>+8.1f}%")
+        if threshold is not None and worse > threshold:
+            regressions.append(name)
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Offline benchmarks for Relay's download, detection and catalog paths")
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    parser.add_argument("--baseline", help="Compare against the results of an earlier run")
+    parser.add_argument("--fail-threshold", type=float, default=None,
+                        help="With --baseline, exit 1 if a metric got worse by more than this percentage")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES,
+                        help=f"Comma-separated artifact sizes in MB (default: {DEFAULT_SIZES})")
+    parser.add_argument("--latency", type=float, default=DEFAULT_LATENCY,
+                        help=f"Seconds of latency injected per request (default: {DEFAULT_LATENCY})")
+    parser.add_argument("--collections", type=int, default=DEFAULT_COLLECTIONS,
+                        help=f"Number of collections to resolve (default: {DEFAULT_COLLECTIONS})")
+    parser.add_argument("--tools", type=int, default=DEFAULT_TOOLS,
+                        help=f"Number of tools in the generated catalog (default: {DEFAULT_TOOLS})")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT,
+                        help=f"Runs per measurement; the median is reported (default: {DEFAULT_REPEAT})")
+    parser.add_argument("--quick", action="store_true", help="Small sizes and counts for a fast smoke run")
+    args = parser.parse_args(argv)
+
+    if args.quick:
+        args.sizes, args.collections, args.tools, args.repeat = '8', 10, 100, 1
+    sizes = [int(size) for size in args.sizes.split(',') if size.strip()]
+    repeat = max(1, args.repeat)
+
+    metrics: Dict[str, float] = {}
+    workdir = tempfile.mkdtemp(prefix='relay-bench-')
+    try:
+        with BenchmarkServer(latency=args.latency) as server:
+            print("Benchmarking downloads...", file=sys.stderr)
+            metrics.update(bench_downloads(server, workdir, sizes, args.latency, repeat))
+            print("Benchmarking collection resolution...", file=sys.stderr)
+            metrics.update(bench_collections(server, workdir, args.collections, repeat))
+            print("Benchmarking version resolution...", file=sys.stderr)
+            metrics.update(bench_versions(server, workdir, repeat))
+        print("Benchmarking mirror failover...", file=sys.stderr)
+        metrics.update(bench_mirrors(workdir, sizes[0], args.latency, repeat))
+        print("Benchmarking catalog loading...", file=sys.stderr)
+        metrics.update(bench_catalog(workdir, args.tools, repeat))
+        print("Benchmarking detection...", file=sys.stderr)
+        metrics.update(bench_detection(workdir, args.tools, repeat))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    results = {
+        'version': RESULTS_VERSION,
+        'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'config': {'sizes_mb': sizes, 'latency': args.latency, 'collections': args.collections,
+                   'tools': args.tools, 'repeat': repeat},
+        'metrics': metrics,
+    }
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+            f.write("\n")
+        print(f"Results written to {args.output}", file=sys.stderr)
+
+    if not args.baseline:
+        for name in sorted(metrics):
+            print(f"{name:<48} {metrics[name]:>12}")
+        return 0
+
+    with open(args.baseline, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    if baseline.get('config') != results['config']:
+        print("Warning: the baseline was recorded with a different configuration.", file=sys.stderr)
+    regressions = compare(baseline.get('metrics', {}), metrics, args.fail_threshold)
+    if regressions:
+        print(f"\n{len(regressions)} metric(s) regressed by more than {args.fail_threshold}%: "
+              + ", ".join(regressions), file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
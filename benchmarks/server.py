@@ -0,0 +1,252 @@
+"""
+Local HTTP server for offline benchmarks.
+
+Serves synthetic artifacts and a stand-in for the Galaxy API on 127.0.0.1:
+
+    /artifacts/<bytes>?ranges=0|1&latency=<seconds>&fail=<status>&cut=<bytes>
+        deterministic content of the given size, with or without Range
+        support, after an injected delay per request; fail answers with an
+        error status instead, cut drops the connection after that many bytes
+    /artifacts/<bytes>.sha256
+        the sha256 of that artifact, as a checksum file holding a single hash
+    /api/v3/plugin/ansible/content/published/collections/index/<ns>/<name>/
+    /api/v3/plugin/ansible/content/published/collections/index/<ns>/<name>/versions/
+    /api/v3/plugin/ansible/content/published/collections/index/<ns>/<name>/versions/<version>/
+    /download/<ns>-<name>-<version>.tar.gz
+    /repos/<owner>/<repo>/releases
+        a stand-in for GitHub's release listing (RELEASES) for
+        toolbox.versions, with ETag revalidation
+    /api/
+        enough of the Galaxy v3 API for toolbox.download_collections,
+        including ETag revalidation; every collection has the versions in
+        COLLECTION_VERSIONS, and bench.collection<N> depends on an older
+        bench.lib<N % 4>, which depends on bench.core; the tarballs of
+        bench.broken<N> resolve but answer 404
+
+The server runs in a background thread; use it as a context manager.
+"""
+
+import re
+import json
+import time
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+BLOCK = bytes(range(256)) * 4096  # 1 MiB pattern the synthetic content repeats
+COLLECTION_VERSIONS = ('0.9.0', '1.0.0')
+COLLECTION_VERSION = COLLECTION_VERSIONS[-1]
+# (tag, draft, prerelease) of every repository's releases, newest first
+RELEASES = (('v3.0.0', True, False), ('v3.0.0-rc.1', False, True), ('v2.1.0', False, False),
+            ('v2.0.0', False, False), ('v1.9.0', False, False))
+COLLECTION_INDEX = '/api/v3/plugin/ansible/content/published/collections/index/'
+
+
+def synthetic_bytes(offset: int, length: int):
+    """Yields the synthetic content between offset and offset + length in chunks."""
+    end = offset + length
+    while offset < end:
+        start = offset % len(BLOCK)
+        chunk = BLOCK[start:start + min(end - offset, len(BLOCK) - start)]
+        yield chunk
+        offset += len(chunk)
+
+
+def _dependencies(namespace, name):
+    if namespace != 'bench':
+        return {}
+    match = re.fullmatch(r'collection(\d+)', name)
+    if match:
+        return {f"bench.lib{int(match.group(1)) % 4}": '>=0.9.0,<1.0.0'}
+    if name.startswith('lib'):
+        return {'bench.core': '*'}
+    return {}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        parts = urlsplit(self.path)
+        query = {key: values[-1] for key, values in parse_qs(parts.query).items()}
+        latency = float(query.get('latency', self.server.latency))
+        if latency:
+            time.sleep(latency)
+
+        if 'fail' in query:
+            return self._send_json(int(query['fail']), {'detail': 'Injected failure.'})
+        match = re.fullmatch(r'/artifacts/(\d+)\.sha256', parts.path)
+        if match:
+            return self._send_checksum(int(match.group(1)))
+        match = re.fullmatch(r'/artifacts/(\d+)(?:\.\w+)?', parts.path)
+        if match:
+            cut = int(query['cut']) if 'cut' in query else None
+            return self._send_artifact(int(match.group(1)), query.get('ranges', '1') == '1', cut)
+        match = re.fullmatch(r'/repos/([\w.-]+)/([\w.-]+)/releases', parts.path)
+        if match:
+            return self._send_cacheable([{'tag_name': tag, 'draft': draft, 'prerelease': prerelease}
+                                         for tag, draft, prerelease in RELEASES])
+        if parts.path == '/api/':
+            return self._send_json(200, {'available_versions': {'v3': 'v3/'}})
+        if parts.path.startswith(COLLECTION_INDEX):
+            return self._send_galaxy(parts.path[len(COLLECTION_INDEX):])
+        match = re.fullmatch(r'/download/([\w-]+)-([\w-]+)-([\d.]+)\.tar\.gz', parts.path)
+        if match and match.group(2).startswith('broken'):
+            return self._send_json(404, {'detail': 'Not found.'})
+        if match:
+            return self._send_artifact(self.server.collection_size, True)
+        self._send_json(404, {'detail': 'Not found.'})
+
+    def _send_artifact(self, size, ranges, cut=None):
+        start, end = 0, size - 1
+        status = 200
+        header = self.headers.get('Range')
+        if ranges and header:
+            match = re.fullmatch(r'bytes=(\d+)-(\d*)', header.strip())
+            if match:
+                start = int(match.group(1))
+                end = min(int(match.group(2)), size - 1) if match.group(2) else size - 1
+                if start >= size:
+                    self.send_response(416)
+                    self.send_header('Content-Range', f'bytes */{size}')
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                status = 206
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.send_header('Content-Length', str(end - start + 1))
+        if ranges:
+            self.send_header('Accept-Ranges', 'bytes')
+        if status == 206:
+            self.send_header('Content-Range', f'bytes {start}-{end}/{size}')
+        self.end_headers()
+        sent = 0
+        for chunk in synthetic_bytes(start, end - start + 1):
+            if cut is not None and sent + len(chunk) > cut:
+                self.wfile.write(chunk[:cut - sent])
+                self.close_connection = True
+                return
+            self.wfile.write(chunk)
+            sent += len(chunk)
+
+    def _send_checksum(self, size):
+        digest = hashlib.sha256()
+        for chunk in synthetic_bytes(0, size):
+            digest.update(chunk)
+        data = f"{digest.hexdigest()}\n".encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_galaxy(self, path):
+        segments = [s for s in path.split('/') if s]
+        if len(segments) == 2:
+            namespace, name = segments
+            body = {
+                'namespace': namespace,
+                'name': name,
+                'versions_url': f"{COLLECTION_INDEX}{namespace}/{name}/versions/",
+                'highest_version': {'version': COLLECTION_VERSION},
+            }
+        elif len(segments) == 3 and segments[2] == 'versions':
+            namespace, name, _ = segments
+            body = {
+                'meta': {'count': len(COLLECTION_VERSIONS)},
+                'links': {'next': None},
+                'data': [{'version': version, 'href': f"{COLLECTION_INDEX}{namespace}/{name}/versions/{version}/"}
+                         for version in reversed(COLLECTION_VERSIONS)],
+            }
+        elif len(segments) == 4 and segments[2] == 'versions':
+            namespace, name, _, version = segments
+            if version not in COLLECTION_VERSIONS:
+                return self._send_json(404, {'detail': 'Not found.'})
+            body = {
+                'version': version,
+                'download_url': f"/download/{namespace}-{name}-{version}.tar.gz",
+                'artifact': {'sha256': self.server.collection_sha256()},
+                'metadata': {'dependencies': _dependencies(namespace, name)},
+            }
+        else:
+            return self._send_json(404, {'detail': 'Not found.'})
+
+        self._send_cacheable(body)
+
+    def _send_cacheable(self, body):
+        etag = '"%s"' % hashlib.sha1(json.dumps(body, sort_keys=True).encode()).hexdigest()
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        self._send_json(200, body, {'ETag': etag})
+
+    def _send_json(self, status, body, headers=None):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients that only probe for range support close the connection early
+        pass
+
+    def __init__(self, latency, collection_size):
+        super().__init__(('127.0.0.1', 0), _Handler)
+        self.latency = latency
+        self.collection_size = collection_size
+        self._collection_sha256 = None
+        self._lock = threading.Lock()
+
+    def collection_sha256(self):
+        with self._lock:
+            if self._collection_sha256 is None:
+                digest = hashlib.sha256()
+                for chunk in synthetic_bytes(0, self.collection_size):
+                    digest.update(chunk)
+                self._collection_sha256 = digest.hexdigest()
+            return self._collection_sha256
+
+
+class BenchmarkServer:
+    """Runs the benchmark HTTP server in a background thread."""
+
+    def __init__(self, latency: float = 0.0, collection_size: int = 256 * 1024):
+        self.server = _Server(latency, collection_size)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def artifact_url(self, size: int, ranges: bool = True, latency: float = None, **faults) -> str:
+        url = f"{self.url}/artifacts/{size}?ranges={int(ranges)}"
+        if latency is not None:
+            url += f"&latency={latency}"
+        for key, value in faults.items():
+            url += f"&{key}={value}"
+        return url
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,58 @@
+"""
+Shared fixtures. Everything runs offline, against the local HTTP server of
+the benchmarks (synthetic artifacts, a stand-in release API) and stub
+binaries on PATH.
+"""
+
+import socket
+import hashlib
+
+import pytest
+
+from benchmarks.server import BenchmarkServer, synthetic_bytes
+from toolbox import transfer
+
+
+def synthetic_sha256(size: int) -> str:
+    """The sha256 of the server's synthetic artifact of the given size."""
+    digest = hashlib.sha256()
+    for chunk in synthetic_bytes(0, size):
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+@pytest.fixture
+def server():
+    with BenchmarkServer() as running:
+        yield running
+
+
+@pytest.fixture
+def other_server():
+    # A second host: mirrors on one host would share pooled connections
+    with BenchmarkServer() as running:
+        yield running
+
+
+@pytest.fixture
+def offline_url():
+    """The URL of a local port nothing listens on."""
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return f"http://127.0.0.1:{sock.getsockname()[1]}"
+
+
+@pytest.fixture
+def downloads(tmp_path):
+    return str(tmp_path / 'downloads')
+
+
+@pytest.fixture
+def airgap(tmp_path):
+    """The downloads/ tree on the airgapped side of a bundle."""
+    return str(tmp_path / 'airgap')
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(transfer, 'backoff_delay', lambda attempt: 0)
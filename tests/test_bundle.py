@@ -0,0 +1,97 @@
+import os
+import shutil
+import zipfile
+
+from toolbox.bundle import main, apply_main, VolumeWriter, ZipStreamWriter, MANIFEST_NAME, SUMS_NAME
+from toolbox.store import ArtifactStore
+
+RPM = os.urandom(300 * 1024)  # incompressible, so it is stored as-is
+CONF = b'listen 80;\n' * 4096  # deflated
+
+
+def release(downloads, tools, loose=None):
+    """Makes downloads the given release: {tool: {relpath: content}} views in the store, plus loose files."""
+    store = ArtifactStore(downloads)
+    for tool in os.listdir(downloads) if os.path.isdir(downloads) else ():
+        if tool not in tools and tool != '.store' and os.path.isdir(os.path.join(downloads, tool)):
+            shutil.rmtree(os.path.join(downloads, tool))
+            os.remove(store.manifest_path(tool))
+    for tool, files in tools.items():
+        tool_dir = os.path.join(downloads, tool)
+        shutil.rmtree(tool_dir, ignore_errors=True)
+        for relpath, content in files.items():
+            path = os.path.join(tool_dir, *relpath.split('/'))
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as f:
+                f.write(content)
+        store.ingest_tool(tool, tool_dir)
+    for name, content in (loose or {}).items():
+        with open(os.path.join(downloads, name), 'wb') as f:
+            f.write(content)
+    store.prune()
+
+
+def read_tree(directory):
+    """{relpath: content} of every file below directory, except the store and bundle metadata."""
+    tree = {}
+    for dirpath, dirnames, filenames in os.walk(directory):
+        dirnames[:] = [d for d in dirnames if d != '.store']
+        for filename in filenames:
+            if filename in (MANIFEST_NAME, SUMS_NAME):
+                continue
+            path = os.path.join(dirpath, filename)
+            with open(path, 'rb') as f:
+                tree[os.path.relpath(path, directory).replace(os.sep, '/')] = f.read()
+    return tree
+
+
+def join_volumes(volumes, output):
+    with open(output, 'wb') as out:
+        for volume in volumes:
+            with open(volume, 'rb') as f:
+                shutil.copyfileobj(f, out)
+    return output
+
+
+def test_split_bundle_applies_and_verifies(tmp_path, downloads, airgap):
+    release(downloads, {'Nginx': {'nginx.rpm': RPM, 'conf/nginx.conf': CONF},
+                        'Proxy': {'nginx.rpm': RPM, 'proxy.conf': b'proxy'},
+                        'Old': {'old.rpm': b'old'}},
+            loose={'versions.lock.json': b'{"v": 1}'})
+    v1 = str(tmp_path / 'v1.zip')
+    assert main(['--downloads', downloads, '--output', v1, '--volume-size', '128K', '--jobs', '4']) == 0
+    volumes = sorted(str(tmp_path / f) for f in os.listdir(tmp_path) if f.startswith('v1.zip.0'))
+    assert len(volumes) > 2 and all(os.path.getsize(v) <= 128 * 1024 for v in volumes)
+    joined = join_volumes(volumes, str(tmp_path / 'v1-joined.zip'))
+    with zipfile.ZipFile(joined) as bundle:
+        assert bundle.testzip() is None
+        names = bundle.namelist()
+        # Each store object once; views are rebuilt from the store on the other side
+        assert sum(name.startswith('.store/objects/') for name in names) == 4
+        assert not any(name.startswith(('Nginx/', 'Proxy/')) for name in names)
+    assert apply_main([joined, '--downloads', airgap]) == 0
+    assert read_tree(airgap) == read_tree(downloads)
+
+
+
+def test_apply_refuses_a_tree_that_does_not_verify(tmp_path, downloads, airgap, monkeypatch):
+    release(downloads, {'Nginx': {'nginx.rpm': RPM}})
+    v1 = str(tmp_path / 'v1.zip')
+    main(['--downloads', downloads, '--output', v1])
+    # A view that can't be rebuilt from the store leaves the tree incomplete
+    monkeypatch.setattr(ArtifactStore, 'materialize', lambda self, tool, tool_dir: False)
+    assert apply_main([v1, '--downloads', airgap]) == 1
+    assert not os.path.exists(os.path.join(airgap, MANIFEST_NAME))
+
+
+def test_zip64_end_records_for_many_members(tmp_path):
+    path = str(tmp_path / 'many.zip')
+    out = VolumeWriter(path)
+    writer = ZipStreamWriter(out)
+    for i in range(0x10000):
+        writer.add_bytes(f"f{i}", b'x', mtime=0)
+    writer.finish()
+    out.close()
+    with zipfile.ZipFile(path) as archive:
+        assert len(archive.infolist()) == 0x10000
+        assert archive.read('f65535') == b'x'
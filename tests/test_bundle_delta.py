@@ -0,0 +1,83 @@
+import os
+import zipfile
+
+from toolbox.bundle import main, apply_main, DELTA_NAME
+from tests.test_bundle import RPM, CONF, release, read_tree
+
+
+def test_delta_and_chained_delta(tmp_path, downloads, airgap):
+    release(downloads, {'Nginx': {'nginx.rpm': RPM, 'conf/nginx.conf': CONF},
+                        'Proxy': {'nginx.rpm': RPM, 'proxy.conf': b'proxy'},
+                        'Old': {'old.rpm': b'old'}},
+            loose={'versions.lock.json': b'{"v": 1}'})
+    v1 = str(tmp_path / 'v1.zip')
+    assert main(['--downloads', downloads, '--output', v1]) == 0
+    assert apply_main([v1, '--downloads', airgap]) == 0
+
+    # Release 2: a changed file, a removed tool, a new tool and a changed loose file
+    release(downloads, {'Nginx': {'nginx.rpm': RPM, 'conf/nginx.conf': CONF + b'gzip on;\n'},
+                        'Proxy': {'nginx.rpm': RPM, 'proxy.conf': b'proxy'},
+                        'Helm': {'helm.tar.gz': b'helm'}},
+            loose={'versions.lock.json': b'{"v": 2}'})
+    d2 = str(tmp_path / 'd2.zip')
+    assert main(['--downloads', downloads, '--output', d2, '--since', v1 + '.manifest.json']) == 0
+    with zipfile.ZipFile(d2) as bundle:
+        assert DELTA_NAME in bundle.namelist()
+        # The unchanged RPM is not sent again
+        assert sum(name.startswith('.store/objects/') for name in bundle.namelist()) == 2
+    assert apply_main([d2, '--downloads', airgap]) == 0
+    assert read_tree(airgap) == read_tree(downloads)
+    assert not os.path.exists(os.path.join(airgap, 'Old'))
+
+    # Release 3, as a delta against the delta
+    release(downloads, {'Nginx': {'nginx.rpm': RPM, 'conf/nginx.conf': CONF},
+                        'Helm': {'helm.tar.gz': b'helm 2'}})
+    d3 = str(tmp_path / 'd3.zip')
+    assert main(['--downloads', downloads, '--output', d3, '--since', d2 + '.manifest.json']) == 0
+    assert apply_main([d3, '--downloads', airgap]) == 0
+    assert read_tree(airgap) == read_tree(downloads)
+    assert not os.path.exists(os.path.join(airgap, 'Proxy'))
+
+
+def test_delta_for_another_release_is_refused(tmp_path, downloads, airgap, capsys):
+    release(downloads, {'Nginx': {'nginx.rpm': RPM}})
+    v1 = str(tmp_path / 'v1.zip')
+    main(['--downloads', downloads, '--output', v1])
+    release(downloads, {'Nginx': {'nginx.rpm': RPM, 'nginx.conf': CONF}})
+    v2 = str(tmp_path / 'v2.zip')
+    main(['--downloads', downloads, '--output', v2, '--since', v1 + '.manifest.json'])
+    release(downloads, {'Nginx': {'nginx.rpm': b'rebuilt'}})
+    v3 = str(tmp_path / 'v3.zip')
+    main(['--downloads', downloads, '--output', v3, '--since', v2 + '.manifest.json'])
+
+    # The airgap has release 1 only, so the delta from 2 to 3 must not be applied
+    assert apply_main([v1, '--downloads', airgap]) == 0
+    before = read_tree(airgap)
+    capsys.readouterr()
+    assert apply_main([v3, '--downloads', airgap]) == 1
+    assert 'not the release this delta was built against' in capsys.readouterr().out
+    assert read_tree(airgap) == before
+    # Nor may a delta go onto an empty tree
+    assert apply_main([v2, '--downloads', str(tmp_path / 'empty')]) == 1
+
+
+def test_delta_for_another_release_is_refused(tmp_path, downloads, airgap, capsys):
+    release(downloads, {'Nginx': {'nginx.rpm': RPM}})
+    v1 = str(tmp_path / 'v1.zip')
+    main(['--downloads', downloads, '--output', v1])
+    release(downloads, {'Nginx': {'nginx.rpm': RPM, 'nginx.conf': CONF}})
+    v2 = str(tmp_path / 'v2.zip')
+    main(['--downloads', downloads, '--output', v2, '--since', v1 + '.manifest.json'])
+    release(downloads, {'Nginx': {'nginx.rpm': b'rebuilt'}})
+    v3 = str(tmp_path / 'v3.zip')
+    main(['--downloads', downloads, '--output', v3, '--since', v2 + '.manifest.json'])
+
+    # The airgap has release 1 only, so the delta from 2 to 3 must not be applied
+    assert apply_main([v1, '--downloads', airgap]) == 0
+    before = read_tree(airgap)
+    capsys.readouterr()
+    assert apply_main([v3, '--downloads', airgap]) == 1
+    assert 'not the release this delta was built against' in capsys.readouterr().out
+    assert read_tree(airgap) == before
+    # Nor may a delta go onto an empty tree
+    assert apply_main([v2, '--downloads', str(tmp_path / 'empty')]) == 1
@@ -0,0 +1,135 @@
+import io
+import os
+import json
+import hashlib
+import tarfile
+
+import pytest
+
+from toolbox.collection_install import (install_collection, install_collections, installed_version,
+                                        collection_dir, CollectionError)
+
+FILES = {'README.md': b'# demo\n', 'plugins/modules/ping.py': b'print("pong")\n'}
+
+
+def _sha256(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def make_collection(path, version='1.0.0', files=None, unlisted=None, symlinks=None, listed=None,
+                    files_json_sha256=None):
+    """
+    Writes a collection tarball the way ansible-galaxy builds one. files are
+    listed in FILES.json with their checksums; listed overrides entries,
+    unlisted files are added without an entry, and symlinks maps names to
+    link targets.
+    """
+    files = dict(FILES if files is None else files)
+    entries = [{'name': name, 'ftype': 'file', 'chksum_type': 'sha256', 'chksum_sha256': _sha256(data)}
+               for name, data in files.items()]
+    entries += [{'name': name, 'ftype': 'file', 'chksum_type': 'sha256', 'chksum_sha256': None}
+                for name in symlinks or {}]
+    for entry in entries:
+        entry.update((listed or {}).get(entry['name'], {}))
+    files_json = json.dumps({'files': entries, 'format': 1}).encode()
+    manifest = json.dumps({
+        'collection_info': {'namespace': 'demo', 'name': 'tools', 'version': version, 'dependencies': {}},
+        'file_manifest_file': {'name': 'FILES.json', 'ftype': 'file', 'chksum_type': 'sha256',
+                               'chksum_sha256': files_json_sha256 or _sha256(files_json)},
+        'format': 1,
+    }).encode()
+
+    with tarfile.open(path, 'w:gz') as tar:
+        members = [('MANIFEST.json', manifest), ('FILES.json', files_json)]
+        members += list(files.items()) + list((unlisted or {}).items())
+        for name, data in members:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+        for name, target in (symlinks or {}).items():
+            info = tarfile.TarInfo(name)
+            info.type = tarfile.SYMTYPE
+            info.linkname = target
+            tar.addfile(info)
+    return str(path)
+
+
+@pytest.fixture
+def install_path(tmp_path):
+    return str(tmp_path / 'collections')
+
+
+def _leftovers(install_path):
+    parent = os.path.dirname(collection_dir(install_path, 'demo.tools'))
+    return [name for name in os.listdir(parent) if name.startswith('.')]
+
+
+def test_install_then_skip_the_same_version(tmp_path, install_path):
+    tarball = make_collection(tmp_path / 'demo-tools-1.0.0.tar.gz')
+    result = install_collection(tarball, install_path)
+    assert (result.name, result.version, result.status) == ('demo.tools', '1.0.0', 'installed')
+    target = collection_dir(install_path, 'demo.tools')
+    with open(os.path.join(target, 'plugins', 'modules', 'ping.py'), 'rb') as f:
+        assert f.read() == FILES['plugins/modules/ping.py']
+
+    assert install_collection(tarball, install_path).status == 'skipped'
+    assert install_collection(tarball, install_path, force=True).status == 'installed'
+
+
+def test_upgrade_replaces_the_installed_directory(tmp_path, install_path):
+    install_collection(make_collection(tmp_path / 'old.tar.gz', files={'old.txt': b'old'}), install_path)
+    result = install_collection(make_collection(tmp_path / 'new.tar.gz', version='1.1.0'), install_path)
+    assert result.detail == 'upgraded from 1.0.0'
+    target = collection_dir(install_path, 'demo.tools')
+    assert installed_version(install_path, 'demo.tools') == '1.1.0'
+    assert not os.path.exists(os.path.join(target, 'old.txt'))
+    assert _leftovers(install_path) == []
+
+
+@pytest.mark.parametrize('name', ['../escape.txt', '/tmp/absolute.txt', 'plugins/../../escape.txt'])
+def test_unsafe_member_names_are_rejected(tmp_path, install_path, name):
+    tarball = make_collection(tmp_path / 'bad.tar.gz', unlisted={name: b'x'})
+    with pytest.raises(CollectionError, match='unsafe member'):
+        install_collection(tarball, install_path)
+    assert not os.path.exists(tmp_path / 'escape.txt')
+    assert installed_version(install_path, 'demo.tools') is None
+
+
+@pytest.mark.parametrize('target', ['/etc/passwd', '../../outside', '../../../../etc'])
+def test_symlinks_out_of_the_collection_are_rejected(tmp_path, install_path, target):
+    tarball = make_collection(tmp_path / 'bad.tar.gz', symlinks={'plugins/link': target})
+    with pytest.raises(CollectionError, match='points outside'):
+        install_collection(tarball, install_path)
+    assert _leftovers(install_path) == []
+
+
+def test_symlinks_within_the_collection_are_kept(tmp_path, install_path):
+    tarball = make_collection(tmp_path / 'ok.tar.gz', symlinks={'plugins/readme': '../README.md'})
+    install_collection(tarball, install_path)
+    link = os.path.join(collection_dir(install_path, 'demo.tools'), 'plugins', 'readme')
+    assert os.readlink(link) == '../README.md'
+
+
+@pytest.mark.parametrize('options, error', [
+    ({'files_json_sha256': '0' * 64}, 'FILES.json does not match'),
+    ({'listed': {'README.md': {'chksum_sha256': '0' * 64}}}, 'checksum mismatch for README.md'),
+    ({'unlisted': {'plugins/extra.py': b'x'}}, 'not listed in FILES.json'),
+    ({'listed': {'README.md': {'name': 'MISSING.md'}}}, 'MISSING.md is listed in FILES.json but missing'),
+])
+def test_tampered_collections_are_rejected(tmp_path, install_path, options, error):
+    install_collection(make_collection(tmp_path / 'good.tar.gz'), install_path)
+    tarball = make_collection(tmp_path / 'bad.tar.gz', version='2.0.0', **options)
+    with pytest.raises(CollectionError, match=error):
+        install_collection(tarball, install_path)
+    # The installed version is left untouched
+    assert installed_version(install_path, 'demo.tools') == '1.0.0'
+    assert _leftovers(install_path) == []
+
+
+def test_highest_version_wins_and_failures_are_reported(tmp_path, install_path):
+    tarballs = [make_collection(tmp_path / 'a.tar.gz', version='1.0.0'),
+                make_collection(tmp_path / 'b.tar.gz', version='1.2.0'),
+                str(tmp_path / 'missing.tar.gz')]
+    results = {r.name: r for r in install_collections(tarballs, install_path, jobs=2)}
+    assert results['demo.tools'].version == '1.2.0'
+    assert results['missing.tar.gz'].status == 'failed'
@@ -0,0 +1,72 @@
+import os
+import json
+
+import pytest
+
+from toolbox.download_collections import GalaxyClient, resolve_closure, main, LOCK_FILENAME
+from toolbox.store import hash_file
+
+COLLECTIONS = ['bench.collection0001', 'bench.collection0002', 'bench.collection0006']
+
+
+@pytest.fixture(autouse=True)
+def state_dir(tmp_path, monkeypatch):
+    # Mirror rankings and the HTTP cache default to .relay/ in the working directory
+    monkeypatch.chdir(tmp_path)
+
+
+@pytest.fixture
+def output_dir(tmp_path):
+    return str(tmp_path / 'collections')
+
+
+def _download(server, output_dir, *args):
+    main(['--output-dir', output_dir, '--galaxy-url', server.url, '--jobs', '8', *args])
+
+
+def _tarballs(output_dir):
+    return sorted(f for f in os.listdir(output_dir) if f.endswith('.tar.gz'))
+
+
+def test_dependency_closure(server):
+    client = GalaxyClient(server.url, cache=None)
+    closure, failed = resolve_closure(client, COLLECTIONS, jobs=8)
+    assert failed == {}
+    # collection0002 and collection0006 both need bench.lib2 <1.0.0, which needs any bench.core
+    assert {name: info['version'] for name, info in closure.items()} == {
+        'bench.collection0001': '1.0.0', 'bench.collection0002': '1.0.0', 'bench.collection0006': '1.0.0',
+        'bench.lib1': '0.9.0', 'bench.lib2': '0.9.0', 'bench.core': '1.0.0'}
+
+    closure, _ = resolve_closure(client, COLLECTIONS, jobs=8, dependencies=False)
+    assert sorted(closure) == COLLECTIONS
+
+
+def test_concurrent_download_of_the_closure(server, output_dir):
+    _download(server, output_dir, *COLLECTIONS)
+    assert _tarballs(output_dir) == [
+        'bench-collection0001-1.0.0.tar.gz', 'bench-collection0002-1.0.0.tar.gz',
+        'bench-collection0006-1.0.0.tar.gz', 'bench-core-1.0.0.tar.gz',
+        'bench-lib1-0.9.0.tar.gz', 'bench-lib2-0.9.0.tar.gz']
+    sha256 = server.server.collection_sha256()
+    assert all(hash_file(os.path.join(output_dir, f)) == sha256 for f in _tarballs(output_dir))
+    with open(os.path.join(output_dir, LOCK_FILENAME), 'r', encoding='utf-8') as f:
+        lock = json.load(f)
+    assert lock['requested'] == COLLECTIONS and lock['with_dependencies']
+    assert lock['collections']['bench.lib2']['dependencies'] == {'bench.core': '*'}
+
+
+def test_locked_run_needs_no_galaxy(server, offline_url, output_dir):
+    _download(server, output_dir, *COLLECTIONS)
+    # Every locked tarball is present and intact, so nothing is fetched
+    main(['--output-dir', output_dir, '--galaxy-url', offline_url, *COLLECTIONS])
+    assert len(_tarballs(output_dir)) == 6
+
+
+def test_failed_download_of_one_collection(server, output_dir):
+    with pytest.raises(SystemExit) as exit_info:
+        _download(server, output_dir, 'bench.collection0001', 'bench.broken0001')
+    assert exit_info.value.code == 1
+    # The others are downloaded, but nothing is locked until every download succeeds
+    assert 'bench-collection0001-1.0.0.tar.gz' in _tarballs(output_dir)
+    assert not any(f.startswith('bench-broken') for f in os.listdir(output_dir))
+    assert not os.path.exists(os.path.join(output_dir, LOCK_FILENAME))
@@ -0,0 +1,95 @@
+import io
+import os
+import tarfile
+
+import pytest
+
+from toolbox.steps import StepContext, run_step
+
+
+def make_archive(path, members):
+    """Writes a tar.gz of (name, content) members; content 'symlink:<target>' makes a symlink."""
+    with tarfile.open(path, 'w:gz') as tar:
+        for name, content in members:
+            info = tarfile.TarInfo(name)
+            if isinstance(content, str) and content.startswith('symlink:'):
+                info.type = tarfile.SYMTYPE
+                info.linkname = content[len('symlink:'):]
+                tar.addfile(info)
+            elif content is None:
+                info.type = tarfile.DIRTYPE
+                info.mode = 0o755
+                tar.addfile(info)
+            else:
+                info.size = len(content)
+                info.mode = 0o644
+                tar.addfile(info, io.BytesIO(content))
+    return str(path)
+
+
+@pytest.fixture
+def dirs(tmp_path):
+    """The extract destination and a sibling directory nothing may be written to."""
+    dest, outside = tmp_path / 'dest', tmp_path / 'outside'
+    dest.mkdir()
+    outside.mkdir()
+    return str(dest), str(outside)
+
+
+def extract(archive, dest=None, members=None):
+    step = {'type': 'extract', 'archive': archive}
+    if dest is not None:
+        step['dest'] = dest
+    if members is not None:
+        step['members'] = members
+    return run_step(step, StepContext({}))
+
+
+def _files(directory):
+    return sorted(os.path.relpath(os.path.join(root, f), directory)
+                  for root, dirs, files in os.walk(directory) for f in files + dirs)
+
+
+def test_extracts_files_and_internal_symlinks(tmp_path, dirs):
+    dest, _ = dirs
+    archive = make_archive(tmp_path / 'ok.tar.gz', [('pkg', None), ('pkg/bin', b'#!/bin/sh\n'),
+                                                    ('pkg/latest', 'symlink:bin')])
+    assert extract(archive, dest)
+    assert os.readlink(os.path.join(dest, 'pkg', 'latest')) == 'bin'
+    with open(os.path.join(dest, 'pkg', 'latest'), 'rb') as f:
+        assert f.read() == b'#!/bin/sh\n'
+
+
+@pytest.mark.parametrize('name', ['../outside/evil', '/tmp/relay-extract-evil', 'pkg/../../outside/evil'])
+def test_traversing_member_names_are_not_written(tmp_path, dirs, name):
+    dest, outside = dirs
+    archive = make_archive(tmp_path / 'bad.tar.gz', [(name, b'x'), ('pkg/ok', b'ok')])
+    extract(archive, dest)
+    assert _files(outside) == []
+    assert not os.path.exists('/tmp/relay-extract-evil')
+    assert _files(dest) == ['pkg', os.path.join('pkg', 'ok')]
+
+
+@pytest.mark.parametrize('target', ['../outside', '../../outside/evil', '/etc/passwd', 'pkg/../../outside'])
+def test_escaping_symlinks_are_refused(tmp_path, dirs, target):
+    dest, outside = dirs
+    archive = make_archive(tmp_path / 'bad.tar.gz', [('link', f'symlink:{target}'), ('link/evil', b'x')])
+    assert not extract(archive, dest)
+    assert _files(outside) == []
+    assert not os.path.lexists(os.path.join(dest, 'link'))
+
+
+def test_nothing_is_written_through_an_existing_symlink(tmp_path, dirs):
+    dest, outside = dirs
+    os.symlink(outside, os.path.join(dest, 'pkg'))
+    archive = make_archive(tmp_path / 'bad.tar.gz', [('pkg/evil', b'x')])
+    assert not extract(archive, dest)
+    assert _files(outside) == []
+
+
+def test_member_symlinks_stay_within_the_member_destination(tmp_path, dirs):
+    dest, outside = dirs
+    archive = make_archive(tmp_path / 'bad.tar.gz', [('pkg/share/docs', 'symlink:../../outside')])
+    members = [{'path': 'pkg/share', 'dest': os.path.join(dest, 'share')}]
+    assert not extract(archive, members=members)
+    assert _files(outside) == []
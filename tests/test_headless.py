@@ -0,0 +1,96 @@
+import os
+import json
+
+import pytest
+
+from toolbox.detect import Detector
+from toolbox.headless import main, EXIT_OK, EXIT_FAILED, EXIT_USAGE
+from toolbox.store import ArtifactStore
+
+
+@pytest.fixture(autouse=True)
+def workdir(tmp_path, monkeypatch):
+    """Runs in an empty directory (downloads/ and .relay/ are relative to it) on a host with nothing installed."""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(Detector, 'detect', lambda self, tools, state=None: {t['name']: False for t in tools})
+    monkeypatch.setattr(os, 'geteuid', lambda: 0)
+    return tmp_path
+
+
+def downloaded(workdir, tool, files):
+    tool_dir = os.path.join(str(workdir), 'downloads', tool)
+    os.makedirs(tool_dir)
+    for name, content in files.items():
+        with open(os.path.join(tool_dir, name), 'wb') as f:
+            f.write(content)
+    ArtifactStore(os.path.join(str(workdir), 'downloads')).ingest_tool(tool, tool_dir)
+    return tool_dir
+
+
+@pytest.mark.parametrize('command', ['download', 'install'])
+def test_json_results_alone_on_stdout(capsys, command):
+    assert main([command, '--tools', 'Git,NGINX', '--agree-to-terms', '--simulate', '--json']) == EXIT_OK
+    out, err = capsys.readouterr()
+    document = json.loads(out)
+    assert (document['command'], document['simulate'], document['exit_code']) == (command, True, EXIT_OK)
+    assert [(t['name'], t['status']) for t in document['tools']] == [('Git', 'ok'), ('NGINX', 'ok')]
+    # Progress is still shown, on stderr
+    assert 'SIMULATION' in err
+
+
+def test_human_output_without_json(capsys):
+    assert main(['download', '--tools', 'Git', '--agree-to-terms', '--simulate']) == EXIT_OK
+    out, _ = capsys.readouterr()
+    assert 'SIMULATION' in out
+    with pytest.raises(ValueError):
+        json.loads(out)
+
+
+@pytest.mark.parametrize('argv', [
+    ['download', '--tools', 'Git', '--simulate'],
+    ['install', '--tools', 'NoSuchTool', '--agree-to-terms', '--simulate'],
+])
+def test_usage_errors(capsys, argv):
+    assert main(argv + ['--json']) == EXIT_USAGE
+    assert capsys.readouterr().out == ''
+
+
+@pytest.mark.parametrize('argv', [['install', '--agree-to-terms'], ['verify', '--tools', 'Git', '--all'], []])
+def test_argument_errors_exit_with_usage(argv):
+    with pytest.raises(SystemExit) as exit_info:
+        main(argv)
+    assert exit_info.value.code == EXIT_USAGE
+
+
+def test_root_is_required_unless_simulating(capsys, monkeypatch):
+    monkeypatch.setattr(os, 'geteuid', lambda: 1000)
+    assert main(['install', '--tools', 'Git', '--agree-to-terms', '--json']) == EXIT_FAILED
+    out, err = capsys.readouterr()
+    assert out == '' and 'must be run as root' in err
+    assert main(['install', '--tools', 'Git', '--agree-to-terms', '--simulate', '--json']) == EXIT_OK
+    # status and verify only read
+    assert main(['status', '--tools', 'Git']) == EXIT_OK
+
+
+def test_install_without_downloads_fails(capsys):
+    assert main(['install', '--tools', 'Git', '--agree-to-terms', '--json']) == EXIT_FAILED
+    document = json.loads(capsys.readouterr().out)
+    assert document['exit_code'] == EXIT_FAILED
+    assert document['tools'] == [{'name': 'Git', 'status': 'failed', 'reason': 'not downloaded'}]
+
+
+def test_status_and_verify(workdir, capsys):
+    tool_dir = downloaded(workdir, 'Git', {'git.rpm': b'git' * 100})
+    assert main(['status', '--tools', 'Git,NGINX', '--json']) == EXIT_OK
+    status = json.loads(capsys.readouterr().out)['tools']
+    assert [(t['name'], t['downloaded'], t['files']) for t in status] == [('Git', True, 1), ('NGINX', False, 0)]
+
+    assert main(['verify', '--tools', 'Git,NGINX', '--json']) == EXIT_OK
+    results = json.loads(capsys.readouterr().out)['tools']
+    assert [r['status'] for r in results] == ['ok', 'skipped']
+
+    with open(os.path.join(tool_dir, 'git.rpm'), 'r+b') as f:
+        f.write(b'GIT')
+    assert main(['verify', '--tools', 'Git', '--full']) == EXIT_FAILED
+    out, _ = capsys.readouterr()
+    assert 'Git' in out and 'failed' in out and 'git.rpm: sha256' in out
@@ -0,0 +1,89 @@
+import os
+
+import pytest
+
+from toolbox.incremental import IncrementalDownload, snapshot
+from toolbox.steps import StepContext
+from toolbox.store import ArtifactStore
+
+# A repo setup step without outputs, then two downloads
+STEPS = [
+    {'type': 'shell', 'command': 'add-repo {version}'},
+    {'type': 'shell', 'command': 'fetch a-{version}.rpm'},
+    {'type': 'shell', 'command': 'fetch b-{version}.rpm'},
+]
+OUTPUTS = [{}, {'a.rpm': b'a' * 100}, {'b.rpm': b'b' * 100}]
+
+
+@pytest.fixture
+def tool_dir(downloads):
+    path = os.path.join(downloads, 'Demo')
+    os.makedirs(path)
+    return path
+
+
+def tool(**fields):
+    return {'name': 'Demo', 'version': '1.0', 'install_steps': [], **fields}
+
+
+def run(downloads, tool_dir, definition=None, steps=STEPS):
+    """Plans a run, 'runs' the planned steps by writing their outputs, and saves the records."""
+    incremental = IncrementalDownload(ArtifactStore(downloads), definition or tool(), steps,
+                                      StepContext({'version': '1.0'}), tool_dir)
+    planned = incremental.plan()
+    for index in range(len(steps)):
+        before = snapshot(tool_dir)
+        if index in planned:
+            for name, content in OUTPUTS[index].items():
+                with open(os.path.join(tool_dir, name), 'wb') as f:
+                    f.write(content)
+        incremental.record(index, before)
+    incremental.save()
+    return planned
+
+
+def test_unchanged_steps_are_skipped(downloads, tool_dir):
+    assert run(downloads, tool_dir) == {0, 1, 2}
+    assert run(downloads, tool_dir) == set()
+    # Records survive a run that skipped everything
+    assert run(downloads, tool_dir) == set()
+
+
+def test_changed_step_runs_with_the_steps_after_it(downloads, tool_dir):
+    run(downloads, tool_dir)
+    steps = STEPS[:2] + [{'type': 'shell', 'command': 'fetch b-{version}.rpm --retry 3'}]
+    # The repo setup before it has no outputs, so it runs again too
+    assert run(downloads, tool_dir, steps=steps) == {0, 2}
+    assert run(downloads, tool_dir, steps=steps) == set()
+
+
+@pytest.mark.parametrize('fields, planned', [
+    ({'version': '1.1'}, {0, 1, 2}),
+    ({'arch': 'aarch64'}, {0, 1, 2}),
+    ({'install_steps': [{'type': 'shell', 'command': 'rpm -i a.rpm'}]}, set()),
+    ({'description': 'Changed'}, set()),
+])
+def test_tool_fields_that_affect_downloads(downloads, tool_dir, fields, planned):
+    run(downloads, tool_dir)
+    assert run(downloads, tool_dir, definition=tool(**fields)) == planned
+
+
+def test_missing_output_reruns_its_step(downloads, tool_dir):
+    run(downloads, tool_dir)
+    os.remove(os.path.join(tool_dir, 'b.rpm'))
+    assert run(downloads, tool_dir) == {0, 2}
+
+
+def test_modified_output_reruns_its_step(downloads, tool_dir):
+    run(downloads, tool_dir)
+    path = os.path.join(tool_dir, 'a.rpm')
+    with open(path, 'wb') as f:
+        f.write(b'x' * 100)
+    os.utime(path, ns=(0, 0))
+    assert run(downloads, tool_dir) == {0, 1, 2}
+
+
+def test_touched_output_with_the_same_content_is_kept(downloads, tool_dir):
+    run(downloads, tool_dir)
+    os.utime(os.path.join(tool_dir, 'a.rpm'), ns=(0, 0))
+    assert run(downloads, tool_dir) == set()
@@ -0,0 +1,86 @@
+import os
+import shlex
+import subprocess
+
+import pytest
+
+from toolbox.install_plan import InstallPlan, find_rpm_install_step
+
+
+def _tool(name, install_steps):
+    return {'name': name, 'install_steps': install_steps}
+
+
+@pytest.fixture
+def stub_dnf(tmp_path, monkeypatch):
+    """Puts dnf and yum on PATH that log each invocation's arguments, one call per line."""
+    bin_dir = tmp_path / 'bin'
+    bin_dir.mkdir()
+    log = tmp_path / 'calls.log'
+    for manager in ('dnf', 'yum'):
+        stub = bin_dir / manager
+        stub.write_text(f'#!/bin/sh\necho {manager} "$@" >> {shlex.quote(str(log))}\n')
+        stub.chmod(0o755)
+    monkeypatch.setenv('PATH', f"{bin_dir}{os.pathsep}{os.environ['PATH']}")
+    return log
+
+
+def _downloads(tmp_path, packages):
+    downloads = tmp_path / 'downloads'
+    for tool, files in packages.items():
+        (downloads / tool).mkdir(parents=True)
+        for name in files:
+            (downloads / tool / name).write_bytes(b'rpm')
+    return str(downloads)
+
+
+def test_find_rpm_install_step():
+    assert find_rpm_install_step([{'command': 'cp a b'}, {'command': 'dnf install -y {download_dir}/*.rpm'}]) == 1
+    assert find_rpm_install_step([{'command': 'yum -y install "{download_dir}"/*.rpm'}]) == 0
+    assert find_rpm_install_step([{'command': 'dnf install -y {download_dir}/*.rpm nginx'}]) is None
+
+
+def test_steps_are_split_around_the_rpm_install(tmp_path):
+    tools = [
+        _tool('Grafana', [{'command': 'cp {download_dir}/grafana.repo /etc/yum.repos.d/'},
+                          {'command': 'dnf install -y {download_dir}/*.rpm'},
+                          {'command': 'systemctl enable --now grafana-server'}]),
+        _tool('Graph', [{'id': 'rpms', 'command': 'dnf install -y {download_dir}/*.rpm'},
+                        {'command': 'systemctl daemon-reload', 'after': ['rpms']}]),
+        _tool('Helm', [{'command': 'tar -xzf {download_dir}/helm.tar.gz'}]),
+    ]
+    plan = InstallPlan(tools, str(tmp_path))
+    grafana, graph, helm = plan.installs
+    assert [install.name for install in plan.batched] == ['Grafana']
+    assert [s['command'] for s in grafana.pre_steps] == ['cp {download_dir}/grafana.repo /etc/yum.repos.d/']
+    assert [s['command'] for s in grafana.post_steps] == ['systemctl enable --now grafana-server']
+    # A step graph is not split, and tools without an RPM step keep all their steps
+    assert not graph.batched and len(graph.pre_steps) == 2
+    assert not helm.batched and len(helm.pre_steps) == 1
+
+
+def test_one_transaction_installs_shared_packages_once(tmp_path, stub_dnf):
+    downloads = _downloads(tmp_path, {
+        'Docker': ['docker-ce-24.0.7-1.el9.x86_64.rpm', 'containerd.io-1.6.24-3.1.el9.x86_64.rpm'],
+        'Podman': ['containerd.io-1.6.24-3.1.el9.x86_64.rpm', 'podman-4.6.1-5.el9.x86_64.rpm'],
+    })
+    tools = [_tool('Docker', [{'command': 'yum install -y {download_dir}/*.rpm'}]),
+             _tool('Podman', [{'command': 'dnf install -y {download_dir}/*.rpm'}])]
+    plan = InstallPlan(tools, downloads)
+    command = plan.transaction_command(plan.batched)
+
+    subprocess.run(command, shell=True, check=True)
+    calls = stub_dnf.read_text().splitlines()
+    assert len(calls) == 1
+    manager, install, flag, *packages = calls[0].split()
+    assert (manager, install, flag) == ('dnf', 'install', '-y')
+    assert [os.path.basename(p) for p in packages] == ['containerd.io-1.6.24-3.1.el9.x86_64.rpm',
+                                                      'docker-ce-24.0.7-1.el9.x86_64.rpm',
+                                                      'podman-4.6.1-5.el9.x86_64.rpm']
+
+
+def test_tools_without_downloaded_rpms_keep_their_glob(tmp_path):
+    downloads = _downloads(tmp_path, {'Nginx': []})
+    plan = InstallPlan([_tool('Nginx', [{'command': 'yum install -y {download_dir}/*.rpm'}])], downloads)
+    assert plan.transaction_command(plan.batched) == f"yum install -y {os.path.join(downloads, 'Nginx')}/*.rpm"
+    assert plan.transaction_command([]) is None
@@ -0,0 +1,73 @@
+import os
+
+import pytest
+
+from toolbox.mirrors import MirrorRankings, MirrorSelector
+from toolbox.steps import StepContext, run_step
+from toolbox.store import hash_file
+from toolbox.transfer import MIN_SEGMENT_SIZE, SEGMENTS_SUFFIX
+from tests.conftest import synthetic_sha256
+
+SIZE = 2 * MIN_SEGMENT_SIZE
+
+
+@pytest.fixture
+def rankings(tmp_path):
+    return MirrorRankings(str(tmp_path / 'mirrors.json'))
+
+
+def test_delayed_mirror_is_ranked_last(server, other_server, rankings):
+    slow = server.artifact_url(SIZE, latency=0.3)
+    fast = other_server.artifact_url(SIZE)
+    assert MirrorSelector(rankings).rank([slow, fast]) == [fast, slow]
+    # Fresh rankings are saved and reused without probing again
+    reloaded = MirrorRankings(rankings.path)
+    assert reloaded.is_fresh(slow) and reloaded.is_fresh(fast)
+    assert reloaded.order([slow, fast]) == [fast, slow]
+
+
+def test_failing_mirror_fails_over(server, other_server, rankings, tmp_path):
+    failing = server.artifact_url(SIZE, fail=503)
+    working = other_server.artifact_url(SIZE)
+    dest = str(tmp_path / 'artifact')
+    assert MirrorSelector(rankings).download([failing, working], dest, progress=False, sha256=synthetic_sha256(SIZE))
+    assert hash_file(dest) == synthetic_sha256(SIZE)
+    assert rankings.order([failing, working]) == [working, failing]
+
+
+def test_segmented_download_fails_over_mid_transfer(server, other_server, rankings, tmp_path):
+    # Rank the mirror that drops connections first, so its segments are left half done
+    dropping = server.artifact_url(SIZE, cut=256 * 1024)
+    working = other_server.artifact_url(SIZE)
+    rankings.record_probe(dropping, 0.001, 1e9)
+    rankings.record_probe(working, 0.5, 1e6)
+    dest = str(tmp_path / 'artifact')
+    assert MirrorSelector(rankings).download([dropping, working], dest, connections=2, progress=False,
+                                             sha256=synthetic_sha256(SIZE))
+    assert os.path.getsize(dest) == SIZE
+    assert not os.path.exists(dest + SEGMENTS_SUFFIX)
+    assert rankings.order([dropping, working]) == [working, dropping]
+
+
+def test_every_mirror_failing(server, other_server, rankings, tmp_path):
+    dest = str(tmp_path / 'artifact')
+    urls = [server.artifact_url(1024, fail=404), other_server.artifact_url(1024, fail=503)]
+    assert not MirrorSelector(rankings).download(urls, dest, progress=False)
+    assert not os.path.exists(dest)
+
+
+def test_checksum_file_fails_over_with_the_artifact(server, offline_url, rankings, tmp_path):
+    # The primary host went down since it was ranked first, for the artifact and its checksum file
+    rankings.record_probe(offline_url, 0.001, 1e9)
+    rankings.record_probe(server.url, 0.5, 1e6)
+    step = {
+        'type': 'http_get',
+        'urls': [f"{offline_url}/artifacts/{SIZE}", server.artifact_url(SIZE)],
+        'sha256_url': [f"{offline_url}/artifacts/{SIZE}.sha256", f"{server.url}/artifacts/{SIZE}.sha256"],
+        'dest': '{download_dir}/artifact',
+        'connections': 2,
+    }
+    ctx = StepContext({'download_dir': str(tmp_path)}, mirrors=MirrorSelector(rankings))
+    assert run_step(step, ctx)
+    assert hash_file(str(tmp_path / 'artifact')) == synthetic_sha256(SIZE)
+    assert rankings.order([f"{offline_url}/x", server.url]) == [server.url, f"{offline_url}/x"]
@@ -0,0 +1,90 @@
+import os
+
+import pytest
+
+from toolbox import store as store_module
+from toolbox.store import ArtifactStore, hash_file
+
+
+def write(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(content)
+    return path
+
+
+def read(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+@pytest.fixture
+def store(downloads):
+    return ArtifactStore(downloads)
+
+
+@pytest.fixture
+def views(store, downloads):
+    """Two ingested tools sharing one file."""
+    write(os.path.join(downloads, 'Docker', 'containerd.rpm'), b'containerd')
+    write(os.path.join(downloads, 'Docker', 'docker.rpm'), b'docker')
+    write(os.path.join(downloads, 'Podman', 'containerd.rpm'), b'containerd')
+    store.ingest_tool('Docker', os.path.join(downloads, 'Docker'))
+    store.ingest_tool('Podman', os.path.join(downloads, 'Podman'))
+    return os.path.join(downloads, 'Docker'), os.path.join(downloads, 'Podman')
+
+
+def test_ingest_stores_each_content_once(store, views):
+    docker, podman = views
+    sha256 = hash_file(os.path.join(docker, 'containerd.rpm'))
+    assert store.load_manifest('Docker')['files']['containerd.rpm'] == {'sha256': sha256, 'size': 10}
+    shared = os.stat(store.object_path(sha256))
+    # Both views and the object are one inode
+    assert shared.st_nlink == 3
+    assert os.path.samefile(os.path.join(podman, 'containerd.rpm'), store.object_path(sha256))
+    objects = [f for _, _, files in os.walk(store.objects_dir) for f in files]
+    assert len(objects) == 2
+
+
+def test_materialize_rebuilds_missing_view_files(store, views):
+    docker, _ = views
+    os.remove(os.path.join(docker, 'docker.rpm'))
+    assert store.materialize('Docker', docker)
+    assert read(os.path.join(docker, 'docker.rpm')) == b'docker'
+    assert not store.materialize('Unknown', docker)
+
+
+def test_prune_keeps_objects_still_referenced(store, views):
+    _, podman = views
+    os.remove(store.manifest_path('Docker'))
+    # docker.rpm was only Docker's; containerd.rpm is still Podman's
+    assert store.prune() == 1
+    assert store.materialize('Podman', podman)
+    assert not store.has(hash_file(os.path.join(podman, 'containerd.rpm')) + 'x')
+
+
+def test_detached_views_can_be_rewritten_in_place(store, views, monkeypatch):
+    docker, podman = views
+    assert store.detach('Docker', docker) == 2
+    assert os.stat(os.path.join(docker, 'containerd.rpm')).st_nlink == 1
+    # A download step overwrites the file in place, like curl -o does
+    with open(os.path.join(docker, 'containerd.rpm'), 'r+b') as f:
+        f.write(b'CONTAINERD')
+    assert read(os.path.join(podman, 'containerd.rpm')) == b'containerd'
+
+    hashed = []
+    monkeypatch.setattr(store_module, 'hash_file', lambda path: hashed.append(path) or hash_file(path))
+    files = store.ingest_tool('Docker', docker)
+    # Only the rewritten file is hashed; the untouched copy is known from detach
+    assert hashed == [os.path.join(docker, 'containerd.rpm')]
+    assert files['containerd.rpm']['sha256'] == hash_file(os.path.join(docker, 'containerd.rpm'))
+    assert read(os.path.join(podman, 'containerd.rpm')) == b'containerd'
+
+
+def test_private_copies_do_not_share_the_object(store, views, downloads):
+    docker, _ = views
+    sha256 = store.load_manifest('Docker')['files']['docker.rpm']['sha256']
+    dest = os.path.join(downloads, 'Other', 'docker.rpm')
+    assert store.link_object(sha256, dest, private=True)
+    assert not os.path.samefile(dest, store.object_path(sha256))
+    assert not store.link_object('0' * 64, dest)
@@ -0,0 +1,67 @@
+import os
+import json
+
+from toolbox.store import hash_file
+from toolbox.transfer import (download_file, segmented_download, probe_ranges, MIN_SEGMENT_SIZE,
+                              PART_SUFFIX, SEGMENTS_SUFFIX)
+from toolbox.http_client import ConnectionPool
+from tests.conftest import synthetic_sha256
+
+SIZE = 2 * MIN_SEGMENT_SIZE
+
+
+def test_probe_ranges(server):
+    pool = ConnectionPool()
+    assert probe_ranges(pool, server.artifact_url(SIZE))[1] == SIZE
+    assert probe_ranges(pool, server.artifact_url(SIZE, ranges=False))[1] is None
+
+
+def test_single_stream_resumes_after_dropped_connections(server, tmp_path):
+    # Every response is cut after 256 KiB, so only resuming gets the whole file
+    size = 1024 * 1024
+    dest = str(tmp_path / 'artifact')
+    assert download_file(server.artifact_url(size, cut=256 * 1024), dest, progress=False, retries=4)
+    assert hash_file(dest) == synthetic_sha256(size)
+    assert not os.path.exists(dest + PART_SUFFIX)
+
+
+def test_single_stream_gives_up_on_client_errors(server, tmp_path):
+    dest = str(tmp_path / 'artifact')
+    assert not download_file(server.artifact_url(1024, fail=404), dest, progress=False)
+    assert not os.path.exists(dest)
+
+
+def test_segmented_download(server, tmp_path):
+    dest = str(tmp_path / 'artifact')
+    assert segmented_download(server.artifact_url(SIZE), dest, connections=4, progress=False,
+                              sha256=synthetic_sha256(SIZE))
+    assert os.path.getsize(dest) == SIZE
+    assert not os.path.exists(dest + SEGMENTS_SUFFIX)
+
+
+def test_segmented_download_resumes_each_segment(server, tmp_path):
+    dest = str(tmp_path / 'artifact')
+    cut = 512 * 1024
+    assert not segmented_download(server.artifact_url(SIZE, cut=cut), dest, connections=4,
+                                  progress=False, retries=0)
+    with open(dest + SEGMENTS_SUFFIX, 'r', encoding='utf-8') as f:
+        state = json.load(f)
+    assert state['total'] == SIZE
+    assert all(position == start + cut for start, _, position in state['segments'])
+
+    assert segmented_download(server.artifact_url(SIZE), dest, connections=4, progress=False,
+                              sha256=synthetic_sha256(SIZE))
+    assert not os.path.exists(dest + SEGMENTS_SUFFIX)
+    assert not os.path.exists(dest + PART_SUFFIX)
+
+
+def test_segmented_download_falls_back_without_ranges(server, tmp_path):
+    dest = str(tmp_path / 'artifact')
+    assert segmented_download(server.artifact_url(SIZE, ranges=False), dest, connections=4,
+                              progress=False, sha256=synthetic_sha256(SIZE))
+
+
+def test_checksum_mismatch_removes_the_file(server, tmp_path):
+    dest = str(tmp_path / 'artifact')
+    assert not segmented_download(server.artifact_url(1024), dest, progress=False, sha256='0' * 64)
+    assert not os.path.exists(dest)
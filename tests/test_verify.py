@@ -0,0 +1,95 @@
+import os
+import time
+
+import pytest
+
+from toolbox.state import StateDB
+from toolbox.store import ArtifactStore
+from toolbox.verify import Verifier
+
+SHARED = b'shared' * 1000
+
+
+@pytest.fixture
+def store(downloads):
+    """Docker and Podman share one hardlinked file; Docker has one of its own."""
+    store = ArtifactStore(downloads)
+    for tool, files in {'Docker': {'shared.rpm': SHARED, 'docker.rpm': b'docker' * 1000},
+                        'Podman': {'shared.rpm': SHARED}}.items():
+        tool_dir = os.path.join(downloads, tool)
+        os.makedirs(tool_dir)
+        for name, content in files.items():
+            with open(os.path.join(tool_dir, name), 'wb') as f:
+                f.write(content)
+        store.ingest_tool(tool, tool_dir)
+    return store
+
+
+@pytest.fixture
+def state(tmp_path):
+    return StateDB(str(tmp_path / 'state.json'))
+
+
+@pytest.fixture
+def hashes(monkeypatch):
+    """Records every path Verifier hashes."""
+    paths = []
+    original = Verifier._hash
+    monkeypatch.setattr(Verifier, '_hash', staticmethod(lambda path: paths.append(path) or original(path)))
+    return paths
+
+
+def overwrite(path, content):
+    """Rewrites path in place with content, keeping its mtime."""
+    st = os.stat(path)
+    with open(path, 'r+b') as f:
+        f.write(content)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns))
+
+
+def reasons(result):
+    return [(os.path.basename(p.path), p.reason.split(' ')[0]) for p in result.problems]
+
+
+def test_intact_tools_pass_and_hardlinks_are_hashed_once(store, hashes):
+    results = Verifier(store, jobs=4).verify(['Docker', 'Podman'])
+    assert [(r.files, r.hashed, r.problems) for r in results.values()] == [(2, 2, []), (1, 1, [])]
+    # shared.rpm is one inode in both tools
+    assert len(hashes) == 2
+
+
+def test_corrupted_file_of_the_same_size(store, downloads):
+    overwrite(os.path.join(downloads, 'Docker', 'docker.rpm'), b'DOCKER')
+    results = Verifier(store).verify(['Docker', 'Podman'])
+    assert reasons(results['Docker']) == [('docker.rpm', 'sha256')]
+    assert results['Podman'].problems == []
+
+
+def test_truncated_and_missing_files(store, downloads):
+    with open(os.path.join(downloads, 'Docker', 'docker.rpm'), 'r+b') as f:
+        f.truncate(10)
+    os.remove(os.path.join(downloads, 'Podman', 'shared.rpm'))
+    results = Verifier(store).verify(['Docker', 'Podman', 'Unknown'])
+    assert reasons(results['Docker']) == [('docker.rpm', 'size')]
+    assert reasons(results['Podman']) == [('shared.rpm', 'missing')]
+    assert [p.reason for p in results['Unknown'].problems] == ["no store manifest to verify against"]
+
+
+def test_verified_files_are_not_hashed_again(store, state, hashes):
+    Verifier(store, state).verify(['Docker', 'Podman'])
+    del hashes[:]
+    results = Verifier(store, state).verify(['Docker', 'Podman'])
+    assert [r.hashed for r in results.values()] == [0, 0] and hashes == []
+    results = Verifier(store, state, full=True).verify(['Docker'])
+    assert results['Docker'].hashed == 2
+
+
+def test_stale_record_is_not_reused(store, state, downloads):
+    Verifier(store, state).verify(['Docker'])
+    # Outlast coarse ctime granularity, so the rewrite gets a newer ctime
+    time.sleep(0.02)
+    # Same size, same mtime, same inode: only ctime tells the record is stale
+    overwrite(os.path.join(downloads, 'Docker', 'docker.rpm'), b'DOCKER')
+    results = Verifier(store, state).verify(['Docker'])
+    assert results['Docker'].hashed == 1
+    assert reasons(results['Docker']) == [('docker.rpm', 'sha256')]
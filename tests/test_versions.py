@@ -0,0 +1,66 @@
+import json
+
+import pytest
+
+from toolbox.http_cache import HTTPCache
+from toolbox.versions import VersionResolver, validate_version, LOCK_VERSION
+
+HELM = {'name': 'Helm', 'version': {'github': 'helm/helm', 'spec': '>=2.0.0,<4.0.0', 'default': '2.0.0'}}
+
+
+@pytest.fixture
+def lock_path(tmp_path):
+    return str(tmp_path / 'versions.lock.json')
+
+
+def _resolver(lock_path, api, tmp_path):
+    return VersionResolver(lock_path, cache=HTTPCache(str(tmp_path / 'cache')), github_api=api)
+
+
+def test_highest_matching_release_is_pinned(server, lock_path, tmp_path):
+    resolver = _resolver(lock_path, server.url, tmp_path)
+    # v3.0.0 is a draft and v3.0.0-rc.1 a pre-release
+    assert resolver.resolve([HELM, {'name': 'Plain'}]) == {'Helm': '2.1.0'}
+    resolver.save()
+    resolver.close()
+    with open(lock_path, 'r', encoding='utf-8') as f:
+        lock = json.load(f)
+    assert lock['version'] == LOCK_VERSION
+    assert lock['tools']['Helm']['version'] == '2.1.0' and lock['tools']['Helm']['resolved']
+
+
+def test_pinned_versions_are_reused_offline(server, offline_url, lock_path, tmp_path):
+    resolver = _resolver(lock_path, server.url, tmp_path)
+    resolver.resolve([HELM])
+    resolver.save()
+
+    offline = _resolver(lock_path, offline_url, tmp_path / 'empty')
+    assert offline.resolve([HELM]) == {'Helm': '2.1.0'}
+    assert offline.version_for(HELM) == '2.1.0'
+
+
+def test_changed_spec_resolves_again(server, lock_path, tmp_path):
+    resolver = _resolver(lock_path, server.url, tmp_path)
+    resolver.resolve([HELM])
+    older = {'name': 'Helm', 'version': dict(HELM['version'], spec='<2.1.0')}
+    assert resolver.locked(older) is None
+    assert resolver.resolve([older]) == {'Helm': '2.0.0'}
+
+
+def test_unreachable_feed_falls_back_to_the_default(server, offline_url, lock_path, tmp_path):
+    offline = _resolver(lock_path, offline_url, tmp_path)
+    assert offline.resolve([HELM]) == {'Helm': '2.0.0'}
+    offline.save()
+    assert offline.locked(HELM, resolved_only=True) is None
+
+    # The default is only a stand-in: the next run with a reachable feed resolves it
+    online = _resolver(lock_path, server.url, tmp_path)
+    assert online.resolve([HELM]) == {'Helm': '2.1.0'}
+
+
+def test_validate_version():
+    assert validate_version(HELM['version']) == []
+    problems = validate_version({'github': 'helm', 'tag_regex': '(', 'extra': 1})
+    assert problems[:3] == ["unknown version key 'extra'", "'version' needs 'github' as owner/repo",
+                            "'version' needs a 'default' version"]
+    assert problems[3].startswith("invalid 'tag_regex'")
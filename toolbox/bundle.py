@@ -0,0 +1,639 @@
+#!/usr/bin/env python3
+"""
+Native bundle writer for the downloads/ tree.
+
+Writes a ZIP archive of the artifact store (each object once) plus any
+loose files that are not in a store manifest, without shelling out to zip:
+
+- already-compressed formats (RPMs, tarballs, wheels, ...) are stored as-is,
+- everything else is deflated on a pool of worker threads,
+- a SHA256SUMS file and a bundle-manifest.json describing every tool's files
+  are added to the bundle, and the manifest is also written next to it,
+- the output can be split into fixed-size volumes for removable media
+  (reassemble with `cat bundle.zip.* > bundle.zip`),
+- a contents listing of the tool directories can be written for release notes.
+
+With --since, only the store objects, tool manifests and loose files that
+changed since a previous bundle (given by its .manifest.json) are bundled,
+together with bundle-delta.json listing the files to delete. On the
+airgapped side, `relay apply-bundle` patches an existing downloads/ tree in
+place: it deletes what the delta removes, extracts the new files
+atomically, rebuilds the tool directories from the store and verifies every
+file of the resulting tree against the new manifest by sha256.
+"""
+
+import os
+import sys
+import json
+import time
+import zlib
+import struct
+import hashlib
+import argparse
+import tempfile
+import threading
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from toolbox.store import ArtifactStore, STORE_DIRNAME, IGNORED_SUFFIXES, hash_file
+
+# Extensions of formats that are already compressed; deflating them again wastes CPU
+STORED_EXTENSIONS = (
+    '.rpm', '.gz', '.tgz', '.xz', '.txz', '.bz2', '.tbz2', '.zst', '.zip', '.whl', '.jar', '.war',
+    '.7z', '.lz4', '.png', '.jpg', '.jpeg', '.gif', '.iso', '.qcow2', '.deb', '.apk',
+)
+# Keep the compressed copy only if it saves at least this fraction
+MIN_COMPRESSION_GAIN = 0.03
+COPY_BUFFER_SIZE = 4 * 1024 * 1024
+COMPRESS_SPOOL_MAX_SIZE = 16 * 1024 * 1024
+DEFAULT_JOBS = os.cpu_count() or 4
+MANIFEST_NAME = 'bundle-manifest.json'
+SUMS_NAME = 'SHA256SUMS'
+DELTA_NAME = 'bundle-delta.json'
+OBJECTS_PREFIX = f'{STORE_DIRNAME}/objects/'
+MANIFESTS_PREFIX = f'{STORE_DIRNAME}/manifests/'
+SIZE_UNITS = {'': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3, 'T': 1024 ** 4}
+
+ZIP64_LIMIT = 0xFFFFFFFF
+ZIP_STORED = 0
+ZIP_DEFLATED = 8
+UTF8_FLAG = 0x0800
+
+
+def parse_size(value: str) -> int:
+    """Parses sizes like '4G', '700M' or '1048576' into bytes."""
+    value = value.strip().upper().rstrip('B')
+    unit = value[-1] if value and value[-1] in SIZE_UNITS else ''
+    number = value[:-1] if unit else value
+    return int(float(number) * SIZE_UNITS[unit])
+
+
+def _dos_time(mtime: float) -> Tuple[int, int]:
+    t = time.localtime(max(mtime, 315532800)) # DOS dates start in 1980
+    return ((t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2),
+            ((t.tm_year - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday)
+
+
+class VolumeWriter:
+    """
+    File-like sink that appends to a single file, or to numbered volumes
+    (<path>.001, <path>.002, ...) of at most volume_size bytes each, and can
+    patch bytes already written at an absolute offset.
+    """
+
+    def __init__(self, path: str, volume_size: Optional[int] = None):
+        self.path = path
+        self.volume_size = volume_size
+        self.volumes: List[str] = []
+        self._files = []
+        self.offset = 0
+
+    def _volume(self, index):
+        while len(self._files) <= index:
+            name = self.path if not self.volume_size else f"{self.path}.{len(self._files) + 1:03d}"
+            self.volumes.append(name)
+            self._files.append(open(name, 'w+b'))
+        return self._files[index]
+
+    def _write_at(self, data, offset):
+        view = memoryview(data)
+        while view:
+            if self.volume_size:
+                index, position = divmod(offset, self.volume_size)
+                room = self.volume_size - position
+            else:
+                index, position, room = 0, offset, len(view)
+            f = self._volume(index)
+            f.seek(position)
+            f.write(view[:room])
+            offset += min(room, len(view))
+            view = view[room:]
+
+    def write(self, data):
+        self._write_at(data, self.offset)
+        self.offset += len(data)
+
+    def patch(self, data, offset):
+        self._write_at(data, offset)
+
+    def close(self):
+        for f in self._files:
+            f.close()
+
+
+class _Entry:
+    def __init__(self, name, method, crc, compressed_size, size, mtime, mode, offset):
+        self.name = name.encode('utf-8')
+        self.method = method
+        self.crc = crc
+        self.compressed_size = compressed_size
+        self.size = size
+        self.mtime = mtime
+        self.mode = mode
+        self.offset = offset
+
+
+class ZipStreamWriter:
+    """Minimal streaming ZIP writer with ZIP64 support, writing into a VolumeWriter."""
+
+    def __init__(self, out: VolumeWriter):
+        self.out = out
+        self.entries: List[_Entry] = []
+
+    def _local_header(self, entry: _Entry) -> bytes:
+        zip64 = entry.size >= ZIP64_LIMIT or entry.compressed_size >= ZIP64_LIMIT
+        extra = struct.pack('<HHQQ', 0x0001, 16, entry.size, entry.compressed_size) if zip64 else b''
+        dos_time, dos_date = _dos_time(entry.mtime)
+        header = struct.pack(
+            '<IHHHHHIIIHH', 0x04034b50, 45 if zip64 else 20, UTF8_FLAG, entry.method, dos_time, dos_date,
+            entry.crc, ZIP64_LIMIT if zip64 else entry.compressed_size,
+            ZIP64_LIMIT if zip64 else entry.size, len(entry.name), len(extra))
+        return header + entry.name + extra
+
+    def add_file(self, name: str, path: str, st: os.stat_result):
+        """Stores a file without compression, streaming it and patching in its CRC afterwards."""
+        entry = _Entry(name, ZIP_STORED, 0, st.st_size, st.st_size, st.st_mtime, st.st_mode, self.out.offset)
+        header = self._local_header(entry)
+        self.out.write(header)
+        crc = 0
+        with open(path, 'rb') as f:
+            while True:
+                chunk = f.read(COPY_BUFFER_SIZE)
+                if not chunk:
+                    break
+                crc = zlib.crc32(chunk, crc)
+                self.out.write(chunk)
+        entry.crc = crc
+        self.out.patch(struct.pack('<I', crc), entry.offset + 14)
+        self.entries.append(entry)
+
+    def add_compressed(self, name: str, data, crc: int, compressed_size: int, st: os.stat_result):
+        """Adds a member whose raw deflate stream was produced beforehand (data is a file object)."""
+        entry = _Entry(name, ZIP_DEFLATED, crc, compressed_size, st.st_size, st.st_mtime, st.st_mode, self.out.offset)
+        self.out.write(self._local_header(entry))
+        data.seek(0)
+        while True:
+            chunk = data.read(COPY_BUFFER_SIZE)
+            if not chunk:
+                break
+            self.out.write(chunk)
+        self.entries.append(entry)
+
+    def add_bytes(self, name: str, content: bytes, mtime: Optional[float] = None):
+        entry = _Entry(name, ZIP_STORED, zlib.crc32(content), len(content), len(content),
+                       mtime or time.time(), 0o100644, self.out.offset)
+        self.out.write(self._local_header(entry))
+        self.out.write(content)
+        self.entries.append(entry)
+
+    def finish(self):
+        """Writes the central directory and end records."""
+        cd_offset = self.out.offset
+        for entry in self.entries:
+            fields = []
+            size = entry.size
+            compressed_size = entry.compressed_size
+            offset = entry.offset
+            if entry.size >= ZIP64_LIMIT:
+                fields.append(entry.size)
+                size = ZIP64_LIMIT
+            if entry.compressed_size >= ZIP64_LIMIT:
+                fields.append(entry.compressed_size)
+                compressed_size = ZIP64_LIMIT
+            if entry.offset >= ZIP64_LIMIT:
+                fields.append(entry.offset)
+                offset = ZIP64_LIMIT
+            extra = struct.pack(f'<HH{len(fields)}Q', 0x0001, 8 * len(fields), *fields) if fields else b''
+            dos_time, dos_date = _dos_time(entry.mtime)
+            self.out.write(struct.pack(
+                '<IHHHHHHIIIHHHHHII', 0x02014b50, 0x031E, 45 if fields else 20, UTF8_FLAG, entry.method,
+                dos_time, dos_date, entry.crc, compressed_size, size, len(entry.name), len(extra), 0, 0, 0,
+                (entry.mode & 0xFFFF) << 16, offset) + entry.name + extra)
+        cd_size = self.out.offset - cd_offset
+        count = len(self.entries)
+
+        if count >= 0xFFFF or cd_offset >= ZIP64_LIMIT or cd_size >= ZIP64_LIMIT:
+            zip64_eocd_offset = self.out.offset
+            self.out.write(struct.pack('<IQHHIIQQQQ', 0x06064b50, 44, 0x031E, 45, 0, 0,
+                                       count, count, cd_size, cd_offset))
+            self.out.write(struct.pack('<IIQI', 0x07064b50, 0, zip64_eocd_offset, 1))
+        self.out.write(struct.pack('<IHHHHIIH', 0x06054b50, 0, 0, min(count, 0xFFFF), min(count, 0xFFFF),
+                                   min(cd_size, ZIP64_LIMIT), min(cd_offset, ZIP64_LIMIT), 0))
+
+
+def _deflate_file(path: str):
+    """Deflates a file into a spooled temp file. Returns (data, crc, compressed_size)."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, -15)
+    data = tempfile.SpooledTemporaryFile(max_size=COMPRESS_SPOOL_MAX_SIZE)
+    crc = 0
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(COPY_BUFFER_SIZE)
+            if not chunk:
+                break
+            crc = zlib.crc32(chunk, crc)
+            data.write(compressor.compress(chunk))
+    data.write(compressor.flush())
+    return data, crc, data.tell()
+
+
+def collect_members(downloads_dir: str) -> Tuple[List[Tuple[str, str]], Dict]:
+    """
+    Returns the files to bundle as (archive name, path) pairs, and the
+    bundle manifest ({"tools": {tool: {relpath: {sha256, size}}}, "loose": [...]}).
+    Store objects are bundled once; per-tool files covered by a manifest are
+    left out because Relay rebuilds them from the store.
+    """
+    store = ArtifactStore(downloads_dir)
+    tools = {}
+    if os.path.isdir(store.manifests_dir):
+        for filename in sorted(os.listdir(store.manifests_dir)):
+            if filename.endswith('.json'):
+                tool_name = filename[:-len('.json')]
+                tools[tool_name] = (store.load_manifest(tool_name) or {}).get('files', {})
+
+    members = []
+    loose = []
+    for dirpath, dirnames, filenames in os.walk(downloads_dir):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            if filename.endswith(IGNORED_SUFFIXES + ('.tmp',)):
+                continue
+            path = os.path.join(dirpath, filename)
+            if os.path.islink(path) or not os.path.isfile(path):
+                continue
+            name = os.path.relpath(path, downloads_dir).replace(os.sep, '/')
+            top, _, rest = name.partition('/')
+            if top != STORE_DIRNAME and rest in tools.get(top, {}):
+                continue
+            members.append((name, path))
+            if top != STORE_DIRNAME:
+                loose.append(name)
+    return members, {"tools": tools, "loose": loose}
+
+
+def _object_name(sha256: str) -> str:
+    return f"{OBJECTS_PREFIX}{sha256[:2]}/{sha256}"
+
+
+def plan_delta(members: List[Tuple[str, str]], manifest: Dict, base: Dict) -> Tuple[List[Tuple[str, str]], Dict]:
+    """
+    Narrows the members of a full bundle down to what changed since base (the
+    manifest of a previous bundle): store objects base didn't reference, tool
+    manifests that differ and loose files whose content changed. Returns the
+    members and the delta ({"delete": [paths]}) the receiving side applies.
+    """
+    tools = manifest['tools']
+    base_tools = base.get('tools', {})
+    objects = {entry['sha256'] for files in tools.values() for entry in files.values()}
+    base_objects = {entry['sha256'] for files in base_tools.values() for entry in files.values()}
+    base_loose = base.get('loose_files', {})
+
+    selected = []
+    for name, path in members:
+        if name.startswith(OBJECTS_PREFIX):
+            sha256 = os.path.basename(name)
+            if sha256 in base_objects or sha256 not in objects:
+                continue
+        elif name.startswith(MANIFESTS_PREFIX):
+            tool_name = name[len(MANIFESTS_PREFIX):-len('.json')]
+            if tool_name in base_tools and base_tools[tool_name] == tools.get(tool_name):
+                continue
+        elif name.partition('/')[0] != STORE_DIRNAME:
+            known = base_loose.get(name)
+            if known and known['size'] == os.path.getsize(path) and known['sha256'] == hash_file(path):
+                manifest.setdefault('loose_files', {})[name] = known
+                continue
+        selected.append((name, path))
+
+    delete = []
+    for tool_name, files in sorted(base_tools.items()):
+        current = tools.get(tool_name)
+        if current is None:
+            delete.append(f"{MANIFESTS_PREFIX}{tool_name}.json")
+        # Changed files go too: the view is rebuilt from the new object
+        delete.extend(f"{tool_name}/{relpath}" for relpath, entry in sorted(files.items())
+                      if (current or {}).get(relpath) != entry)
+    delete.extend(_object_name(sha256) for sha256 in sorted(base_objects - objects))
+    delete.extend(name for name in base.get('loose', []) if name not in manifest['loose'])
+    return selected, {"delete": delete}
+
+
+def contents_listing(downloads_dir: str) -> str:
+    """Indented directory tree of downloads/ (as `find . -type d | sed`), skipping the store."""
+    lines = ['.']
+    store = ArtifactStore(downloads_dir)
+    tool_dirs = set()
+    for dirpath, dirnames, _ in os.walk(downloads_dir):
+        dirnames[:] = sorted(d for d in dirnames if not (dirpath == downloads_dir and d == STORE_DIRNAME))
+        rel = os.path.relpath(dirpath, downloads_dir)
+        if rel != '.':
+            tool_dirs.add(rel.replace(os.sep, '/'))
+    # Tool directories that only exist in the store are listed too
+    for name in os.listdir(store.manifests_dir) if os.path.isdir(store.manifests_dir) else []:
+        if name.endswith('.json'):
+            tool = name[:-len('.json')]
+            tool_dirs.add(tool)
+            for relpath in (store.load_manifest(tool) or {}).get('files', {}):
+                parts = relpath.split('/')[:-1]
+                for i in range(len(parts)):
+                    tool_dirs.add('/'.join([tool] + parts[:i + 1]))
+    for rel in sorted(tool_dirs):
+        parts = rel.split('/')
+        lines.append('   ' * len(parts) + parts[-1])
+    return '\n'.join(lines) + '\n'
+
+
+def write_bundle(downloads_dir: str, output: str, jobs: int = DEFAULT_JOBS,
+                 volume_size: Optional[int] = None, members: Optional[Iterable[Tuple[str, str]]] = None,
+                 manifest: Optional[Dict] = None, extra_files: Optional[Dict[str, bytes]] = None) -> List[str]:
+    """
+    Writes the bundle and returns the paths of the files written (one, or one
+    per volume). members/manifest default to collect_members(downloads_dir).
+    """
+    if members is None:
+        members, manifest = collect_members(downloads_dir)
+    members = list(members)
+    manifest = manifest if manifest is not None else {}
+    # Hashes of loose files let a later bundle be built as a delta against this one
+    loose_files = manifest.setdefault('loose_files', {})
+    out = VolumeWriter(output, volume_size)
+    writer = ZipStreamWriter(out)
+    sums = []
+
+    def prepare(name, path):
+        """Runs on a worker: hash the file, and deflate it if that is worthwhile."""
+        st = os.stat(path)
+        if name.startswith(OBJECTS_PREFIX):
+            # Store objects are named by their sha256 already
+            sha256 = os.path.basename(path)
+        else:
+            digest = hashlib.sha256()
+            with open(path, 'rb') as f:
+                while True:
+                    chunk = f.read(COPY_BUFFER_SIZE)
+                    if not chunk:
+                        break
+                    digest.update(chunk)
+            sha256 = digest.hexdigest()
+        compressed = None
+        if not name.lower().endswith(STORED_EXTENSIONS) and st.st_size > 0:
+            data, crc, compressed_size = _deflate_file(path)
+            if compressed_size <= st.st_size * (1 - MIN_COMPRESSION_GAIN):
+                compressed = (data, crc, compressed_size)
+            else:
+                data.close()
+        return st, sha256, compressed
+
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+            # Bounded look-ahead keeps memory and temp space flat on huge trees
+            window = max(2, jobs * 2)
+            futures = []
+            index = 0
+            while index < len(members) or futures:
+                while index < len(members) and len(futures) < window:
+                    futures.append((members[index], pool.submit(prepare, *members[index])))
+                    index += 1
+                (name, path), future = futures.pop(0)
+                st, sha256, compressed = future.result()
+                if compressed:
+                    data, crc, compressed_size = compressed
+                    writer.add_compressed(name, data, crc, compressed_size, st)
+                    data.close()
+                else:
+                    writer.add_file(name, path, st)
+                sums.append(f"{sha256}  {name}")
+                if name.partition('/')[0] != STORE_DIRNAME:
+                    loose_files[name] = {"sha256": sha256, "size": st.st_size}
+
+        for name, content in (extra_files or {}).items():
+            writer.add_bytes(name, content)
+            sums.append(f"{hashlib.sha256(content).hexdigest()}  {name}")
+        manifest_bytes = json.dumps(manifest, indent=2, sort_keys=True).encode('utf-8')
+        writer.add_bytes(MANIFEST_NAME, manifest_bytes)
+        sums.append(f"{hashlib.sha256(manifest_bytes).hexdigest()}  {MANIFEST_NAME}")
+        writer.add_bytes(SUMS_NAME, ('\n'.join(sums) + '\n').encode('utf-8'))
+        writer.finish()
+    finally:
+        out.close()
+
+    with open(output + '.manifest.json', 'wb') as f:
+        f.write(manifest_bytes)
+    return out.volumes
+
+
+def _target_path(downloads_dir: str, name: str) -> str:
+    """Maps an archive name to a path in downloads_dir, refusing names that would escape it."""
+    parts = name.split('/')
+    if name.startswith('/') or any(part in ('', '.', '..') for part in parts):
+        raise ValueError(f"Unsafe path in bundle: {name}")
+    return os.path.join(downloads_dir, *parts)
+
+
+def _remove_empty_dirs(path: str, root: str):
+    """Removes path's parent directories up to root while they are empty."""
+    directory = os.path.dirname(path)
+    while os.path.abspath(directory) != os.path.abspath(root):
+        try:
+            os.rmdir(directory)
+        except OSError:
+            return
+        directory = os.path.dirname(directory)
+
+
+def _extract_member(bundle_path: str, local: threading.local, name: str, dest: str, sha256: Optional[str]):
+    """Runs on a worker: extract one member next to dest, check its hash, then move it into place."""
+    if not hasattr(local, 'zip'):
+        local.zip = zipfile.ZipFile(bundle_path)
+    os.makedirs(os.path.dirname(dest), exist_ok=True)
+    tmp_path = dest + '.part'
+    digest = hashlib.sha256()
+    try:
+        with local.zip.open(name) as src, open(tmp_path, 'wb') as f:
+            while True:
+                chunk = src.read(COPY_BUFFER_SIZE)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                f.write(chunk)
+        if sha256 and digest.hexdigest() != sha256:
+            raise ValueError(f"Checksum mismatch for {name}")
+        os.replace(tmp_path, dest)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def verify_tree(downloads_dir: str, manifest: Dict, jobs: int = DEFAULT_JOBS) -> List[str]:
+    """
+    Hashes every tool file and loose file the manifest lists, in parallel.
+    Returns the paths (relative to downloads_dir) that are missing or differ.
+    """
+    expected = {f"{tool_name}/{relpath}": entry
+                for tool_name, files in manifest.get('tools', {}).items() for relpath, entry in files.items()}
+    expected.update(manifest.get('loose_files', {}))
+
+    def check(name):
+        path = _target_path(downloads_dir, name)
+        entry = expected[name]
+        try:
+            if os.path.getsize(path) != entry['size']:
+                return False
+            return hash_file(path) == entry['sha256']
+        except OSError:
+            return False
+
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+        names = sorted(expected)
+        return [name for name, ok in zip(names, pool.map(check, names)) if not ok]
+
+
+def apply_bundle(bundle_path: str, downloads_dir: str, jobs: int = DEFAULT_JOBS, force: bool = False) -> bool:
+    """
+    Applies a full or delta bundle to downloads_dir in place and verifies
+    the result against the bundle's manifest. Returns True if the tree
+    matches it afterwards.
+    """
+    with zipfile.ZipFile(bundle_path) as bundle:
+        names = set(bundle.namelist())
+        manifest_bytes = bundle.read(MANIFEST_NAME)
+        delta = json.loads(bundle.read(DELTA_NAME)) if DELTA_NAME in names else None
+        sums = {}
+        for line in bundle.read(SUMS_NAME).decode('utf-8').splitlines():
+            sha256, _, name = line.partition('  ')
+            sums[name] = sha256
+    manifest = json.loads(manifest_bytes)
+    manifest_path = os.path.join(downloads_dir, MANIFEST_NAME)
+
+    if delta is not None:
+        try:
+            current = hash_file(manifest_path)
+        except OSError:
+            current = None
+        if current != delta.get('base'):
+            print(f"{downloads_dir} is not the release this delta was built against "
+                  f"({'no ' + MANIFEST_NAME if current is None else MANIFEST_NAME + ' differs'}).")
+            if not force:
+                print("Apply the matching full bundle first, or use --force to patch it anyway.")
+                return False
+
+        for name in delta.get('delete', []):
+            path = _target_path(downloads_dir, name)
+            if os.path.isfile(path) or os.path.islink(path):
+                os.remove(path)
+                _remove_empty_dirs(path, downloads_dir)
+        print(f"Deleted {len(delta.get('delete', []))} file(s) removed since the previous release")
+
+    # The manifest is written last, so an interrupted apply is never mistaken for a finished one
+    skipped = {MANIFEST_NAME, DELTA_NAME} | ({SUMS_NAME} if delta is not None else set())
+    members = sorted(name for name in names if name not in skipped and not name.endswith('/'))
+    local = threading.local()
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+        futures = [pool.submit(_extract_member, bundle_path, local, name, _target_path(downloads_dir, name),
+                               sums.get(name)) for name in members]
+        for future in futures:
+            future.result()
+    print(f"Extracted {len(members)} file(s)")
+
+    if delta is not None and os.path.exists(os.path.join(downloads_dir, SUMS_NAME)):
+        # The previous release's checksum list no longer describes the tree
+        os.remove(os.path.join(downloads_dir, SUMS_NAME))
+
+    store = ArtifactStore(downloads_dir)
+    for tool_name in manifest.get('tools', {}):
+        store.materialize(tool_name, os.path.join(downloads_dir, tool_name))
+
+    mismatches = verify_tree(downloads_dir, manifest, jobs)
+    if mismatches:
+        print(f"{len(mismatches)} file(s) do not match the bundle manifest:")
+        for name in mismatches:
+            print(f"  {name}")
+        return False
+    tmp_path = manifest_path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(manifest_bytes)
+    os.replace(tmp_path, manifest_path)
+    return True
+
+
+def apply_main(argv=None):
+    parser = argparse.ArgumentParser(prog="relay apply-bundle",
+                                     description="Apply a full or delta bundle to a downloads/ tree and verify it")
+    parser.add_argument("bundle", help="Bundle to apply (rejoin split volumes with cat first)")
+    parser.add_argument("--downloads", default=os.path.join(os.getcwd(), "downloads"),
+                        help="Downloads directory to patch (default: ./downloads)")
+    parser.add_argument("--jobs", type=int, default=DEFAULT_JOBS,
+                        help=f"Worker threads for extraction and verification (default: {DEFAULT_JOBS})")
+    parser.add_argument("--force", action="store_true",
+                        help="Apply a delta even if the tree is not the release it was built against")
+    args = parser.parse_args(argv)
+
+    if not zipfile.is_zipfile(args.bundle):
+        print(f"Not a bundle: {args.bundle}")
+        return 1
+    start = time.monotonic()
+    os.makedirs(args.downloads, exist_ok=True)
+    try:
+        ok = apply_bundle(args.bundle, args.downloads, jobs=args.jobs, force=args.force)
+    except (KeyError, ValueError, OSError) as e:
+        print(f"Could not apply {args.bundle}: {e}")
+        return 1
+    if not ok:
+        return 1
+    print(f"Applied {args.bundle} to {args.downloads} and verified it in {time.monotonic() - start:.1f}s")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="relay bundle", description="Bundle the downloads/ tree for transfer into an airgap")
+    parser.add_argument("--downloads", default=os.path.join(os.getcwd(), "downloads"),
+                        help="Downloads directory to bundle (default: ./downloads)")
+    parser.add_argument("--output", default="tools_bundle.zip", help="Bundle file to write (default: tools_bundle.zip)")
+    parser.add_argument("--jobs", type=int, default=DEFAULT_JOBS,
+                        help=f"Worker threads for hashing and compression (default: {DEFAULT_JOBS})")
+    parser.add_argument("--volume-size", type=parse_size, default=None,
+                        help="Split the bundle into volumes of this size, e.g. 4G or 700M")
+    parser.add_argument("--contents", default=None, help="Also write a contents listing to this file")
+    parser.add_argument("--since", default=None, metavar="MANIFEST",
+                        help="Write a delta against the release described by this .manifest.json")
+    args = parser.parse_args(argv)
+
+    if not os.path.isdir(args.downloads):
+        print(f"Downloads directory not found: {args.downloads}")
+        return 1
+
+    start = time.monotonic()
+    members, manifest = collect_members(args.downloads)
+    extra_files = None
+    if args.since:
+        try:
+            with open(args.since, 'rb') as f:
+                base_bytes = f.read()
+            base = json.loads(base_bytes)
+        except (OSError, ValueError) as e:
+            print(f"Could not read the previous manifest {args.since}: {e}")
+            return 1
+        full_count = len(members)
+        members, delta = plan_delta(members, manifest, base)
+        delta['base'] = hashlib.sha256(base_bytes).hexdigest()
+        extra_files = {DELTA_NAME: json.dumps(delta, indent=2, sort_keys=True).encode('utf-8')}
+        print(f"Delta since {args.since}: {len(members)} of {full_count} file(s) changed, "
+              f"{len(delta['delete'])} to delete")
+    volumes = write_bundle(args.downloads, args.output, jobs=args.jobs, volume_size=args.volume_size,
+                           members=members, manifest=manifest, extra_files=extra_files)
+    if args.contents:
+        with open(args.contents, 'w', encoding='utf-8') as f:
+            f.write(contents_listing(args.downloads))
+
+    total = sum(os.path.getsize(v) for v in volumes)
+    print(f"Bundled {len(members)} file(s) into {', '.join(volumes)} "
+          f"({total / (1024 ** 2):.1f} MiB) in {time.monotonic() - start:.1f}s")
+    if len(volumes) > 1:
+        print(f"Reassemble with: cat {args.output}.* > {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
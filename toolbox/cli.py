@@ -7,32 +7,66 @@ A CLI tool for downloading and installing DevOps tools offline
 import os
 import sys
 import time
-import json # Still needed for potential future json usage, but tool config is external
-import subprocess # <--- ADDED THIS IMPORT: Required for subprocess.run()
+import functools
 
-from colorama import init, Fore, Back, Style
+from colorama import init, Fore, Style
 
 # Import our custom modules
 from toolbox.utils import (
-    clear_screen, execute_command, get_system_info,
-    check_internet_connection, check_disk_space,
-    check_command_exists, check_package_manager
+    clear_screen, get_system_info, check_internet_connection,
+    check_disk_space, check_package_manager
 )
-from toolbox.config import load_tool_configurations
+from toolbox.config import load_catalog
+from toolbox.steps import run_step, StepContext
+from toolbox.store import ArtifactStore
+from toolbox.verify import Verifier
+from toolbox.versions import VersionResolver, LOCK_FILENAME as VERSIONS_LOCK_FILENAME
+from toolbox.mirrors import MirrorSelector
+from toolbox.detect import Detector
+from toolbox.state import StateDB, stat_fingerprint
+from toolbox.incremental import IncrementalDownload, snapshot
+from toolbox.install_plan import InstallPlan
+from toolbox.rpm_resolver import RpmResolver, find_download_request
+from toolbox.scheduler import ToolScheduler, ToolResult, ResourceLocks, DEFAULT_WORKERS
+from toolbox.step_graph import run_step_graph
+from toolbox import trace
 
 # Initialize colorama for cross-platform colored output
 init()
 
+class DownloadJob:
+    """A tool download in progress: its steps, context and incremental plan."""
+    def __init__(self, tool, tool_download_dir, steps, ctx):
+        self.tool = tool
+        self.name = tool['name']
+        self.dir = tool_download_dir
+        self.steps = steps
+        self.ctx = ctx
+        self.incremental = None
+        self.to_run = set(range(len(steps)))
+
 class ToolboxCLI:
     def __init__(self):
         self.installed_tools = set() # This will reflect tools confirmed as installed during runtime
         self.downloaded_tools = set() # Track which tools have been downloaded
-        self.tools_config = load_tool_configurations()
+        self.catalog = load_catalog() # Compiled, validated tool definitions with a name index
+        self.tools_config = self.catalog.tools if self.catalog else []
         self.system_info = get_system_info()
         self.simulation_mode = False # Add a simulation mode flag
         self.download_mode = False
         self.install_mode = False
+        self.incremental_mode = False # Skip download steps whose fingerprint and outputs are unchanged
         self.downloads_dir = os.path.join(os.getcwd(), "downloads")
+        self.jobs = DEFAULT_WORKERS # Number of tools downloaded concurrently
+        self.resource_locks = ResourceLocks()
+        self.store = ArtifactStore(self.downloads_dir) # Shared sha256-addressed artifact store
+        self.mirrors = MirrorSelector() # Mirror rankings shared by all downloads (.relay/mirrors.json)
+        # Upstream versions pinned in downloads/versions.lock.json, which travels with the bundle
+        self.versions = VersionResolver(os.path.join(self.downloads_dir, VERSIONS_LOCK_FILENAME))
+        self.update_versions = False # Look up the latest upstream versions instead of reusing pinned ones
+        self.state = StateDB() # Detection and download results remembered between sessions
+        self.trace_file = None # Trace of each download/install run; .relay/traces/ by default
+        self.metrics_dir = None # Prometheus textfile directory; .relay/metrics by default
 
         # Pre-check existing tools on startup
         self._check_initial_installed_tools()
@@ -40,25 +74,21 @@ class ToolboxCLI:
     def _check_initial_installed_tools(self):
         """
         On startup, check which tools are already installed on the system
-        based on their idempotency_check command.
+        based on their detect probes or idempotency_check command.
         """
         print(f"{Fore.MAGENTA}Checking for pre-existing tool installations...{Style.RESET_ALL}")
+        # Native probes and a single rpm query answer most tools; remaining shell
+        # checks run concurrently, each with a timeout
+        results = Detector().detect(self.tools_config, state=self.state)
         for tool in self.tools_config:
-            idempotency_cmd = tool.get('idempotency_check')
-            if idempotency_cmd:
-                try:
-                    # Use subprocess.run directly for a silent check, not execute_command
-                    # as we don't want to print full output for every check on startup
-                    subprocess.run(idempotency_cmd, shell=True, check=True,
-                                   stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-                    self.installed_tools.add(tool['name'])
-                    print(f"{Fore.GREEN}  ✓ {tool['name']} detected as installed.{Style.RESET_ALL}")
-                except (subprocess.CalledProcessError, FileNotFoundError):
-                    # Command failed or not found, tool is likely not installed
-                    print(f"{Fore.YELLOW}  - {tool['name']} not detected.{Style.RESET_ALL}")
-            else:
+            detected = results.get(tool['name'])
+            if detected:
+                self.installed_tools.add(tool['name'])
+                print(f"{Fore.GREEN}  ✓ {tool['name']} detected as installed.{Style.RESET_ALL}")
+            elif detected is None:
                 print(f"{Fore.YELLOW}  Warning: No idempotency check defined for {tool['name']}. Cannot auto-detect.{Style.RESET_ALL}")
-        time.sleep(1) # Give user time to see the checks
+            else:
+                print(f"{Fore.YELLOW}  - {tool['name']} not detected.{Style.RESET_ALL}")
         
         # Check which tools have been downloaded
         self._check_downloaded_tools()
@@ -66,12 +96,34 @@ class ToolboxCLI:
     def _check_downloaded_tools(self):
         """
         Check which tools have their downloads directory present.
+        Results are cached in the state database until the directory or the
+        tool's store manifest changes.
         """
         if os.path.exists(self.downloads_dir):
             for tool in self.tools_config:
                 tool_download_dir = os.path.join(self.downloads_dir, tool['name'])
-                if os.path.exists(tool_download_dir) and os.listdir(tool_download_dir):
+                record = self.state.get('downloads', tool['name'], self._download_fingerprint(tool))
+                if record is None:
+                    # Rebuild views from the artifact store (e.g. after unpacking a deduplicated bundle)
+                    self.store.materialize(tool['name'], tool_download_dir)
+                    record = self._record_download(tool)
+                if record['downloaded']:
                     self.downloaded_tools.add(tool['name'])
+        self.state.save()
+
+    def _download_fingerprint(self, tool):
+        tool_download_dir = os.path.join(self.downloads_dir, tool['name'])
+        return stat_fingerprint([tool_download_dir, self.store.manifest_path(tool['name'])])
+
+    def _record_download(self, tool, files=None):
+        """Stores a tool's download status, file count, size and hashes in the state database."""
+        tool_download_dir = os.path.join(self.downloads_dir, tool['name'])
+        if files is None:
+            files = (self.store.load_manifest(tool['name']) or {}).get('files', {})
+        downloaded = os.path.isdir(tool_download_dir) and bool(os.listdir(tool_download_dir))
+        self.state.put('downloads', tool['name'], self._download_fingerprint(tool), downloaded=downloaded,
+                       files=files, size=sum(entry['size'] for entry in files.values()))
+        return self.state.get('downloads', tool['name'], self._download_fingerprint(tool))
 
     def print_ascii_art(self):
         ascii_art = '''
@@ -134,93 +186,290 @@ DevOps Tool Provisioning for Airgapped Environments
         print("a. All")
         print("b. Back to Main Menu")
         print("q. Quit")
-        print(f"{Fore.CYAN}Select a tool to {action.lower()} by number, or multiple (e.g., 1,3,4): {Style.RESET_ALL}", end="")
+        print(f"{Fore.CYAN}Select a tool to {action.lower()} by number or name, or multiple (e.g., 1,3,helm): {Style.RESET_ALL}", end="")
         if self.simulation_mode:
             print(f" {Fore.YELLOW}[SIMULATION MODE]{Style.RESET_ALL}")
         else:
             print("") # Newline if not in simulation mode
 
     def download_tool(self, tool):
+        job = self._prepare_download(tool)
+        if job is None:
+            return True
+        return self._finish_download(job, self._run_download_steps(job, range(len(job.steps))))
+
+    def _prepare_download(self, tool):
+        """
+        Sets up a tool's download: its directory, step context and, in
+        incremental mode, the steps to run. Returns None if nothing is left to do.
+        """
         print(f"\n{Fore.YELLOW}Initiating download for: {tool['name']}{Style.RESET_ALL}")
         
         # Ensure tool-specific download directory exists
         tool_download_dir = os.path.join(self.downloads_dir, tool['name'])
         if not self.simulation_mode and not os.path.exists(tool_download_dir):
-            os.makedirs(tool_download_dir)
+            os.makedirs(tool_download_dir, exist_ok=True)
             print(f"Created directory: {tool_download_dir}")
 
         steps = tool.get('download_steps', [])
         if not steps:
             print(f"{Fore.YELLOW}No download steps defined for {tool['name']}.{Style.RESET_ALL}")
-            return True
-
-        success = True
-        for step in steps:
-            cmd = step.get('command')
-            if cmd:
-                # Replace placeholders if any (e.g., {download_dir})
-                # For now, we assume commands might need to know where to put files.
-                # But the plan said commands like: "dnf install ... --downloaddir=./downloads/docker"
-                # So we should ensure the command is executed relative to project root or handles paths.
-                # We'll rely on the JSON providing correct relative paths or use absolute paths if needed.
-                # To make it robust, we can inject the path.
-                
-                # Simple variable substitution
-                cmd = cmd.replace("{download_dir}", tool_download_dir)
-                
-                if not execute_command(cmd, description=f"Downloading {tool['name']}", simulate=self.simulation_mode):
-                    success = False
-                    break
-        
+            return None
+
+        ctx = StepContext(self._placeholders(tool), description=f"Downloading {tool['name']}",
+                          simulate=self.simulation_mode, locks=self.resource_locks, store=self.store,
+                          mirrors=self.mirrors)
+        # Restore anything a previous run already stored instead of downloading it again
+        if not self.simulation_mode:
+            self.store.materialize(tool['name'], tool_download_dir)
+
+        job = DownloadJob(tool, tool_download_dir, steps, ctx)
+        if self.incremental_mode and not self.simulation_mode:
+            job.incremental = IncrementalDownload(self.store, tool, steps, ctx, tool_download_dir)
+            job.to_run = job.incremental.plan()
+            if not job.to_run:
+                print(f"{Fore.GREEN}[UP TO DATE] {tool['name']}: all download steps unchanged.{Style.RESET_ALL}")
+                self.downloaded_tools.add(tool['name'])
+                return None
+        if not self.simulation_mode:
+            # Steps may rewrite files in place, so they must not see the store's inodes
+            self.store.detach(tool['name'], tool_download_dir)
+        return job
+
+    def _run_download_steps(self, job, indices, runner=None):
+        """
+        Runs the given download steps of a job, concurrently where their
+        "after" dependencies allow. runner(step, ctx) replaces run_step.
+        """
+        runner = runner or run_step
+        steps = job.steps
+        if not job.incremental:
+            return run_step_graph(steps, indices, job.ctx, runner)
+        # Outputs are attributed to steps by snapshots around them, so run one at a time
+        for index in indices:
+            if index not in job.to_run:
+                print(f"{Fore.GREEN}Skipping unchanged step {index + 1}/{len(steps)} of {job.name}.{Style.RESET_ALL}")
+                continue
+            before = snapshot(job.dir) if job.incremental else None
+            if not runner(steps[index], job.ctx):
+                return False
+            if job.incremental:
+                job.incremental.record(index, before)
+        return True
+
+    def _finish_download(self, job, success):
+        tool = job.tool
         if success:
+            if not self.simulation_mode:
+                # Deduplicate against artifacts of every other tool
+                files = self.store.ingest_tool(tool['name'], job.dir)
+                print(f"Stored {len(files)} artifact(s) for {tool['name']} in {self.store.root}")
+                if job.incremental:
+                    job.incremental.refresh_stats()
+                self._record_download(tool, files)
+                self.state.save()
             print(f"{Fore.GREEN}[SUCCESS] {tool['name']} downloaded successfully.{Style.RESET_ALL}")
             self.downloaded_tools.add(tool['name'])
         else:
             print(f"{Fore.RED}[FAILED] {tool['name']} download failed.{Style.RESET_ALL}")
-        
+
+        if job.incremental:
+            job.incremental.save()
         return success
 
-    def install_tool(self, tool):
+    def install_tool(self, tool, pause=True):
+        if not self._ready_to_install(tool, pause=pause):
+            return tool['name'] in self.installed_tools
+
+        print(f"\n{Fore.YELLOW}Initiating installation for: {tool['name']}{Style.RESET_ALL}")
+
+        steps = tool.get('install_steps', [])
+        if not steps:
+             print(f"{Fore.RED}No install steps defined for {tool['name']}.{Style.RESET_ALL}")
+             return False
+
+        success = self._run_install_steps(tool, steps)
+        self._finish_install(tool, success)
+
+        if pause:
+            input(f"\n{Fore.CYAN}Press Enter to continue...{Style.RESET_ALL}")
+        return success
+
+    def _ready_to_install(self, tool, pause=True):
+        """Returns True if the tool is downloaded and not yet installed"""
         if tool['name'] in self.installed_tools:
             print(f"\n{Fore.YELLOW}{tool['name']} is already installed. Skipping.{Style.RESET_ALL}")
-            time.sleep(1)
-            return True
+            if pause:
+                time.sleep(1)
+            return False
         
         # Check if tool has been downloaded (skip in simulation mode)
         if not self.simulation_mode and tool['name'] not in self.downloaded_tools:
             print(f"\n{Fore.RED}ERROR: {tool['name']} has not been downloaded yet.{Style.RESET_ALL}")
             print(f"{Fore.YELLOW}Please run download mode first to fetch this tool.{Style.RESET_ALL}")
-            input(f"\n{Fore.CYAN}Press Enter to continue...{Style.RESET_ALL}")
+            if pause:
+                input(f"\n{Fore.CYAN}Press Enter to continue...{Style.RESET_ALL}")
             return False
+        return True
+
+    def _placeholders(self, tool):
+        """{download_dir}, and {version} for tools that take their version from upstream."""
+        placeholders = {"download_dir": os.path.join(self.downloads_dir, tool['name'])}
+        version = self.versions.version_for(tool)
+        if version:
+            placeholders["version"] = version
+        return placeholders
+
+    def _resolve_versions(self, tools):
+        """Pins the upstream versions of the tools about to be downloaded, looking up unpinned ones concurrently."""
+        versioned = [tool for tool in tools if tool.get('version')]
+        if not versioned:
+            return
+        with trace.span('stage', 'versions', tools=len(versioned)) as span:
+            try:
+                resolved = self.versions.resolve(versioned, update=self.update_versions)
+            finally:
+                self.versions.close()
+            span.set(resolved=len(resolved))
+        print(f"{Fore.CYAN}Versions: " + ", ".join(f"{name} {version}" for name, version in resolved.items())
+              + Style.RESET_ALL)
+        if not self.simulation_mode:
+            try:
+                self.versions.save()
+            except OSError as e:
+                print(f"{Fore.YELLOW}Could not write {self.versions.lock_path}: {e}{Style.RESET_ALL}")
 
-        print(f"\n{Fore.YELLOW}Initiating installation for: {tool['name']}{Style.RESET_ALL}")
-
-        steps = tool.get('install_steps', [])
-        if not steps:
-             print(f"{Fore.RED}No install steps defined for {tool['name']}.{Style.RESET_ALL}")
-             return False
-
-        tool_download_dir = os.path.join(self.downloads_dir, tool['name'])
-        success = True
-        for step in steps:
-            cmd = step.get('command')
-            if cmd:
-                cmd = cmd.replace("{download_dir}", tool_download_dir)
-                if not execute_command(cmd, description=f"Installing {tool['name']}", simulate=self.simulation_mode):
-                    success = False
-                    break
+    def _run_install_steps(self, tool, steps):
+        ctx = StepContext(self._placeholders(tool), description=f"Installing {tool['name']}",
+                          simulate=self.simulation_mode, locks=self.resource_locks, store=self.store)
+        return run_step_graph(steps, range(len(steps)), ctx, run_step)
 
+    def _finish_install(self, tool, success):
         if success:
             print(f"{Fore.GREEN}[SUCCESS] {tool['name']} installed successfully.{Style.RESET_ALL}")
             self.installed_tools.add(tool['name'])
+            # Re-probe on the next launch rather than trusting a stale "not installed"
+            self.state.invalidate('detection', tool['name'])
+            self.state.save()
         else:
             print(f"{Fore.RED}[FAILED] {tool['name']} installation failed.{Style.RESET_ALL}")
 
-        input(f"\n{Fore.CYAN}Press Enter to continue...{Style.RESET_ALL}")
-        return success
-
-
+    def _trace_run(self, phase):
+        """Traces a download or install run and exports its trace and metrics when it ends."""
+        metrics_dir = None if self.simulation_mode else (self.metrics_dir or trace.default_metrics_dir())
+        return trace.tracer.run(phase, trace_path=self.trace_file, metrics_dir=metrics_dir,
+                                simulate=self.simulation_mode or None, jobs=self.jobs)
+
+    @staticmethod
+    def _traced(func, stage=None):
+        """Wraps func(tool) so that every call is recorded as a trace span of the tool."""
+        def run(tool):
+            with trace.span('tool', tool['name'], tool=tool['name'], stage=stage) as span:
+                success = bool(func(tool))
+                span.set(success=success)
+                return success
+        return run
+
+    def _install_tools(self, tools):
+        """
+        Installs several tools, up to self.jobs at a time, applying the RPMs of
+        all of them in a single package manager transaction. Steps before and
+        after each tool's RPM install step still run per tool. Downloaded
+        artifacts are verified first, and tools that fail verification are
+        reported as failed without running any step. Returns a ToolResult per
+        tool that was ready to install.
+        """
+        with self._trace_run("install"):
+            return self._install_batched(tools)
+
+    def _install_batched(self, tools):
+        pending = [tool for tool in tools if self._ready_to_install(tool, pause=False)]
+        rejected = [] if self.simulation_mode else self._verify_downloads(pending)
+        if rejected:
+            pending = [tool for tool in pending if tool['name'] not in rejected]
+            results = {result.name: result for result in self._install_pending(pending)}
+            results.update((name, ToolResult(name, False, 0.0)) for name in rejected)
+            return [results[tool['name']] for tool in tools if tool['name'] in results]
+        return self._install_pending(pending)
+
+    def _verify_downloads(self, tools):
+        """
+        Checks the downloaded artifacts of tools against their store manifests.
+        Returns the names of the tools that failed, which must not be installed.
+        """
+        if not tools:
+            return []
+        print(f"{Fore.CYAN}Verifying downloaded artifacts of {len(tools)} tool(s)...{Style.RESET_ALL}")
+        results = Verifier(self.store, self.state, jobs=os.cpu_count() or self.jobs).verify(
+            tool['name'] for tool in tools)
+        rejected = []
+        for result in results.values():
+            if not result.problems:
+                continue
+            rejected.append(result.name)
+            print(f"{Fore.RED}[CORRUPT] {result.name}: {len(result.problems)} of {result.files} file(s) failed "
+                  f"verification; re-download or re-transfer it.{Style.RESET_ALL}")
+            for problem in result.problems:
+                print(f"{Fore.RED}  {problem.path}: {problem.reason}{Style.RESET_ALL}")
+        return rejected
+
+    def _install_pending(self, pending):
+        if len(pending) <= 1:
+            return ToolScheduler(workers=1).run(pending, self._traced(lambda tool: self.install_tool(tool, pause=False)))
+
+        plan = InstallPlan(pending, self.downloads_dir)
+        installs = {install.name: install for install in plan.installs}
+        scheduler = ToolScheduler(workers=self.jobs)
+
+        def prepare(tool):
+            install = installs[tool['name']]
+            if not install.batched:
+                return self.install_tool(tool, pause=False)
+            print(f"\n{Fore.YELLOW}Preparing installation for: {install.name}{Style.RESET_ALL}")
+            if self._run_install_steps(tool, install.pre_steps):
+                return True
+            self._finish_install(tool, False)
+            return False
 
+        results = {result.name: result for result in scheduler.run(pending, self._traced(prepare, stage='prepare'),
+                                                                    summary=False)}
+        ready = [install for install in plan.batched if results[install.name].success]
+
+        if ready:
+            names = ", ".join(install.name for install in ready)
+            command = plan.transaction_command(ready)
+            print(f"\n{Fore.YELLOW}Installing packages of {len(ready)} tool(s) in one transaction: {names}{Style.RESET_ALL}")
+            ctx = StepContext({}, description=f"Installing packages for {names}", simulate=self.simulation_mode)
+            with trace.span('stage', 'transaction', tools=len(ready)) as span:
+                span.set(success=run_step({"type": "shell", "command": command}, ctx))
+            if not span.success:
+                # A failed transaction installs nothing; retry per tool to isolate the culprit
+                print(f"{Fore.YELLOW}Combined transaction failed. Retrying each tool separately...{Style.RESET_ALL}")
+                separately = []
+                for install in ready:
+                    ctx = StepContext({}, description=f"Installing packages for {install.name}",
+                                      simulate=self.simulation_mode)
+                    transaction = {"type": "shell", "command": plan.transaction_command([install])}
+                    if self._traced(lambda tool: run_step(transaction, ctx), stage='transaction')(install.tool):
+                        separately.append(install)
+                    else:
+                        results[install.name] = results[install.name]._replace(success=False)
+                        self._finish_install(install.tool, False)
+                ready = separately
+
+        def finish(tool):
+            install = installs[tool['name']]
+            print(f"\n{Fore.YELLOW}Finishing installation for: {install.name}{Style.RESET_ALL}")
+            success = self._run_install_steps(tool, install.post_steps)
+            self._finish_install(tool, success)
+            return success
+
+        for result in scheduler.run([install.tool for install in ready], self._traced(finish, stage='finish'),
+                                    summary=False):
+            results[result.name] = result._replace(duration=results[result.name].duration + result.duration)
+        results = [results[tool['name']] for tool in pending]
+        ToolScheduler.print_summary(results)
+        return results
 
     def check_system_requirements(self):
         clear_screen()
@@ -292,6 +541,20 @@ DevOps Tool Provisioning for Airgapped Environments
             print(f"{Fore.RED}This script must be run as root (use sudo). Exiting.{Style.RESET_ALL}")
             sys.exit(1)
         
+        self.trace_file = self._get_option_value("--trace-file")
+        self.metrics_dir = self._get_option_value("--metrics-dir")
+
+        jobs = self._get_option_value("--jobs")
+        if jobs is not None:
+            try:
+                self.jobs = max(1, int(jobs))
+            except ValueError:
+                print(f"{Fore.RED}Invalid value for --jobs: {jobs}. Using {self.jobs}.{Style.RESET_ALL}")
+
+        if "--incremental" in sys.argv:
+            self.incremental_mode = True
+        if "--update-versions" in sys.argv:
+            self.update_versions = True
         if "--download" in sys.argv:
             self.download_mode = True
         if "--install" in sys.argv:
@@ -340,16 +603,103 @@ DevOps Tool Provisioning for Airgapped Environments
                 print(f"{Fore.RED}Invalid choice. Please try again.{Style.RESET_ALL}")
                 time.sleep(1)
 
+    @staticmethod
+    def _get_option_value(option):
+        """Returns the value of an option given as '--opt value' or '--opt=value', or None"""
+        for i, arg in enumerate(sys.argv):
+            if arg == option and i + 1 < len(sys.argv):
+                return sys.argv[i + 1]
+            if arg.startswith(option + "="):
+                return arg.split("=", 1)[1]
+        return None
+
     def _process_all_tools(self, action):
         """Helper to process all tools without user interaction"""
         print(f"{Fore.CYAN}Processing ALL tools for {action}...{Style.RESET_ALL}")
-        for tool in self.tools_config:
-            if action == "Download":
-                self.download_tool(tool)
-            elif action == "Install":
-                self.install_tool(tool)
+        if action == "Download":
+            self._download_tools(self.tools_config)
+        elif action == "Install":
+            self._install_tools(self.tools_config)
         print(f"{Fore.GREEN}All tools processed.{Style.RESET_ALL}")
 
+    def _download_tools(self, tools):
+        """
+        Downloads several tools concurrently, up to self.jobs at a time. The
+        RPM downloadonly steps of all tools are first resolved and fetched together.
+        """
+        tools = list(tools)
+        with self._trace_run("download"):
+            self._resolve_versions(tools)
+            finish = {}
+            if len(tools) > 1 and not self.simulation_mode:
+                finish = self._resolve_rpm_downloads(tools)
+            print(f"{Fore.CYAN}Downloading {len(tools)} tool(s) with {self.jobs} worker(s)...{Style.RESET_ALL}")
+            return ToolScheduler(workers=self.jobs).run(tools, self._traced(
+                lambda tool: finish[tool['name']]() if tool['name'] in finish else self.download_tool(tool)))
+
+    def _resolve_rpm_downloads(self, tools):
+        """
+        Runs the steps up to the downloadonly step of every tool that has one,
+        then fetches the packages of all of them with a single dnf solve into a
+        shared pool. Returns {tool name: callable finishing that tool's download}.
+        """
+        finish = {}
+        prepared = []
+        for tool in tools:
+            request = find_download_request(tool.get('download_steps', []))
+            if request is None:
+                continue
+            with trace.span('tool', tool['name'], tool=tool['name'], stage='prepare') as span:
+                job = self._prepare_download(tool)
+                if job is None:
+                    finish[tool['name']] = lambda: True
+                elif request.step_index not in job.to_run:
+                    finish[tool['name']] = functools.partial(self._continue_download, job, 0)
+                # Repo setup must be in place before the combined solve
+                elif self._run_download_steps(job, range(request.step_index)):
+                    prepared.append((job, request))
+                else:
+                    span.set(success=False)
+                    finish[tool['name']] = functools.partial(self._finish_download, job, False)
+
+        resolver = None
+        if len(prepared) > 1:
+            resolver = RpmResolver()
+            os.makedirs(resolver.pool_dir, exist_ok=True)
+            names = ", ".join(job.name for job, _ in prepared)
+            print(f"\n{Fore.YELLOW}Resolving the RPMs of {len(prepared)} tools together: {names}{Style.RESET_ALL}")
+            ctx = StepContext({}, description="Downloading packages into the shared pool", locks=self.resource_locks)
+            command = resolver.download_command(r for _, r in prepared)
+            with trace.span('stage', 'rpm-pool', tools=len(prepared)) as span:
+                span.set(success=run_step({"type": "shell", "command": command}, ctx))
+            if span.success:
+                resolver.index(r for _, r in prepared)
+            else:
+                print(f"{Fore.YELLOW}Combined RPM download failed. Downloading per tool instead...{Style.RESET_ALL}")
+                resolver = None
+
+        for job, request in prepared:
+            finish[job.name] = functools.partial(self._continue_download, job, request.step_index,
+                                                 request if resolver else None, resolver)
+        return finish
+
+    def _continue_download(self, job, start, request=None, resolver=None):
+        """
+        Runs a prepared download from step start onwards. With a resolver, the
+        request's downloadonly step links the tool's packages from the shared pool.
+        """
+        rpm_step = job.steps[request.step_index] if request else None
+
+        def runner(step, ctx):
+            if step is rpm_step:
+                packages = resolver.copy_closure(request, job.dir, self.store)
+                print(f"Copied {len(packages)} package(s) for {job.name} from {resolver.pool_dir}")
+                return True
+            return run_step(step, ctx)
+
+        success = self._run_download_steps(job, range(start, len(job.steps)), runner=runner)
+        return self._finish_download(job, success)
+
     def _run_tool_selection_loop(self, action):
         while True:
             self.show_tool_selection_menu(action=action)
@@ -370,29 +720,40 @@ DevOps Tool Provisioning for Airgapped Environments
                 continue
 
             try:
-                if ',' in selection:
-                    indices = [int(x.strip()) - 1 for x in selection.split(',')]
-                else:
-                    indices = [int(selection) - 1]
-
-                valid_indices = [i for i in indices if 0 <= i < len(self.tools_config)]
-
-                if valid_indices:
-                    for index in valid_indices:
-                        tool = self.tools_config[index]
-                        if action == "Download":
-                            self.download_tool(tool)
-                        elif action == "Install":
-                            self.install_tool(tool)
+                selected = []
+                for item in (x.strip() for x in selection.split(',')):
+                    # Tools can be picked by number or by name
+                    tool = self.catalog.get(item) if self.catalog and not item.isdigit() else None
+                    if tool is not None:
+                        selected.append(tool)
+                    elif 0 <= int(item) - 1 < len(self.tools_config):
+                        selected.append(self.tools_config[int(item) - 1])
+
+                if selected:
+                    if action == "Download":
+                        self._download_tools(selected)
+                    elif action == "Install":
+                        self._install_tools(selected)
                     
                     input(f"\n{Fore.CYAN}Press Enter to continue...{Style.RESET_ALL}")
                 else:
                     print(f"{Fore.RED}Invalid selection. Please try again.{Style.RESET_ALL}")
                     time.sleep(1)
             except ValueError:
-                print(f"{Fore.RED}Invalid input. Please enter numbers separated by commas, 'a' for all, 'b' to go back, or 'q' to quit.{Style.RESET_ALL}")
+                print(f"{Fore.RED}Invalid input. Please enter numbers or names separated by commas, 'a' for all, 'b' to go back, or 'q' to quit.{Style.RESET_ALL}")
                 time.sleep(1)
 
 if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "bundle":
+        # Non-interactive subcommand: no root check, banner or tool detection needed
+        from toolbox.bundle import main as bundle_main
+        sys.exit(bundle_main(sys.argv[2:]))
+    if len(sys.argv) > 1 and sys.argv[1] == "apply-bundle":
+        from toolbox.bundle import apply_main
+        sys.exit(apply_main(sys.argv[2:]))
+    if len(sys.argv) > 1 and sys.argv[1] in ("download", "install", "status", "verify"):
+        # Headless commands for automation: no banner, prompts or pauses
+        from toolbox.headless import main as headless_main
+        sys.exit(headless_main(sys.argv[1:]))
     cli = ToolboxCLI()
     cli.run()
@@ -0,0 +1,253 @@
+"""
+Native installer for Ansible collection tarballs.
+
+Replaces `ansible-galaxy collection install <dir>/*.tar.gz` for collections
+that were resolved and downloaded beforehand (see download_collections).
+Tarballs are installed in parallel, each in a single streaming pass:
+
+- the members are extracted into a staging directory next to the target
+  while their sha256 is computed,
+- FILES.json is checked against the checksum in MANIFEST.json, and every
+  extracted file against its entry in FILES.json; a tarball with a
+  mismatching, missing or unlisted file is rejected,
+- the staging directory then replaces <path>/ansible_collections/<ns>/<name>
+  in one rename, so a collection is never seen half-installed.
+
+Like ansible-galaxy, collections are installed into the first directory of
+the collections path (ANSIBLE_COLLECTIONS_PATH, ~/.ansible/collections by
+default) unless another path is given.
+
+A collection already installed at the same version (according to its
+installed MANIFEST.json) is skipped without extracting anything.
+"""
+
+import os
+import re
+import json
+import shutil
+import hashlib
+import tarfile
+import tempfile
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+from toolbox.download_collections import parse_version, version_matches
+
+# ansible's default collections path: per user, then system-wide
+DEFAULT_COLLECTIONS_PATHS = ('~/.ansible/collections', '/usr/share/ansible/collections')
+DEFAULT_JOBS = os.cpu_count() or 4
+COPY_BUFFER_SIZE = 1024 * 1024
+METADATA_FILES = ('MANIFEST.json', 'FILES.json')
+
+InstallResult = namedtuple('InstallResult', ['name', 'version', 'status', 'detail'])
+
+
+class CollectionError(Exception):
+    """A collection tarball is malformed or does not match its own checksums."""
+
+
+def collection_paths() -> List[str]:
+    """Directories ansible searches for ansible_collections/, as ansible configures them by default."""
+    configured = os.environ.get('ANSIBLE_COLLECTIONS_PATH') or os.environ.get('ANSIBLE_COLLECTIONS_PATHS')
+    if configured:
+        return [os.path.expanduser(p) for p in configured.split(os.pathsep) if p]
+    return [os.path.expanduser(p) for p in DEFAULT_COLLECTIONS_PATHS]
+
+
+def default_collections_path() -> str:
+    """Where ansible-galaxy installs collections: the first directory of the collections path."""
+    return collection_paths()[0]
+
+
+def collection_dir(path: str, name: str) -> str:
+    namespace, _, short_name = name.partition('.')
+    return os.path.join(path, 'ansible_collections', namespace, short_name)
+
+
+def installed_version(path: str, name: str) -> Optional[str]:
+    """The version of collection name installed under path, or None."""
+    try:
+        with open(os.path.join(collection_dir(path, name), 'MANIFEST.json'), 'r', encoding='utf-8') as f:
+            return json.load(f)['collection_info']['version']
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+def _member_name(info: tarfile.TarInfo) -> str:
+    name = info.name[2:] if info.name.startswith('./') else info.name
+    name = name.rstrip('/')
+    if os.path.isabs(name) or '..' in name.split('/'):
+        raise CollectionError(f"unsafe member {info.name}")
+    return name
+
+
+def read_manifest(tarball: str) -> Dict:
+    """
+    Returns the collection_info of a tarball's MANIFEST.json. Stops reading
+    at MANIFEST.json, which ansible-galaxy puts first.
+    """
+    with tarfile.open(tarball, 'r|*') as tar:
+        for info in tar:
+            if info.isfile() and _member_name(info) == 'MANIFEST.json':
+                manifest = json.load(tar.extractfile(info))
+                collection_info = manifest.get('collection_info') if isinstance(manifest, dict) else None
+                if not isinstance(collection_info, dict) or \
+                        not all(isinstance(collection_info.get(key), str) and collection_info[key]
+                                for key in ('namespace', 'name', 'version')):
+                    raise CollectionError("MANIFEST.json has no namespace, name and version")
+                return collection_info
+    raise CollectionError("no MANIFEST.json")
+
+
+def _extract_verified(tarball: str, staging: str):
+    """Extracts tarball into staging, checking every file against MANIFEST.json and FILES.json."""
+    digests = {}
+    symlinks = []
+    metadata = {}
+    with tarfile.open(tarball, 'r|*') as tar:
+        for info in tar:
+            name = _member_name(info)
+            if not name or name == '.':
+                continue
+            path = os.path.join(staging, *name.split('/'))
+            if info.isdir():
+                os.makedirs(path, mode=0o755, exist_ok=True)
+            elif info.isfile():
+                os.makedirs(os.path.dirname(path), mode=0o755, exist_ok=True)
+                digest = hashlib.sha256()
+                source = tar.extractfile(info)
+                with open(path, 'wb') as f:
+                    while True:
+                        chunk = source.read(COPY_BUFFER_SIZE)
+                        if not chunk:
+                            break
+                        digest.update(chunk)
+                        f.write(chunk)
+                os.chmod(path, 0o755 if info.mode & 0o111 else 0o644)
+                digests[name] = digest.hexdigest()
+                if name in METADATA_FILES:
+                    with open(path, 'rb') as f:
+                        metadata[name] = json.load(f)
+            elif info.issym():
+                target = os.path.normpath(os.path.join(os.path.dirname(name), info.linkname))
+                if os.path.isabs(info.linkname) or target.split(os.sep)[0] == '..':
+                    raise CollectionError(f"symlink {name} points outside the collection")
+                symlinks.append(name)
+                os.makedirs(os.path.dirname(path), mode=0o755, exist_ok=True)
+                os.symlink(info.linkname, path)
+            else:
+                raise CollectionError(f"unsupported member type of {name}")
+
+    if 'MANIFEST.json' not in metadata or 'FILES.json' not in metadata:
+        raise CollectionError("no MANIFEST.json or FILES.json")
+    if not isinstance(metadata['FILES.json'], dict) or not isinstance(metadata['FILES.json'].get('files', []), list) \
+            or not all(isinstance(entry, dict) for entry in metadata['FILES.json'].get('files', [])):
+        raise CollectionError("FILES.json is not a file list")
+    file_manifest = metadata['MANIFEST.json'].get('file_manifest_file') if isinstance(metadata['MANIFEST.json'], dict) else None
+    expected = file_manifest.get('chksum_sha256') if isinstance(file_manifest, dict) else None
+    if expected != digests['FILES.json']:
+        raise CollectionError("FILES.json does not match the checksum in MANIFEST.json")
+
+    listed = set()
+    for entry in metadata['FILES.json'].get('files', []):
+        name = entry.get('name', '')
+        name = name[2:] if name.startswith('./') else name
+        listed.add(name)
+        if entry.get('ftype') != 'file':
+            continue
+        if name in symlinks:
+            continue
+        if name not in digests:
+            raise CollectionError(f"{name} is listed in FILES.json but missing")
+        if entry.get('chksum_sha256') != digests[name]:
+            raise CollectionError(f"checksum mismatch for {name}")
+    unlisted = sorted(set(digests) - listed - set(METADATA_FILES))
+    if unlisted:
+        raise CollectionError(f"{len(unlisted)} file(s) not listed in FILES.json, e.g. {unlisted[0]}")
+
+
+def install_collection(tarball: str, path: Optional[str] = None, force: bool = False) -> InstallResult:
+    """
+    Installs one collection tarball under path (default: see
+    default_collections_path) unless that version is already there.
+    """
+    path = path or default_collections_path()
+    info = read_manifest(tarball)
+    name = f"{info['namespace']}.{info['name']}"
+    version = info['version']
+    if not re.fullmatch(r'\w+', info['namespace']) or not re.fullmatch(r'\w+', info['name']):
+        raise CollectionError(f"invalid collection name {name}")
+    current = installed_version(path, name)
+    if current == version and not force:
+        return InstallResult(name, version, 'skipped', 'already installed')
+
+    target = collection_dir(path, name)
+    parent = os.path.dirname(target)
+    os.makedirs(parent, mode=0o755, exist_ok=True)
+    staging = tempfile.mkdtemp(prefix=f'.{info["name"]}-relay-', dir=parent)
+    try:
+        _extract_verified(tarball, staging)
+        os.chmod(staging, 0o755)
+        previous = None
+        if os.path.lexists(target):
+            previous = tempfile.mkdtemp(prefix=f'.{info["name"]}-old-', dir=parent)
+            os.rmdir(previous)
+            os.rename(target, previous)
+        os.rename(staging, target)
+        if previous:
+            shutil.rmtree(previous, ignore_errors=True)
+    finally:
+        if os.path.exists(staging):
+            shutil.rmtree(staging, ignore_errors=True)
+    detail = f"upgraded from {current}" if current else 'installed'
+    return InstallResult(name, version, 'installed', detail)
+
+
+def install_collections(tarballs: List[str], path: Optional[str] = None, jobs: int = DEFAULT_JOBS,
+                        force: bool = False) -> List[InstallResult]:
+    """
+    Installs tarballs concurrently. Where several tarballs hold the same
+    collection, only the highest version is installed. Returns a result per
+    collection; a failed one has status 'failed' and the reason in detail.
+    """
+    def manifest(tarball):
+        try:
+            return tarball, read_manifest(tarball), None
+        except (OSError, ValueError, tarfile.TarError, CollectionError) as e:
+            return tarball, None, str(e)
+
+    def install(tarball):
+        try:
+            return install_collection(tarball, path, force)
+        except (OSError, ValueError, tarfile.TarError, CollectionError) as e:
+            return InstallResult(os.path.basename(tarball), None, 'failed', str(e))
+
+    results = []
+    chosen = {}
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+        for tarball, info, error in pool.map(manifest, tarballs):
+            if info is None:
+                results.append(InstallResult(os.path.basename(tarball), None, 'failed', error))
+                continue
+            name = f"{info['namespace']}.{info['name']}"
+            if name not in chosen or parse_version(info['version']) > parse_version(chosen[name][1]['version']):
+                chosen[name] = (tarball, info)
+        results.extend(pool.map(install, [tarball for tarball, _ in chosen.values()]))
+    return results
+
+
+def unmet_dependencies(tarballs: List[str], path: Optional[str] = None) -> List[str]:
+    """Dependencies of the given collections that no installed collection satisfies, as messages."""
+    path = path or default_collections_path()
+    problems = []
+    for tarball in tarballs:
+        try:
+            info = read_manifest(tarball)
+        except (OSError, ValueError, tarfile.TarError, CollectionError):
+            continue
+        for dependency, spec in (info.get('dependencies') or {}).items():
+            versions = [v for v in (installed_version(p, dependency) for p in [path, *collection_paths()]) if v]
+            if not any(version_matches(v, spec) for v in versions):
+                problems.append(f"{info['namespace']}.{info['name']} requires {dependency} {spec}")
+    return sorted(set(problems))
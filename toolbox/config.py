@@ -1,35 +1,242 @@
+"""
+Tool catalog: the tool definitions in tools/*.json.
+
+Definitions are compiled into .relay/catalog.json: every file is parsed and
+validated once, and only a compact record per tool (name, description,
+detection) plus a name index is kept. The compiled catalog is reused as
+long as the tools directory and the mtime and size of every definition are
+unchanged, so starting Relay doesn't parse any JSON. The full definition,
+including its steps, is only read when a field outside the compact record
+is first accessed, i.e. for tools that are actually downloaded or installed.
+
+Malformed definitions (invalid JSON, missing or duplicate names, unknown
+step types, steps missing required fields, broken step dependencies) are
+rejected when compiling instead of failing mid-run.
+"""
+
 import json
 import os
-from typing import List, Dict, Any
+import threading
+from collections.abc import Mapping
+from typing import List, Dict, Any, Iterator, Optional
 from colorama import Fore, Style
 
-def load_tool_configurations(tools_dir: str = 'tools') -> List[Dict[str, Any]]:
-    """
-    Loads tool configurations from JSON files in the specified directory.
-    """
-    tools_config = []
+from toolbox.state import default_state_dir
+from toolbox.steps import validate_step
+from toolbox.step_graph import build_graph, StepGraphError
+from toolbox.versions import validate_version
+from toolbox.detect import probe_collections, compact_probe
+
+CATALOG_FILENAME = 'catalog.json'
+CATALOG_VERSION = 1
+# Fields kept in the compiled catalog; everything else is loaded on demand
+COMPACT_FIELDS = ('name', 'description', 'detect', 'idempotency_check')
+DETECT_KEYS = ('rpm', 'binary', 'unit', 'version_args', 'version_regex', 'collections')
+
+
+def _tools_path(tools_dir: str) -> str:
+    if os.path.isabs(tools_dir):
+        return tools_dir
     # Get the directory of the current script (toolbox/config.py)
     # Then navigate up to the project root and into the 'tools' directory
     current_dir = os.path.dirname(os.path.abspath(__file__))
     project_root = os.path.join(current_dir, '..') # Go up one level from 'toolbox' to 'devops-toolbox'
-    full_tools_path = os.path.join(project_root, tools_dir)
+    return os.path.abspath(os.path.join(project_root, tools_dir))
 
-    if not os.path.isdir(full_tools_path):
-        print(f"{Fore.RED}Error: Tools configuration directory not found at {full_tools_path}{Style.RESET_ALL}")
-        return []
 
-    for filename in os.listdir(full_tools_path):
-        if filename.endswith('.json'):
-            filepath = os.path.join(full_tools_path, filename)
+def validate_tool(tool: Any) -> List[str]:
+    """Returns the problems of one tool definition; an empty list means it is valid."""
+    if not isinstance(tool, dict):
+        return ["definition is not a JSON object"]
+    problems = []
+    if not isinstance(tool.get('name'), str) or not tool['name']:
+        problems.append("missing 'name'")
+    if not isinstance(tool.get('description', ''), str):
+        problems.append("'description' is not a string")
+    detect = tool.get('detect')
+    if detect is not None:
+        if not isinstance(detect, dict):
+            problems.append("'detect' is not an object")
+        else:
+            problems.extend(f"unknown detect key '{key}'" for key in detect if key not in DETECT_KEYS)
+            if detect.get('collections') is True and not probe_collections(tool):
+                problems.append("'detect' checks the downloaded collections, but no download step "
+                                "runs toolbox.download_collections")
+    if 'version' in tool:
+        problems.extend(validate_version(tool['version']))
+    elif '{version}' in json.dumps([tool.get('download_steps'), tool.get('install_steps')]):
+        problems.append("steps use {version} but there is no 'version' definition")
+    for field in ('download_steps', 'install_steps'):
+        steps = tool.get(field, [])
+        if not isinstance(steps, list):
+            problems.append(f"'{field}' is not a list")
+            continue
+        for index, step in enumerate(steps):
+            problem = validate_step(step)
+            if problem:
+                problems.append(f"{field}[{index}]: {problem}")
+        if all(isinstance(step, dict) for step in steps):
             try:
-                with open(filepath, 'r', encoding='utf-8') as f:
-                    tool_data = json.load(f)
-                    tools_config.append(tool_data)
-            except json.JSONDecodeError:
-                print(f"{Fore.RED}Error: Invalid JSON in {filename}. Skipping.{Style.RESET_ALL}")
-            except Exception as e:
-                print(f"{Fore.RED}Error loading {filename}: {e}. Skipping.{Style.RESET_ALL}")
-    
+                build_graph(steps, range(len(steps)))
+            except StepGraphError as e:
+                problems.append(f"{field}: {e}")
+    return problems
+
+
+class ToolRecord(Mapping):
+    """
+    A tool definition that behaves like the dict loaded from its JSON file.
+    Compact fields come from the compiled catalog; the first access to any
+    other field (e.g. the steps) loads the whole file.
+    """
+
+    def __init__(self, path: str, compact: Dict[str, Any], fields: List[str]):
+        self.path = path
+        self._compact = compact
+        self._fields = fields
+        self._full = None
+        self._lock = threading.Lock()
+
+    def _load(self) -> Dict[str, Any]:
+        with self._lock:
+            if self._full is None:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    self._full = json.load(f)
+            return self._full
+
+    def __getitem__(self, key: str) -> Any:
+        if key in self._compact:
+            return self._compact[key]
+        if key not in self._fields:
+            raise KeyError(key)
+        return self._load()[key]
+
+    def __contains__(self, key) -> bool:
+        return key in self._fields
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._fields)
+
+    def __len__(self) -> int:
+        return len(self._fields)
+
+    def __repr__(self) -> str:
+        return f"ToolRecord({self._compact.get('name')!r})"
+
+
+class Catalog:
+    """All valid tool definitions, sorted by name, with a name index."""
+
+    def __init__(self, tools_path: str, compiled: Dict[str, Any]):
+        self.tools_path = tools_path
+        self.errors = compiled.get('errors', [])
+        self.tools: List[ToolRecord] = [
+            ToolRecord(os.path.join(tools_path, entry['file']), entry['compact'], entry['fields'])
+            for entry in compiled.get('tools', [])
+        ]
+        self._index = {name: self.tools[position] for name, position in compiled.get('index', {}).items()}
+        self._lower_index = {name.lower(): tool for name, tool in self._index.items()}
+
+    def get(self, name: str) -> Optional[ToolRecord]:
+        """Looks a tool up by name, case-insensitively if there is no exact match."""
+        return self._index.get(name) or self._lower_index.get(name.lower())
+
+    def __len__(self) -> int:
+        return len(self.tools)
+
+
+def _scan(tools_path: str) -> Dict[str, List[int]]:
+    files = {}
+    with os.scandir(tools_path) as entries:
+        for entry in entries:
+            if entry.name.endswith('.json') and entry.is_file():
+                st = entry.stat()
+                files[entry.name] = [st.st_mtime_ns, st.st_size]
+    return files
+
+
+def compile_catalog(tools_path: str, files: Dict[str, List[int]]) -> Dict[str, Any]:
+    """Parses and validates every definition. Returns the compiled catalog."""
+    entries, errors, names = [], [], {}
+    for filename in sorted(files):
+        try:
+            with open(os.path.join(tools_path, filename), 'r', encoding='utf-8') as f:
+                tool = json.load(f)
+        except json.JSONDecodeError:
+            errors.append(f"Invalid JSON in {filename}")
+            continue
+        except Exception as e:
+            errors.append(f"Error loading {filename}: {e}")
+            continue
+        problems = validate_tool(tool)
+        if not problems and tool['name'] in names:
+            problems.append(f"name '{tool['name']}' is already used by {names[tool['name']]}")
+        if problems:
+            errors.append(f"{filename}: " + "; ".join(problems))
+            continue
+        names[tool['name']] = filename
+        entries.append({
+            'file': filename,
+            'fields': list(tool),
+            'compact': {key: compact_probe(tool) if key == 'detect' else tool[key]
+                        for key in COMPACT_FIELDS if key in tool},
+        })
+
     # Sort tools by name for consistent menu display
-    tools_config.sort(key=lambda x: x.get('name', ''))
-    return tools_config
\ No newline at end of file
+    entries.sort(key=lambda entry: entry['compact']['name'])
+    return {
+        'version': CATALOG_VERSION,
+        'tools_path': tools_path,
+        'files': files,
+        'tools': entries,
+        'index': {entry['compact']['name']: position for position, entry in enumerate(entries)},
+        'errors': errors,
+    }
+
+
+def load_catalog(tools_dir: str = 'tools', cache_path: Optional[str] = None) -> Optional[Catalog]:
+    """
+    Returns the tool catalog, recompiling it only if a definition was added,
+    removed or changed since it was last compiled. Returns None if the tools
+    directory doesn't exist.
+    """
+    tools_path = _tools_path(tools_dir)
+    if not os.path.isdir(tools_path):
+        print(f"{Fore.RED}Error: Tools configuration directory not found at {tools_path}{Style.RESET_ALL}")
+        return None
+
+    cache_path = cache_path or os.path.join(default_state_dir(), CATALOG_FILENAME)
+    files = _scan(tools_path)
+    compiled = None
+    try:
+        with open(cache_path, 'r', encoding='utf-8') as f:
+            compiled = json.load(f)
+        if (compiled.get('version') != CATALOG_VERSION or compiled.get('tools_path') != tools_path
+                or compiled.get('files') != files):
+            compiled = None
+    except (OSError, ValueError):
+        compiled = None
+
+    if compiled is None:
+        compiled = compile_catalog(tools_path, files)
+        try:
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(compiled, f)
+            os.replace(tmp_path, cache_path)
+        except OSError:
+            pass # The catalog is recompiled next time
+
+    for error in compiled.get('errors', []):
+        print(f"{Fore.RED}Error: {error}. Skipping.{Style.RESET_ALL}")
+    return Catalog(tools_path, compiled)
+
+
+def load_tool_configurations(tools_dir: str = 'tools') -> List[Mapping]:
+    """
+    Loads tool configurations from JSON files in the specified directory,
+    through the compiled catalog.
+    """
+    catalog = load_catalog(tools_dir)
+    return catalog.tools if catalog else []
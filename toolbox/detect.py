@@ -0,0 +1,197 @@
+"""
+Detection of already-installed tools.
+
+A tool definition may declare native probes under "detect", which are
+answered without starting a shell:
+
+    "detect": {"rpm": "docker-ce"}                 package is in the rpmdb
+    "detect": {"binary": "helm"}                   executable is on PATH
+    "detect": {"binary": "helm", "version_args": ["version", "--client"],
+               "version_regex": "v3\\."}            ... and its version output matches
+    "detect": {"unit": "prometheus"}               systemd unit file is present
+    "detect": {"collections": ["community.general"]}  Ansible collections are installed
+    "detect": {"collections": true}                ... namely those the tool's download
+                                                   steps fetch with toolbox.download_collections
+
+All keys given must match. Every RPM probe is answered by a single
+`rpm -qa` query. Tools without "detect" fall back to their shell
+"idempotency_check". Checks run concurrently, each with a timeout.
+
+Given a StateDB, results are cached between sessions under a fingerprint of
+what each check depends on (rpmdb, binary, unit directories), so only tools
+whose fingerprint changed are probed again.
+"""
+
+import os
+import re
+import json
+import shutil
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from toolbox.state import stat_fingerprint
+
+DEFAULT_TIMEOUT = 5
+DEFAULT_WORKERS = 8
+UNIT_DIRS = ('/etc/systemd/system', '/run/systemd/system', '/usr/lib/systemd/system', '/lib/systemd/system')
+# Files rewritten whenever a package is installed or removed
+RPMDB_PATHS = ('/var/lib/rpm', '/var/lib/rpm/rpmdb.sqlite', '/var/lib/rpm/Packages', '/usr/lib/sysimage/rpm')
+# Shell checks can depend on anything, so their cached results also expire
+SHELL_CHECK_MAX_AGE = 600
+STATE_SECTION = 'detection'
+
+
+def probe_collections(tool: Dict[str, Any]) -> List[str]:
+    """
+    The collections a tool's "collections" probe checks. True stands for the
+    collections named by its toolbox.download_collections download steps.
+    """
+    names = tool['detect']['collections']
+    if names is True:
+        from toolbox.download_collections import requested_collections
+        names = []
+        for step in tool.get('download_steps', []):
+            if isinstance(step, dict) and step.get('type', 'shell') == 'shell':
+                names.extend(requested_collections(step.get('command', '')) or [])
+    return [names] if isinstance(names, str) else list(names)
+
+
+def compact_probe(tool: Dict[str, Any]) -> Dict[str, Any]:
+    """A tool's "detect" object as stored in the compiled catalog, with "collections": true expanded."""
+    probe = dict(tool['detect'])
+    if probe.get('collections') is True:
+        probe['collections'] = probe_collections(tool)
+    return probe
+
+
+class Detector:
+    """Answers "is this tool installed?" for many tools at once."""
+
+    def __init__(self, timeout: float = DEFAULT_TIMEOUT, workers: int = DEFAULT_WORKERS):
+        self.timeout = timeout
+        self.workers = workers
+        self._rpm_packages = None
+        self._rpm_lock = threading.Lock()
+
+    def rpm_packages(self) -> Set[str]:
+        """Names of all installed RPM packages, queried once."""
+        with self._rpm_lock:
+            if self._rpm_packages is None:
+                try:
+                    result = subprocess.run(['rpm', '-qa', '--qf', '%{NAME}\\n'], stdout=subprocess.PIPE,
+                                            stderr=subprocess.DEVNULL, text=True, timeout=self.timeout * 2)
+                    self._rpm_packages = set(result.stdout.split())
+                except (OSError, subprocess.SubprocessError):
+                    self._rpm_packages = set()
+            return self._rpm_packages
+
+    def _probe_binary(self, probe: Dict[str, Any]) -> bool:
+        path = shutil.which(probe['binary'])
+        if not path:
+            return False
+        pattern = probe.get('version_regex')
+        if not pattern:
+            return True
+        args = probe.get('version_args', ['--version'])
+        try:
+            result = subprocess.run([path] + list(args), stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                    text=True, timeout=self.timeout)
+        except (OSError, subprocess.SubprocessError):
+            return False
+        return re.search(pattern, result.stdout or '') is not None
+
+    @staticmethod
+    def _probe_unit(unit: str) -> bool:
+        if '.' not in unit:
+            unit += '.service'
+        return any(os.path.exists(os.path.join(d, unit)) for d in UNIT_DIRS)
+
+    @staticmethod
+    def _probe_collections(names) -> bool:
+        from toolbox.collection_install import collection_paths, installed_version
+        paths = collection_paths()
+        return all(any(installed_version(path, name) for path in paths) for name in names)
+
+    def _run_shell_check(self, command: str) -> bool:
+        try:
+            subprocess.run(command, shell=True, check=True, stdout=subprocess.DEVNULL,
+                           stderr=subprocess.DEVNULL, timeout=self.timeout)
+            return True
+        except (subprocess.CalledProcessError, subprocess.TimeoutExpired, OSError):
+            return False
+
+    def probe(self, tool: Dict[str, Any]) -> Optional[bool]:
+        """Returns True/False for a tool, or None if it defines no way to detect it."""
+        probe = tool.get('detect')
+        if probe:
+            if 'rpm' in probe and probe['rpm'] not in self.rpm_packages():
+                return False
+            if 'unit' in probe and not self._probe_unit(probe['unit']):
+                return False
+            if 'binary' in probe and not self._probe_binary(probe):
+                return False
+            if 'collections' in probe and not self._probe_collections(probe_collections(tool)):
+                return False
+            return True
+        command = tool.get('idempotency_check')
+        if command:
+            return self._run_shell_check(command)
+        return None
+
+    @staticmethod
+    def _path_dirs():
+        return [d for d in os.environ.get('PATH', '').split(os.pathsep) if d]
+
+    def fingerprint(self, tool: Dict[str, Any]) -> str:
+        """
+        Cheap fingerprint of everything a tool's check depends on. The check
+        definition itself is included, so editing it invalidates the cache.
+        """
+        probe = tool.get('detect')
+        parts = [json.dumps(probe or tool.get('idempotency_check'), sort_keys=True)]
+        if probe:
+            if 'rpm' in probe:
+                parts.append(stat_fingerprint(RPMDB_PATHS))
+            if 'unit' in probe:
+                parts.append(stat_fingerprint(UNIT_DIRS))
+            if 'binary' in probe:
+                path = shutil.which(probe['binary'])
+                # A missing binary can appear in any PATH directory
+                parts.append(stat_fingerprint([path] if path else self._path_dirs()))
+            if 'collections' in probe:
+                from toolbox.collection_install import collection_paths, collection_dir
+                parts.append(stat_fingerprint(os.path.join(collection_dir(path, name), 'MANIFEST.json')
+                                              for path in collection_paths() for name in probe_collections(tool)))
+        else:
+            parts.append(stat_fingerprint(RPMDB_PATHS + UNIT_DIRS + tuple(self._path_dirs())))
+        return "#".join(parts)
+
+    def detect(self, tools: Iterable[Dict[str, Any]], state=None) -> Dict[str, Optional[bool]]:
+        """
+        Probes every tool concurrently. Returns {tool name: True/False/None}.
+        With a StateDB, tools whose fingerprint is unchanged reuse the stored result.
+        """
+        tools = list(tools)
+        results = {}
+        pending = []
+        fingerprints = {}
+        for tool in tools:
+            if state is not None:
+                fingerprints[tool['name']] = self.fingerprint(tool)
+                max_age = None if tool.get('detect') else SHELL_CHECK_MAX_AGE
+                record = state.get(STATE_SECTION, tool['name'], fingerprints[tool['name']], max_age=max_age)
+                if record is not None:
+                    results[tool['name']] = record['installed']
+                    continue
+            pending.append(tool)
+
+        if any('rpm' in (tool.get('detect') or {}) for tool in pending):
+            self.rpm_packages()
+        with ThreadPoolExecutor(max_workers=max(1, self.workers)) as pool:
+            for tool, result in zip(pending, pool.map(self.probe, pending)):
+                results[tool['name']] = result
+                if state is not None:
+                    state.put(STATE_SECTION, tool['name'], fingerprints[tool['name']], installed=result)
+        return {tool['name']: results[tool['name']] for tool in tools}
@@ -1,152 +1,484 @@
 #!/usr/bin/env python3
+"""
+Concurrent Ansible Galaxy collection downloader.
+
+The named collections and their transitive dependencies (from the
+"dependencies" of each version's metadata) are resolved concurrently: for
+every collection the highest version satisfying all requirements on it is
+chosen, and collections are re-resolved when a newly found requirement
+excludes the version chosen so far. The result is written to a lockfile
+(collections.lock.json in the output directory by default) with each
+version, download URL and sha256. Later runs for the same collections
+download exactly what the lock lists, without resolving again, until
+--update-lock is given.
+"""
+
+import io
 import os
+import re
 import sys
 import json
+import shlex
 import argparse
-import urllib.request
+import threading
+import contextlib
 import urllib.error
-from tqdm import tqdm
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 
-def download_file(url, dest_path):
-    try:
-        print(f"Downloading {url} to {dest_path}...")
-        with urllib.request.urlopen(url) as response, open(dest_path, 'wb') as out_file:
-            total_size = int(response.info().get('Content-Length', 0))
-            block_size = 1024 # 1 Kibibyte
-            
-            with tqdm(total=total_size, unit='iB', unit_scale=True, desc=os.path.basename(dest_path)) as t:
-                while True:
-                    data = response.read(block_size)
-                    if not data:
-                        break
-                    t.update(len(data))
-                    out_file.write(data)
-                    
-        print(f"Successfully downloaded to {dest_path}")
-        return True
-    except urllib.error.URLError as e:
-        print(f"Error downloading {url}: {e}")
-        return False
-    except Exception as e:
-        print(f"An error occurred: {e}")
-        return False
+from toolbox.http_client import ConnectionPool
+from toolbox.http_cache import HTTPCache, DEFAULT_TTL
+from toolbox.store import hash_file
+from toolbox.mirrors import MirrorSelector
 
-def get_collection_info(namespace, name):
-    # Try v3 API first as it's the current standard for Galaxy NG
-    api_url_v3 = f"https://galaxy.ansible.com/api/v3/plugin/ansible/content/published/collections/index/{namespace}/{name}/"
-    
-    # Fallback to v2 if v3 fails (legacy Galaxy)
-    api_url_v2 = f"https://galaxy.ansible.com/api/v2/collections/{namespace}/{name}/"
-    
-    for api_url in [api_url_v3, api_url_v2]:
-        try:
-            # Create a request with a User-Agent to avoid 403s or blocks
-            req = urllib.request.Request(
-                api_url, 
-                headers={'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'}
-            )
-            with urllib.request.urlopen(req) as response:
-                data = json.loads(response.read().decode())
-                return data
-        except urllib.error.HTTPError as e:
-            if e.code == 404:
-                continue # Try next API version
-            print(f"Error fetching info for {namespace}.{name} from {api_url}: {e}")
-        except Exception as e:
-            print(f"Error: {e}")
-            
-    return None
+GALAXY_URL = "https://galaxy.ansible.com"
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+DEFAULT_JOBS = 8
+LOCK_FILENAME = 'collections.lock.json'
+# 2: records whether dependencies were resolved
+LOCK_VERSION = 2
+VERSIONS_PAGE_SIZE = 100
+# Pages of version listings followed before giving up
+MAX_VERSION_PAGES = 50
 
-def main():
-    parser = argparse.ArgumentParser(description="Download Ansible collections from Galaxy API")
-    parser.add_argument("--output-dir", required=True, help="Directory to save downloaded collections")
-    parser.add_argument("collections", nargs="+", help="List of collections to download (namespace.name)")
-    args = parser.parse_args()
 
-    if not os.path.exists(args.output_dir):
-        os.makedirs(args.output_dir)
+def parse_version(version):
+    """Sortable key of a semantic version; pre-releases sort before their release."""
+    core, _, prerelease = str(version).split('+', 1)[0].partition('-')
+    numbers = tuple(int(part) if part.isdigit() else 0 for part in core.split('.'))
+    return (numbers + (0, 0, 0))[:3] + (((1,),) if not prerelease else ((0, prerelease),))
+
+
+def is_prerelease(version):
+    """True if version has a pre-release segment, as in 2.0.0-beta.1."""
+    return bool(str(version).split('+', 1)[0].partition('-')[2])
 
-    success_count = 0
-    fail_count = 0
 
-    for collection in args.collections:
-        if "." not in collection:
-            print(f"Invalid collection name: {collection}. Must be namespace.name")
-            fail_count += 1
+def _spec_clauses(spec):
+    """Yields (operator, version) for each clause of a requirement, or None for a malformed clause."""
+    for clause in (clause.strip() for clause in (spec or '*').split(',')):
+        if clause in ('', '*'):
             continue
+        match = re.fullmatch(r'(==|!=|>=|<=|>|<|=)?\s*(\S+)', clause)
+        yield (match.group(1) or '==', match.group(2)) if match else None
+
+
+def allows_prerelease(spec):
+    """
+    True if a requirement names a pre-release version. Like ansible-galaxy,
+    pre-releases are only picked for such requirements.
+    """
+    return any(clause and is_prerelease(clause[1]) for clause in _spec_clauses(spec))
+
+
+def version_matches(version, spec):
+    """True if version satisfies an ansible-galaxy requirement such as '>=1.2.0,<2.0.0', '1.2.3' or '*'."""
+    for clause in _spec_clauses(spec):
+        if clause is None:
+            return False
+        operator, target = clause[0], parse_version(clause[1])
+        actual = parse_version(version)
+        if not {'==': actual == target, '=': actual == target, '!=': actual != target,
+                '>=': actual >= target, '<=': actual <= target,
+                '>': actual > target, '<': actual < target}[operator]:
+            return False
+    return True
+
+
+def combine_specs(specs):
+    """One requirement string that all of specs must hold for."""
+    return ','.join(spec for spec in specs if spec and spec.strip() != '*') or '*'
+
+
+def version_dependencies(version_info):
+    """The {namespace.name: requirement} a collection version depends on."""
+    return dict((version_info.get('metadata') or {}).get('dependencies') or {})
+
 
-        namespace, name = collection.split(".", 1)
-        print(f"\nProcessing {collection}...")
-        
-        info = get_collection_info(namespace, name)
+class GalaxyClient:
+    """
+    Resolves collection metadata from a Galaxy server. All requests share one
+    keep-alive connection pool, so it is safe and cheap to use from many threads.
+    With an HTTPCache, metadata is reused and revalidated instead of refetched.
+    With mirrors, every request goes to the fastest server first and fails
+    over to the others.
+    """
+
+    def __init__(self, base_url=GALAXY_URL, pool=None, cache=None, mirrors=(), selector=None):
+        self.base_urls = list(dict.fromkeys(url.rstrip('/') for url in [base_url, *mirrors]))
+        self.pool = pool or ConnectionPool(headers={'User-Agent': USER_AGENT})
+        self.cache = cache
+        self.selector = selector or MirrorSelector(pool=self.pool)
+        self._ranked = None
+        self._rank_lock = threading.Lock()
+
+    @property
+    def base_url(self):
+        return self.ranked_base_urls()[0]
+
+    def ranked_base_urls(self):
+        """The Galaxy servers, fastest first. Probed once per client."""
+        with self._rank_lock:
+            if self._ranked is None:
+                if len(self.base_urls) > 1:
+                    ranked = self.selector.rank([f"{base}/api/" for base in self.base_urls])
+                    self._ranked = [url[:-len('/api/')] for url in ranked]
+                else:
+                    self._ranked = self.base_urls
+            return self._ranked
+
+    def mirror_urls(self, url):
+        """url on every Galaxy server, best first, if it points to one of them; otherwise just url."""
+        for base in self.base_urls:
+            if url.startswith(base + '/'):
+                return [mirror + url[len(base):] for mirror in self.ranked_base_urls()]
+        return [url]
+
+    def _fetch_json(self, url):
+        if self.cache is not None:
+            return self.cache.get_json(self.pool, url)
+        with self.pool.get(url) as response:
+            return json.loads(response.read().decode())
+
+    def get_json(self, url):
+        """Fetches url, failing over to the same path on the other servers. Raises the last error."""
+        urls = self.mirror_urls(url)
+        for position, mirror_url in enumerate(urls):
+            try:
+                return self._fetch_json(mirror_url)
+            except (urllib.error.URLError, ValueError, OSError) as e:
+                is_missing = isinstance(e, urllib.error.HTTPError) and e.code == 404
+                if not is_missing:
+                    self.selector.rankings.record_failure(mirror_url)
+                if position == len(urls) - 1:
+                    raise
+
+    def get_collection_info(self, namespace, name):
+        # Try v3 API first as it's the current standard for Galaxy NG
+        api_url_v3 = f"{self.base_url}/api/v3/plugin/ansible/content/published/collections/index/{namespace}/{name}/"
+
+        # Fallback to v2 if v3 fails (legacy Galaxy)
+        api_url_v2 = f"{self.base_url}/api/v2/collections/{namespace}/{name}/"
+
+        for api_url in [api_url_v3, api_url_v2]:
+            try:
+                return self.get_json(api_url)
+            except urllib.error.HTTPError as e:
+                if e.code == 404:
+                    continue # Try next API version
+                print(f"Error fetching info for {namespace}.{name} from {api_url}: {e}")
+            except Exception as e:
+                print(f"Error: {e}")
+
+        return None
+
+    def list_versions(self, versions_url):
+        """Returns every version listed at versions_url, following pagination (v3 and v2 layouts)."""
+        versions = []
+        url = versions_url if "?" in versions_url else f"{versions_url}?limit={VERSIONS_PAGE_SIZE}"
+        for _ in range(MAX_VERSION_PAGES):
+            page = self.get_json(url)
+            if isinstance(page, list):
+                results, next_url = page, None
+            else:
+                results = page.get("data", page.get("results", []))
+                next_url = (page.get("links") or {}).get("next") or page.get("next")
+            versions.extend(v["version"] for v in results if v.get("version"))
+            if not next_url:
+                break
+            url = urllib.parse.urljoin(url, next_url)
+        return versions
+
+    def get_version_info(self, namespace, name, spec='*'):
+        """
+        Returns the version metadata (download_url, artifact sha256,
+        dependencies, ...) of the highest version of a collection that
+        satisfies spec, or None.
+        """
+        info = self.get_collection_info(namespace, name)
         if not info:
-            fail_count += 1
-            continue
-            
-        # DEBUG: Print keys to understand structure
-        # print(f"DEBUG: Keys in info: {list(info.keys())}")
-        
-        download_url = None
-        
+            return None
+
         # Strategy: Use 'versions_url' to list versions, find the highest/latest, and get its download link
         versions_url = info.get("versions_url")
         highest_version = info.get("highest_version", {}).get("version")
-        
-        if versions_url and highest_version:
-            print(f"Found highest version: {highest_version}. Fetching version details...")
-            # The versions_url usually lists versions. We might need to append the version number or filter.
-            # Let's try constructing the version-specific URL directly if we know the pattern
-            # Pattern v3: .../versions/{version}/
-            # Pattern v2: .../versions/{version}/
-            
-            # Try to fetch the specific version directly using the versions_url base
-            # If versions_url is .../versions/, we append {version}/
-            
-            # Handle relative URLs
-            if versions_url.startswith("/"):
-                versions_url = f"https://galaxy.ansible.com{versions_url}"
-            
-            target_version_url = f"{versions_url.rstrip('/')}/{highest_version}/"
-            
+        if not (versions_url and highest_version):
+            return None
+
+        # Handle relative URLs
+        if versions_url.startswith("/"):
+            versions_url = f"{self.base_url}{versions_url}"
+
+        prerelease_ok = allows_prerelease(spec)
+        if not version_matches(highest_version, spec) or (is_prerelease(highest_version) and not prerelease_ok):
+            # Only an older version will do
             try:
-                req = urllib.request.Request(
-                    target_version_url, 
-                    headers={'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'}
-                )
-                with urllib.request.urlopen(req) as response:
-                    version_data = json.loads(response.read().decode())
-                    download_url = version_data.get("download_url")
+                candidates = [v for v in self.list_versions(versions_url)
+                              if version_matches(v, spec) and (prerelease_ok or not is_prerelease(v))]
             except Exception as e:
-                print(f"Error fetching version details from {target_version_url}: {e}")
-                # Fallback: List all versions and find the match
-                try:
-                    req = urllib.request.Request(
-                        versions_url, 
-                        headers={'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'}
-                    )
-                    with urllib.request.urlopen(req) as response:
-                        versions_data = json.loads(response.read().decode())
-                        # versions_data might be a list or a paginated dict
-                        results = versions_data.get("results", []) if isinstance(versions_data, dict) else versions_data
-                        for v in results:
-                            if v.get("version") == highest_version:
-                                download_url = v.get("download_url")
-                                break
-                except Exception as e2:
-                    print(f"Error listing versions: {e2}")
-
-        if not download_url:
-             print(f"Could not find download URL for {collection}")
-             fail_count += 1
-             continue
-
-        filename = os.path.basename(download_url)
-        dest_path = os.path.join(args.output_dir, filename)
-        
-        if download_file(download_url, dest_path):
-            success_count += 1
+                print(f"Error listing versions of {namespace}.{name}: {e}")
+                return None
+            if not candidates:
+                return None
+            highest_version = max(candidates, key=parse_version)
+            print(f"{namespace}.{name}: version {highest_version} is the highest matching {spec}. "
+                  f"Fetching version details...")
         else:
-            fail_count += 1
+            print(f"{namespace}.{name}: found highest version {highest_version}. Fetching version details...")
+
+        # Pattern (v2 and v3): .../versions/{version}/
+        target_version_url = f"{versions_url.rstrip('/')}/{highest_version}/"
+        try:
+            return self.get_json(target_version_url)
+        except Exception as e:
+            print(f"Error fetching version details from {target_version_url}: {e}")
+
+        # Fallback: List all versions and find the match
+        try:
+            versions_data = self.get_json(versions_url)
+            # versions_data might be a list or a paginated dict
+            results = versions_data.get("results", []) if isinstance(versions_data, dict) else versions_data
+            for v in results:
+                if v.get("version") == highest_version:
+                    return v
+        except Exception as e2:
+            print(f"Error listing versions: {e2}")
+        return None
+
+def resolve_closure(client, collections, jobs=DEFAULT_JOBS, dependencies=True):
+    """
+    Resolves collections and, unless dependencies is False, everything they
+    transitively depend on, with up to jobs metadata lookups at a time.
+    Returns ({name: version_info} for the closure, {name: error}).
+    """
+    roots = list(dict.fromkeys(collections))
+    constraints = {name: {None: '*'} for name in roots}  # name -> {required by (None: requested): spec}
+    resolved = {}
+    errors = {}
+    running = {}  # future -> (name, spec it was resolved against)
+    in_flight = set()
+
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+        def submit(name):
+            if name in in_flight:
+                return
+            if "." not in name:
+                errors[name] = "invalid collection name, must be namespace.name"
+                return
+            errors.pop(name, None)
+            spec = combine_specs(constraints[name].values())
+            namespace, short_name = name.split(".", 1)
+            running[pool.submit(client.get_version_info, namespace, short_name, spec)] = (name, spec)
+            in_flight.add(name)
+
+        for name in roots:
+            submit(name)
+        while running:
+            done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+            for future in done:
+                name, spec = running.pop(future)
+                in_flight.discard(name)
+                try:
+                    version_info = future.result()
+                except Exception as e:
+                    errors[name] = str(e)
+                    continue
+                current_spec = combine_specs(constraints[name].values())
+                if not version_info or not version_info.get("version"):
+                    errors[name] = "not found" if spec == '*' else f"no version matches {spec}"
+                    if current_spec != spec:
+                        submit(name)
+                    continue
+                if not version_matches(version_info["version"], current_spec):
+                    # Requirements changed while this lookup ran
+                    submit(name)
+                    continue
+
+                previous = version_dependencies(resolved.get(name) or {})
+                resolved[name] = version_info
+                if not dependencies:
+                    continue
+                requires = version_dependencies(version_info)
+                for dependency in previous:
+                    if dependency not in requires:
+                        constraints.get(dependency, {}).pop(name, None)
+                for dependency, dependency_spec in requires.items():
+                    constraints.setdefault(dependency, {})[name] = dependency_spec
+                    chosen = resolved.get(dependency)
+                    if chosen is None or not version_matches(chosen["version"],
+                                                             combine_specs(constraints[dependency].values())):
+                        submit(dependency)
+
+    # Only what the requested collections still reach is part of the closure
+    closure = {}
+    failed = {}
+    queue = list(roots)
+    while queue:
+        name = queue.pop()
+        if name in closure or name in failed:
+            continue
+        if name not in resolved or name in errors:
+            requirers = sorted(r or "(requested)" for r in constraints.get(name, {}))
+            failed[name] = (f"{errors.get(name, 'unresolved')} "
+                            f"(required by {', '.join(requirers)}: "
+                            f"{combine_specs(constraints.get(name, {}).values())})")
+            continue
+        closure[name] = resolved[name]
+        if dependencies:
+            queue.extend(version_dependencies(resolved[name]))
+    return closure, failed
+
+
+def lock_entry(version_info):
+    """The part of a version's metadata that the lockfile keeps."""
+    return {
+        "version": version_info["version"],
+        "download_url": version_info.get("download_url"),
+        "sha256": (version_info.get("artifact") or {}).get("sha256"),
+        "dependencies": version_dependencies(version_info),
+    }
+
+
+def read_lock(path, collections, dependencies=True):
+    """
+    Returns the locked {name: entry} if path locks exactly these requested
+    collections, resolved with (or without) their dependencies, else None.
+    """
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            lock = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if lock.get("version") != LOCK_VERSION or lock.get("requested") != sorted(set(collections)) \
+            or lock.get("with_dependencies") != dependencies:
+        return None
+    return lock.get("collections") or None
+
+
+def write_lock(path, collections, entries, dependencies=True):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({"version": LOCK_VERSION, "requested": sorted(set(collections)),
+                   "with_dependencies": dependencies, "collections": entries}, f, indent=2, sort_keys=True)
+        f.write("\n")
+    os.replace(tmp_path, path)
+
+
+def collection_filename(download_url):
+    return os.path.basename(download_url.split("?", 1)[0])
+
+
+def download_collection(client, collection, download_url, expected_sha256, output_dir, progress=True):
+    """Downloads one collection tarball unless it is already present and intact. Returns True on success."""
+    if not download_url:
+        print(f"Could not find download URL for {collection}")
+        return False
+
+    # Galaxy may return download URLs relative to the server
+    if download_url.startswith("/"):
+        download_url = f"{client.base_url}{download_url}"
+
+    filename = collection_filename(download_url)
+    dest_path = os.path.join(output_dir, filename)
+
+    # Skip the download if the tarball we already have is the published artifact
+    if expected_sha256 and os.path.exists(dest_path) and hash_file(dest_path) == expected_sha256:
+        print(f"{filename} is up to date (sha256 {expected_sha256[:12]}). Skipping download.")
+        return True
+
+    if not client.selector.download(client.mirror_urls(download_url), dest_path, progress=progress):
+        return False
+    if expected_sha256 and hash_file(dest_path) != expected_sha256:
+        print(f"Checksum mismatch for {dest_path}: expected sha256 {expected_sha256}")
+        os.remove(dest_path)
+        return False
+    return True
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Download Ansible collections from Galaxy API")
+    parser.add_argument("--output-dir", required=True, help="Directory to save downloaded collections")
+    parser.add_argument("--jobs", type=int, default=DEFAULT_JOBS,
+                        help=f"Number of collections to resolve and download in parallel (default: {DEFAULT_JOBS})")
+    parser.add_argument("--galaxy-url", default=GALAXY_URL, help=f"Galaxy server base URL (default: {GALAXY_URL})")
+    parser.add_argument("--galaxy-mirror", action="append", default=[], metavar="URL",
+                        help="Additional Galaxy server with the same content; repeat for several. "
+                             "The fastest server is used and the others take over on errors")
+    parser.add_argument("--cache-dir", default=None,
+                        help="Directory for cached Galaxy metadata (default: .relay/cache/http)")
+    parser.add_argument("--cache-ttl", type=float, default=DEFAULT_TTL,
+                        help=f"Seconds before cached metadata is revalidated (default: {DEFAULT_TTL})")
+    parser.add_argument("--no-cache", action="store_true", help="Always fetch fresh metadata")
+    parser.add_argument("--no-deps", action="store_true", help="Download only the named collections, not their dependencies")
+    parser.add_argument("--lockfile", default=None,
+                        help=f"Lockfile to reuse and write (default: {LOCK_FILENAME} in the output directory)")
+    parser.add_argument("--update-lock", action="store_true", help="Resolve again even if the lockfile matches")
+    parser.add_argument("collections", nargs="+", help="List of collections to download (namespace.name)")
+    return parser
+
+
+def requested_collections(command: str):
+    """
+    The collections named by a `python3 -m toolbox.download_collections ...`
+    shell command, or None if the command doesn't run this module.
+    """
+    try:
+        tokens = shlex.split(command)
+    except ValueError:
+        return None
+    if 'toolbox.download_collections' not in tokens:
+        return None
+    try:
+        with contextlib.redirect_stderr(io.StringIO()):
+            args, _ = build_parser().parse_known_args(tokens[tokens.index('toolbox.download_collections') + 1:])
+    except SystemExit:
+        return None
+    return list(args.collections)
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    if not os.path.exists(args.output_dir):
+        os.makedirs(args.output_dir)
+
+    cache = None if args.no_cache else HTTPCache(args.cache_dir, ttl=args.cache_ttl)
+    client = GalaxyClient(args.galaxy_url, cache=cache, mirrors=args.galaxy_mirror)
+    jobs = max(1, args.jobs)
+    # Concurrent progress bars would garble each other, so only show them when serial
+    progress = jobs == 1
+    lock_path = args.lockfile or os.path.join(args.output_dir, LOCK_FILENAME)
+
+    entries = None if args.update_lock else read_lock(lock_path, args.collections, dependencies=not args.no_deps)
+    failed = {}
+    if entries is not None:
+        print(f"Using {len(entries)} locked collection version(s) from {lock_path}")
+    else:
+        closure, failed = resolve_closure(client, args.collections, jobs, dependencies=not args.no_deps)
+        entries = {name: lock_entry(info) for name, info in closure.items()}
+        extra = len(entries) - len([c for c in args.collections if c in entries])
+        print(f"Resolved {len(entries)} collection(s), {extra} of them as dependencies.")
+        for name, error in sorted(failed.items()):
+            print(f"Could not resolve {name}: {error}")
+
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        results = list(pool.map(
+            lambda item: download_collection(client, f"{item[0]} {item[1]['version']}", item[1]["download_url"],
+                                             item[1]["sha256"], args.output_dir, progress),
+            sorted(entries.items())))
+    client.pool.close()
+    client.selector.rankings.save()
+
+    success_count = sum(1 for ok in results if ok)
+    fail_count = len(results) - success_count + len(failed)
+    if fail_count == 0:
+        write_lock(lock_path, args.collections, entries, dependencies=not args.no_deps)
+        # Tarballs of versions no longer locked would be installed alongside the locked ones
+        keep = {collection_filename(entry["download_url"]) for entry in entries.values()}
+        for filename in sorted(os.listdir(args.output_dir)):
+            if filename.endswith(".tar.gz") and filename not in keep:
+                os.remove(os.path.join(args.output_dir, filename))
+                print(f"Removed {filename}, which is no longer locked")
 
     print(f"\nDownload Summary: {success_count} successful, {fail_count} failed.")
     if fail_count > 0:
@@ -0,0 +1,193 @@
+"""
+Headless command interface for automation.
+
+    python3 -m toolbox.cli download --tools helm,git --agree-to-terms
+    python3 -m toolbox.cli install --all --agree-to-terms --json
+    python3 -m toolbox.cli status --json
+    python3 -m toolbox.cli verify --all
+
+Unlike the interactive menus, these commands never clear the screen, sleep
+or wait for input. With --json, human-readable progress goes to stderr and
+stdout carries one JSON document with a result per tool. The exit status
+is 0 if every tool succeeded, 1 if any failed and 2 for usage errors.
+"""
+
+import os
+import sys
+import json
+import argparse
+import contextlib
+from typing import Any, Dict, List
+
+from toolbox.cli import ToolboxCLI
+from toolbox.scheduler import DEFAULT_WORKERS
+from toolbox.verify import Verifier, DEFAULT_JOBS as VERIFY_JOBS
+
+EXIT_OK = 0
+EXIT_FAILED = 1
+EXIT_USAGE = 2
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="relay", description="Relay - DevOps tool provisioning for airgapped environments")
+    commands = parser.add_subparsers(dest="command", required=True)
+    for name, help_text in (("download", "Download tools (internet required)"),
+                            ("install", "Install downloaded tools"),
+                            ("status", "Show which tools are downloaded and installed"),
+                            ("verify", "Check downloaded artifacts against their sha256 manifests")):
+        command = commands.add_parser(name, help=help_text)
+        selection = command.add_mutually_exclusive_group(required=name not in ("status", "verify"))
+        selection.add_argument("--tools", help="Comma-separated tool names (default for status/verify: all)")
+        selection.add_argument("--all", action="store_true", help="All tools in the catalog")
+        command.add_argument("--json", action="store_true", help="Print machine-readable results on stdout")
+        if name == "status":
+            continue
+        if name == "verify":
+            command.add_argument("--jobs", type=int, default=VERIFY_JOBS,
+                                 help=f"Files hashed concurrently (default: {VERIFY_JOBS})")
+            command.add_argument("--full", action="store_true",
+                                 help="Hash every file, even those verified before and unchanged since")
+            continue
+        command.add_argument("--agree-to-terms", action="store_true",
+                             help="Accept the disclaimer (required, as there is no prompt)")
+        command.add_argument("--jobs", type=int, default=DEFAULT_WORKERS,
+                             help=f"Tools processed concurrently (default: {DEFAULT_WORKERS})")
+        command.add_argument("--simulate", action="store_true", help="Print commands without running them")
+        command.add_argument("--trace-file", help="Write the run's trace here (default: .relay/traces/)")
+        command.add_argument("--metrics-dir",
+                             help="Write relay_<command>.prom for the Prometheus textfile collector here "
+                                  "(default: .relay/metrics)")
+        if name == "download":
+            command.add_argument("--incremental", action="store_true",
+                                 help="Skip download steps whose inputs and outputs are unchanged")
+            command.add_argument("--update-versions", action="store_true",
+                                 help="Look up the latest upstream versions instead of reusing pinned ones")
+    return parser
+
+
+def _select_tools(cli, args) -> List[Any]:
+    """Returns the tools named by --tools (all tools by default). Raises KeyError for unknown names."""
+    if not args.tools:
+        return list(cli.tools_config)
+    selected = []
+    for name in (n.strip() for n in args.tools.split(',')):
+        if not name:
+            continue
+        tool = cli.catalog.get(name) if cli.catalog else None
+        if tool is None:
+            raise KeyError(name)
+        if tool not in selected:
+            selected.append(tool)
+    return selected
+
+
+def _tool_status(cli, tool) -> Dict[str, Any]:
+    record = cli.state.get('downloads', tool['name'], cli._download_fingerprint(tool)) or {}
+    return {
+        "name": tool['name'],
+        "installed": tool['name'] in cli.installed_tools,
+        "downloaded": tool['name'] in cli.downloaded_tools,
+        "files": len(record.get('files', {})),
+        "size": record.get('size', 0),
+    }
+
+
+def _verify(cli, tools, args) -> List[Dict[str, Any]]:
+    """Verifies the downloaded tools against their store manifests; others are skipped."""
+    downloaded = [tool['name'] for tool in tools if tool['name'] in cli.downloaded_tools]
+    verified = Verifier(cli.store, cli.state, jobs=max(1, args.jobs), full=args.full).verify(downloaded)
+    results = []
+    for tool in tools:
+        result = verified.get(tool['name'])
+        if result is None:
+            results.append({"name": tool['name'], "status": "skipped", "reason": "not downloaded"})
+            continue
+        results.append({"name": result.name, "status": "failed" if result.problems else "ok",
+                        "files": result.files, "hashed": result.hashed,
+                        "problems": [{"path": p.path, "reason": p.reason} for p in result.problems]})
+    return results
+
+
+def _run_action(cli, command: str, tools) -> List[Dict[str, Any]]:
+    results = []
+    if command == "download":
+        for result in cli._download_tools(tools):
+            results.append({"name": result.name, "status": "ok" if result.success else "failed",
+                            "duration": round(result.duration, 3)})
+        return results
+
+    pending = []
+    for tool in tools:
+        if tool['name'] in cli.installed_tools:
+            results.append({"name": tool['name'], "status": "skipped", "reason": "already installed"})
+        elif not cli.simulation_mode and tool['name'] not in cli.downloaded_tools:
+            results.append({"name": tool['name'], "status": "failed", "reason": "not downloaded"})
+        else:
+            pending.append(tool)
+    for result in cli._install_tools(pending):
+        results.append({"name": result.name, "status": "ok" if result.success else "failed",
+                        "duration": round(result.duration, 3)})
+    order = {tool['name']: position for position, tool in enumerate(tools)}
+    return sorted(results, key=lambda result: order[result['name']])
+
+
+def main(argv=None) -> int:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+
+    if args.command not in ("status", "verify"):
+        if not args.agree_to_terms:
+            print("Refusing to run without --agree-to-terms: this performs system-level changes "
+                  "and requires root privileges.", file=sys.stderr)
+            return EXIT_USAGE
+        if not args.simulate and os.geteuid() != 0:
+            print("This command must be run as root (use sudo).", file=sys.stderr)
+            return EXIT_FAILED
+
+    # With --json, stdout is reserved for the result document
+    output = contextlib.redirect_stdout(sys.stderr) if args.json else contextlib.nullcontext()
+    with output:
+        cli = ToolboxCLI()
+        try:
+            tools = _select_tools(cli, args)
+        except KeyError as e:
+            print(f"Unknown tool: {e.args[0]}", file=sys.stderr)
+            return EXIT_USAGE
+
+        if args.command == "status":
+            results = [_tool_status(cli, tool) for tool in tools]
+            exit_code = EXIT_OK
+        elif args.command == "verify":
+            results = _verify(cli, tools, args)
+            exit_code = EXIT_OK if all(r['status'] != "failed" for r in results) else EXIT_FAILED
+        else:
+            cli.simulation_mode = args.simulate
+            cli.jobs = max(1, args.jobs)
+            cli.incremental_mode = getattr(args, 'incremental', False)
+            cli.update_versions = getattr(args, 'update_versions', False)
+            cli.trace_file = args.trace_file
+            cli.metrics_dir = args.metrics_dir
+            results = _run_action(cli, args.command, tools)
+            exit_code = EXIT_OK if all(r['status'] != "failed" for r in results) else EXIT_FAILED
+
+    if args.json:
+        json.dump({"command": args.command, "simulate": getattr(args, 'simulate', False),
+                   "exit_code": exit_code, "tools": results}, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+    elif args.command == "status":
+        for result in results:
+            flags = [flag for flag in ("installed", "downloaded") if result[flag]]
+            print(f"{result['name']:<25} {', '.join(flags) or '-'}")
+    elif args.command == "verify":
+        for result in results:
+            if result['status'] == "skipped":
+                print(f"{result['name']:<25} - ({result['reason']})")
+                continue
+            print(f"{result['name']:<25} {result['status']} ({result['files']} file(s), {result['hashed']} hashed)")
+            for problem in result['problems']:
+                print(f"  {problem['path']}: {problem['reason']}")
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,86 @@
+"""
+On-disk cache for JSON API responses with HTTP revalidation.
+
+A cached response younger than the TTL is returned without any request.
+Older entries are revalidated with If-None-Match / If-Modified-Since, so an
+unchanged resource costs one small 304 response instead of a full body.
+"""
+
+import os
+import json
+import time
+import hashlib
+from typing import Any, Dict, Optional
+
+from toolbox.http_client import ConnectionPool
+from toolbox.state import default_state_dir
+
+DEFAULT_TTL = 600
+
+
+def default_cache_dir() -> str:
+    return os.path.join(default_state_dir(), 'cache', 'http')
+
+
+class HTTPCache:
+    """Caches JSON GET responses per URL, together with their validators."""
+
+    def __init__(self, cache_dir: Optional[str] = None, ttl: float = DEFAULT_TTL):
+        self.cache_dir = cache_dir or default_cache_dir()
+        self.ttl = ttl
+
+    def _entry_path(self, url: str) -> str:
+        key = hashlib.sha256(url.encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, key[:2], key + '.json')
+
+    def _load(self, url: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._entry_path(url), 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+            return entry if entry.get('url') == url else None
+        except (OSError, ValueError):
+            return None
+
+    def _store(self, entry: Dict[str, Any]):
+        path = self._entry_path(entry['url'])
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.{id(entry)}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(entry, f)
+            os.replace(tmp_path, path)
+        except OSError:
+            pass # Caching is best effort
+
+    def get_json(self, pool: ConnectionPool, url: str) -> Any:
+        """
+        Returns the decoded JSON body of url, from the cache when it is fresh
+        or still valid upstream. HTTP errors propagate as urllib.error.HTTPError.
+        """
+        entry = self._load(url)
+        now = time.time()
+        if entry and now - entry.get('fetched', 0) < self.ttl:
+            return entry['body']
+
+        headers = {}
+        if entry:
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+
+        with pool.get(url, headers=headers) as response:
+            if response.status == 304 and entry:
+                response.read()
+                entry['fetched'] = now
+                self._store(entry)
+                return entry['body']
+            body = json.loads(response.read().decode())
+            self._store({
+                'url': url,
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+                'fetched': now,
+                'body': body,
+            })
+            return body
@@ -0,0 +1,168 @@
+"""
+Minimal keep-alive HTTP client built on http.client.
+
+urllib.request opens a new connection (and a new TLS handshake) for every
+request. ConnectionPool keeps idle connections per host so that many small
+API calls to the same server share a handful of sockets. Errors are raised
+as urllib.error.HTTPError / URLError so callers can handle them the same way
+as urllib.
+"""
+
+import http.client
+import socket
+import threading
+import urllib.error
+import urllib.parse
+from typing import Dict, Optional
+
+DEFAULT_TIMEOUT = 30
+MAX_REDIRECTS = 5
+REDIRECT_CODES = (301, 302, 303, 307, 308)
+
+
+class PooledResponse:
+    """
+    Wraps an http.client.HTTPResponse and hands its connection back to the
+    pool on close(), provided the body was read completely.
+    """
+
+    def __init__(self, pool, key, conn, response, url):
+        self._pool = pool
+        self._key = key
+        self._conn = conn
+        self._response = response
+        self.url = url
+        self.status = response.status
+        self.reason = response.reason
+        self.headers = response.headers
+
+    def read(self, amt=None):
+        return self._response.read(amt)
+
+    def readinto(self, buffer):
+        return self._response.readinto(buffer)
+
+    def info(self):
+        return self.headers
+
+    def close(self):
+        if self._conn is None:
+            return
+        reusable = self._response.isclosed() and not self._response.will_close
+        if not reusable:
+            # Drain small leftovers so the connection can still be reused
+            try:
+                if not self._response.will_close and self._response.length is not None \
+                        and self._response.length <= 64 * 1024:
+                    self._response.read()
+                    reusable = True
+            except (http.client.HTTPException, OSError):
+                reusable = False
+        self._response.close()
+        if reusable:
+            self._pool._release(self._key, self._conn)
+        else:
+            self._conn.close()
+        self._conn = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ConnectionPool:
+    """Thread-safe pool of idle keep-alive connections keyed by scheme, host and port."""
+
+    def __init__(self, timeout: float = DEFAULT_TIMEOUT, headers: Optional[Dict[str, str]] = None,
+                 max_idle_per_host: int = 8):
+        self.timeout = timeout
+        self.headers = dict(headers or {})
+        self.max_idle_per_host = max_idle_per_host
+        self._idle = {}
+        self._lock = threading.Lock()
+
+    def _acquire(self, key):
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                return idle.pop(), True
+        scheme, host, port = key
+        conn_class = http.client.HTTPSConnection if scheme == 'https' else http.client.HTTPConnection
+        return conn_class(host, port, timeout=self.timeout), False
+
+    def _release(self, key, conn):
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.max_idle_per_host:
+                idle.append(conn)
+                return
+        conn.close()
+
+    def close(self):
+        """Closes every idle connection."""
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for conns in idle.values():
+            for conn in conns:
+                conn.close()
+
+    def request(self, method: str, url: str, headers: Optional[Dict[str, str]] = None,
+                body=None, max_redirects: int = MAX_REDIRECTS) -> PooledResponse:
+        """
+        Sends a request and returns a PooledResponse, following redirects.
+        Raises urllib.error.HTTPError for 4xx/5xx statuses and URLError for
+        connection failures. The caller must close() the response.
+        """
+        for _ in range(max_redirects + 1):
+            response = self._send(method, url, headers, body)
+            if response.status in REDIRECT_CODES and response.headers.get('Location'):
+                location = urllib.parse.urljoin(url, response.headers['Location'])
+                response.close()
+                if response.status == 303:
+                    method, body = 'GET', None
+                url = location
+                continue
+            if response.status >= 400:
+                hdrs = response.headers
+                try:
+                    response.read()
+                finally:
+                    response.close()
+                raise urllib.error.HTTPError(url, response.status, response.reason, hdrs, None)
+            return response
+        raise urllib.error.URLError(f"Too many redirects for {url}")
+
+    def get(self, url: str, headers: Optional[Dict[str, str]] = None) -> PooledResponse:
+        return self.request('GET', url, headers=headers)
+
+    def _send(self, method, url, headers, body):
+        parts = urllib.parse.urlsplit(url)
+        if parts.scheme not in ('http', 'https'):
+            raise urllib.error.URLError(f"Unsupported URL scheme: {url}")
+        port = parts.port or (443 if parts.scheme == 'https' else 80)
+        key = (parts.scheme, parts.hostname, port)
+        path = parts.path or '/'
+        if parts.query:
+            path += '?' + parts.query
+
+        request_headers = dict(self.headers)
+        request_headers.update(headers or {})
+
+        # A reused connection may have been closed by the server while idle;
+        # retry such failures once on a fresh connection.
+        for attempt in range(2):
+            conn, reused = self._acquire(key)
+            try:
+                conn.request(method, path, body=body, headers=request_headers)
+                response = conn.getresponse()
+                return PooledResponse(self, key, conn, response, url)
+            except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError) as e:
+                conn.close()
+                if reused and attempt == 0:
+                    continue
+                raise urllib.error.URLError(e)
+            except (http.client.HTTPException, socket.timeout, OSError) as e:
+                conn.close()
+                raise urllib.error.URLError(e)
@@ -0,0 +1,145 @@
+"""
+Incremental download mode.
+
+Each download step is fingerprinted by its definition after placeholder
+substitution (e.g. the final shell command) together with the rest of the
+tool definition, and by the files it produced in the tool's download
+directory. Fields that cannot affect downloads (install steps, detection,
+description) and the other download steps are left out of a step's
+fingerprint, so editing one step doesn't invalidate the steps before it.
+The fingerprints are kept in downloads/.store/steps/<tool>.json.
+
+On the next run, steps are skipped while their fingerprint matches and their
+outputs are still present and unchanged. From the first step that changed
+onwards, everything runs again. Earlier steps that produce no files (repo
+setup, key imports) are re-run too, since later steps may rely on their side
+effects.
+"""
+
+import os
+import json
+import hashlib
+from typing import Any, Dict, List, Optional, Set
+
+from toolbox.store import hash_file, IGNORED_SUFFIXES
+
+
+# Tool definition fields that never influence what a download step produces
+NON_DOWNLOAD_FIELDS = ('download_steps', 'install_steps', 'detect', 'idempotency_check', 'description')
+
+
+def _json_hash(value: Any) -> str:
+    return hashlib.sha256(json.dumps(value, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def snapshot(directory: str) -> Dict[str, List[int]]:
+    """Returns {relative path: [size, mtime_ns]} for every file below directory."""
+    files = {}
+    for dirpath, _, filenames in os.walk(directory):
+        for filename in filenames:
+            if filename.endswith(IGNORED_SUFFIXES):
+                continue
+            path = os.path.join(dirpath, filename)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            files[os.path.relpath(path, directory).replace(os.sep, '/')] = [st.st_size, st.st_mtime_ns]
+    return files
+
+
+class IncrementalDownload:
+    """Decides which download steps of one tool must run, and records what they produced."""
+
+    def __init__(self, store, tool: Dict[str, Any], steps: List[Dict[str, Any]], ctx, tool_dir: str):
+        self.tool_name = tool['name']
+        self.steps = steps
+        self.tool_dir = tool_dir
+        self.path = os.path.join(store.root, 'steps', f"{self.tool_name}.json")
+        tool_hash = _json_hash({key: value for key, value in dict(tool).items()
+                                if key not in NON_DOWNLOAD_FIELDS})
+        self.fingerprints = [_json_hash([tool_hash, self._substituted(step, ctx)]) for step in steps]
+        self.previous = self._load()
+        self.records: List[Optional[Dict[str, Any]]] = [None] * len(steps)
+
+    @staticmethod
+    def _substituted(step, ctx):
+        return {key: ctx.substitute(value) if isinstance(value, str) else value
+                for key, value in step.items()}
+
+    def _load(self) -> List[Dict[str, Any]]:
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f).get('steps', [])
+        except (OSError, ValueError):
+            return []
+
+    def _outputs_intact(self, outputs: Dict[str, Dict[str, Any]]) -> bool:
+        for relpath, entry in outputs.items():
+            path = os.path.join(self.tool_dir, *relpath.split('/'))
+            try:
+                st = os.stat(path)
+            except OSError:
+                return False
+            if st.st_size != entry['size']:
+                return False
+            # Same size and mtime: trust it; otherwise compare content
+            if st.st_mtime_ns != entry['mtime_ns'] and hash_file(path) != entry['sha256']:
+                return False
+        return True
+
+    def plan(self) -> Set[int]:
+        """Returns the indices of the steps that have to run."""
+        first_changed = None
+        for i, fingerprint in enumerate(self.fingerprints):
+            record = self.previous[i] if i < len(self.previous) else None
+            if not record or record.get('fingerprint') != fingerprint \
+                    or not self._outputs_intact(record.get('outputs', {})):
+                first_changed = i
+                break
+            self.records[i] = record
+
+        if first_changed is None:
+            return set()
+        to_run = set(range(first_changed, len(self.steps)))
+        # Steps without outputs only have side effects outside the download dir
+        to_run.update(i for i in range(first_changed) if not self.records[i].get('outputs'))
+        return to_run
+
+    def record(self, index: int, before: Dict[str, List[int]]):
+        """Records the files step index created or changed, given a snapshot taken before it ran."""
+        outputs = {}
+        for relpath, stat in snapshot(self.tool_dir).items():
+            if before.get(relpath) != stat:
+                path = os.path.join(self.tool_dir, *relpath.split('/'))
+                outputs[relpath] = {"size": stat[0], "mtime_ns": stat[1], "sha256": hash_file(path)}
+        # Outputs recorded earlier by a skipped step stay valid
+        previous = self.records[index]
+        if previous and previous.get('fingerprint') == self.fingerprints[index] and not outputs:
+            outputs = previous.get('outputs', {})
+        self.records[index] = {"fingerprint": self.fingerprints[index], "outputs": outputs}
+
+    def refresh_stats(self):
+        """Updates the recorded size/mtime of outputs (e.g. after they became store links)."""
+        for record in self.records:
+            if not record:
+                continue
+            for relpath, entry in record.get('outputs', {}).items():
+                try:
+                    st = os.stat(os.path.join(self.tool_dir, *relpath.split('/')))
+                    entry['size'], entry['mtime_ns'] = st.st_size, st.st_mtime_ns
+                except OSError:
+                    pass
+
+    def save(self):
+        """Saves the records of the leading steps that completed."""
+        completed = []
+        for record in self.records:
+            if record is None:
+                break
+            completed.append(record)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"tool": self.tool_name, "steps": completed}, f, indent=2)
+        os.replace(tmp_path, self.path)
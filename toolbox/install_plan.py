@@ -0,0 +1,92 @@
+"""
+Install planner that batches RPM installs of several tools.
+
+Most RPM-based tools install with a step like `dnf install -y {download_dir}/*.rpm`.
+Run per tool, every such step reloads repo metadata and the rpmdb and runs
+its own transaction. The planner splits each tool's install steps around
+that step, so that:
+
+1. steps before it (e.g. copying a .repo file) run per tool,
+2. the RPMs of all tools are installed in one transaction, with packages
+   shared by several tools passed once,
+3. steps after it (systemctl, usermod, ...) run per tool.
+"""
+
+import os
+import re
+import glob
+import shlex
+from typing import Any, Dict, List, Optional
+
+# Matches `dnf|yum install [-y] {download_dir}/*.rpm` with or without quotes around the placeholder
+RPM_INSTALL_STEP = re.compile(
+    r'^\s*(?P<pm>dnf|yum)\s+(?:-y\s+)?install\s+(?:-y\s+)?"?\{download_dir\}"?/\*\.rpm\s*$')
+
+
+def find_rpm_install_step(steps: List[Dict[str, Any]]) -> Optional[int]:
+    """Returns the index of the batchable RPM install step, or None."""
+    for index, step in enumerate(steps):
+        if step.get('type', 'shell') == 'shell' and RPM_INSTALL_STEP.match(step.get('command', '')):
+            return index
+    return None
+
+
+class ToolInstall:
+    """One tool's share of a batched install."""
+
+    def __init__(self, tool: Dict[str, Any], download_dir: str, rpm_step: Optional[int]):
+        self.tool = tool
+        self.name = tool['name']
+        self.download_dir = download_dir
+        steps = tool.get('install_steps', [])
+        if rpm_step is None:
+            self.pre_steps, self.post_steps = steps, []
+        else:
+            self.pre_steps, self.post_steps = steps[:rpm_step], steps[rpm_step + 1:]
+        self.batched = rpm_step is not None
+        self.package_manager = None
+        if self.batched:
+            self.package_manager = RPM_INSTALL_STEP.match(steps[rpm_step]['command']).group('pm')
+
+    def rpm_files(self) -> List[str]:
+        return sorted(glob.glob(os.path.join(self.download_dir, '*.rpm')))
+
+
+class InstallPlan:
+    """Splits the install of several tools into per-tool steps and one shared RPM transaction."""
+
+    def __init__(self, tools: List[Dict[str, Any]], downloads_dir: str):
+        self.installs = []
+        for tool in tools:
+            steps = tool.get('install_steps', [])
+            # Splitting a step graph at one step could break its "after" references
+            rpm_step = None if any('after' in step for step in steps) else find_rpm_install_step(steps)
+            self.installs.append(ToolInstall(tool, os.path.join(downloads_dir, tool['name']), rpm_step))
+
+    @property
+    def batched(self) -> List[ToolInstall]:
+        return [install for install in self.installs if install.batched]
+
+    def package_set(self, installs: List[ToolInstall]) -> List[str]:
+        """
+        RPM files of the given tools with duplicates removed. Packages are the
+        same when their file names (name-version-release.arch) match.
+        """
+        packages = {}
+        for install in installs:
+            for path in install.rpm_files():
+                packages.setdefault(os.path.basename(path), path)
+        return [packages[name] for name in sorted(packages)]
+
+    def _missing_globs(self, installs: List[ToolInstall]) -> List[str]:
+        # Tools without RPMs on disk (e.g. in simulation) keep their original glob
+        return [shlex.quote(install.download_dir) + "/*.rpm" for install in installs if not install.rpm_files()]
+
+    def transaction_command(self, installs: List[ToolInstall]) -> Optional[str]:
+        """The single package manager command installing every RPM of the given tools."""
+        arguments = [shlex.quote(path) for path in self.package_set(installs)] + self._missing_globs(installs)
+        if not arguments:
+            return None
+        managers = {install.package_manager for install in installs}
+        package_manager = 'dnf' if 'dnf' in managers else 'yum'
+        return f"{package_manager} install -y " + " ".join(arguments)
@@ -0,0 +1,242 @@
+"""
+Mirror selection with latency probing, failover and persistent rankings.
+
+An artifact may be published on several mirrors. Before downloading, the
+mirrors are probed concurrently with a small Range request that measures the
+time to the first byte and the throughput; the fastest healthy mirror is
+tried first and the others are kept for failover. When a transfer fails, the
+next mirror continues from the partial file: a single stream from its end,
+a segmented download from each segment's recorded progress (see transfer).
+Bytes already received are therefore not fetched again, unless the next
+mirror doesn't support Range requests or reports a different size. After a
+checksum mismatch the next mirror starts over. Small files such as checksum
+files are read the same way (fetch).
+
+Probe and transfer results are kept in .relay/mirrors.json as moving
+averages per host. Later runs reuse fresh rankings without probing, and
+hosts that failed recently are tried last.
+"""
+
+import os
+import json
+import time
+import math
+import threading
+import urllib.error
+import urllib.parse
+import http.client
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from toolbox.http_client import ConnectionPool
+from toolbox.state import default_state_dir
+from toolbox.transfer import download_file, segmented_download, DEFAULT_RETRIES
+
+MIRRORS_FILENAME = 'mirrors.json'
+MIRRORS_VERSION = 1
+# Bytes fetched from each mirror to estimate its throughput
+PROBE_BYTES = 256 * 1024
+PROBE_TIMEOUT = 10
+PROBE_WORKERS = 8
+# Rankings younger than this are trusted without probing again
+RANKING_TTL = 3600
+# Weight of the newest sample in the moving averages
+SMOOTHING = 0.3
+# Seconds added to a host's score per failure within FAILURE_WINDOW
+FAILURE_PENALTY = 30
+FAILURE_WINDOW = 24 * 3600
+# Retries on one mirror before failing over to the next
+MIRROR_RETRIES = 1
+
+ProbeResult = namedtuple('ProbeResult', ['url', 'ok', 'latency', 'throughput', 'error'])
+
+
+def mirror_host(url: str) -> str:
+    """Rankings are kept per scheme, host and port."""
+    parts = urllib.parse.urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}"
+
+
+class MirrorRankings:
+    """Latency, throughput and failure history per mirror host, stored in .relay/mirrors.json."""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or os.path.join(default_state_dir(), MIRRORS_FILENAME)
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._hosts = self._load()
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') == MIRRORS_VERSION:
+                return data.get('hosts', {})
+        except (OSError, ValueError):
+            pass
+        return {}
+
+    def _update(self, url: str, **samples):
+        with self._lock:
+            record = self._hosts.setdefault(mirror_host(url), {})
+            for key, value in samples.items():
+                previous = record.get(key)
+                record[key] = value if previous is None else previous + SMOOTHING * (value - previous)
+            record['updated'] = time.time()
+            self._dirty = True
+
+    def record_probe(self, url: str, latency: float, throughput: float):
+        self._update(url, latency=latency, throughput=throughput)
+
+    def record_transfer(self, url: str, seconds: float, size: int):
+        if seconds > 0 and size:
+            self._update(url, throughput=size / seconds)
+
+    def record_failure(self, url: str):
+        with self._lock:
+            record = self._hosts.setdefault(mirror_host(url), {})
+            now = time.time()
+            record['failures'] = [t for t in record.get('failures', []) if now - t < FAILURE_WINDOW] + [now]
+            record['updated'] = now
+            self._dirty = True
+
+    def is_fresh(self, url: str) -> bool:
+        """True if the host was measured, or failed, within RANKING_TTL."""
+        with self._lock:
+            record = self._hosts.get(mirror_host(url), {})
+        measured = 'latency' in record or record.get('failures')
+        return bool(measured) and time.time() - record.get('updated', 0) < RANKING_TTL
+
+    def score(self, url: str) -> float:
+        """Estimated seconds to fetch PROBE_BYTES, plus a penalty per recent failure. Lower is better."""
+        with self._lock:
+            record = dict(self._hosts.get(mirror_host(url), {}))
+        now = time.time()
+        failures = sum(1 for t in record.get('failures', []) if now - t < FAILURE_WINDOW)
+        if 'latency' not in record:
+            return math.inf
+        throughput = record.get('throughput') or 1
+        return record['latency'] + PROBE_BYTES / throughput + FAILURE_PENALTY * failures
+
+    def order(self, urls: List[str]) -> List[str]:
+        """urls sorted best first; ties keep their listed order."""
+        return sorted(urls, key=self.score)
+
+    def save(self):
+        """Writes the rankings if anything changed. Failures are not fatal."""
+        with self._lock:
+            if not self._dirty:
+                return
+            try:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                tmp_path = f"{self.path}.{os.getpid()}.tmp"
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump({'version': MIRRORS_VERSION, 'hosts': self._hosts}, f, indent=1, sort_keys=True)
+                os.replace(tmp_path, self.path)
+                self._dirty = False
+            except OSError:
+                pass
+
+
+def probe_mirror(pool: ConnectionPool, url: str, headers: Optional[Dict[str, str]] = None) -> ProbeResult:
+    """Fetches the first PROBE_BYTES of url. Returns its time to first byte and throughput."""
+    request_headers = dict(headers or {})
+    request_headers['Range'] = f'bytes=0-{PROBE_BYTES - 1}'
+    start = time.perf_counter()
+    try:
+        with pool.get(url, headers=request_headers) as response:
+            latency = time.perf_counter() - start
+            received = 0
+            while received < PROBE_BYTES:
+                chunk = response.read(min(64 * 1024, PROBE_BYTES - received))
+                if not chunk:
+                    break
+                received += len(chunk)
+    except (urllib.error.URLError, http.client.HTTPException, OSError) as e:
+        return ProbeResult(url, False, None, None, str(e))
+    elapsed = time.perf_counter() - start - latency
+    throughput = received / elapsed if elapsed > 0 and received else 0.0
+    return ProbeResult(url, True, latency, throughput, None)
+
+
+class MirrorSelector:
+    """Ranks the mirrors of an artifact and downloads it with failover."""
+
+    def __init__(self, rankings: Optional[MirrorRankings] = None, pool: Optional[ConnectionPool] = None):
+        self.rankings = rankings or MirrorRankings()
+        self.pool = pool or ConnectionPool()
+        self._probe_pool = ConnectionPool(timeout=PROBE_TIMEOUT)
+
+    def rank(self, urls: List[str], headers: Optional[Dict[str, str]] = None) -> List[str]:
+        """
+        Returns urls best first. Mirrors without a fresh ranking are probed
+        concurrently; unreachable ones are moved to the end.
+        """
+        urls = list(dict.fromkeys(urls))
+        stale = [url for url in urls if not self.rankings.is_fresh(url)]
+        if len(urls) > 1 and stale:
+            with ThreadPoolExecutor(max_workers=min(PROBE_WORKERS, len(stale))) as pool:
+                results = list(pool.map(lambda url: probe_mirror(self._probe_pool, url, headers), stale))
+            for result in results:
+                if result.ok:
+                    self.rankings.record_probe(result.url, result.latency, result.throughput)
+                else:
+                    self.rankings.record_failure(result.url)
+            print("Mirror probes: " + ", ".join(
+                f"{mirror_host(r.url)} ({r.latency * 1000:.0f} ms, {r.throughput / 1024 / 1024:.1f} MB/s)"
+                if r.ok else f"{mirror_host(r.url)} (unreachable: {r.error})" for r in results))
+            self.rankings.save()
+        return self.rankings.order(urls)
+
+    def _fetch(self, url, dest_path, connections, sha256, progress, retries, headers) -> bool:
+        if connections > 1 or sha256:
+            return segmented_download(url, dest_path, connections=connections, pool=self.pool, progress=progress,
+                                      sha256=sha256, retries=retries, headers=headers)
+        return download_file(url, dest_path, pool=self.pool, progress=progress, retries=retries, headers=headers)
+
+    def fetch(self, urls: List[str], headers: Optional[Dict[str, str]] = None) -> bytes:
+        """
+        Reads a small file published at urls (e.g. a checksum file) from the
+        best mirror, failing over to the next one on errors. Raises the last
+        error if every mirror failed.
+        """
+        ordered = self.rank(urls, headers)
+        for position, url in enumerate(ordered):
+            if position:
+                print(f"Failing over to mirror {position + 1}/{len(ordered)}: {url}")
+            try:
+                with self.pool.get(url, headers=headers) as response:
+                    data = response.read()
+            except (urllib.error.URLError, http.client.HTTPException, OSError) as e:
+                self.rankings.record_failure(url)
+                error = e
+                continue
+            self.rankings.save()
+            return data
+        self.rankings.save()
+        raise error
+
+    def download(self, urls: List[str], dest_path: str, connections: int = 1, sha256: Optional[str] = None,
+                 progress: bool = True, headers: Optional[Dict[str, str]] = None) -> bool:
+        """
+        Downloads the file published at urls to dest_path from the best mirror,
+        failing over to the next one on errors or a checksum mismatch.
+        Returns True on success, False if every mirror failed.
+        """
+        ordered = self.rank(urls, headers)
+        if len(ordered) == 1:
+            return self._fetch(ordered[0], dest_path, connections, sha256, progress, DEFAULT_RETRIES, headers)
+
+        for position, url in enumerate(ordered):
+            if position:
+                print(f"Failing over to mirror {position + 1}/{len(ordered)}: {url}")
+            start = time.perf_counter()
+            if self._fetch(url, dest_path, connections, sha256, progress, MIRROR_RETRIES, headers):
+                self.rankings.record_transfer(url, time.perf_counter() - start, os.path.getsize(dest_path))
+                self.rankings.save()
+                return True
+            self.rankings.record_failure(url)
+        self.rankings.save()
+        print(f"All {len(ordered)} mirrors failed for {os.path.basename(dest_path)}.")
+        return False
@@ -0,0 +1,238 @@
+"""
+Unified RPM download resolution across tools.
+
+Most RPM-based tools download with a step like
+`dnf install -y --downloadonly --downloaddir={download_dir} pkg...`. Run per
+tool, every such step refreshes metadata, solves dependencies on its own and
+downloads shared dependencies again. The resolver instead:
+
+1. collects the requested packages of every selected tool,
+2. runs one solve and one parallel download into a shared package pool
+   (.relay/rpm-pool; packages already in the pool are not downloaded again),
+3. computes each tool's dependency closure locally from the pool's RPM
+   headers (`rpm -qp`) and copies exactly those packages into the tool's
+   download directory (reflinks where possible; the artifact store
+   deduplicates them when the download finishes).
+
+Download time and bandwidth then scale with the number of unique packages
+instead of the number of tools.
+"""
+
+import os
+import shlex
+import threading
+import subprocess
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from toolbox.state import default_state_dir
+from toolbox.store import hash_file, copy_file
+
+POOL_DIRNAME = 'rpm-pool'
+MAX_PARALLEL_DOWNLOADS = 10
+QUERY_WORKERS = 8
+# One header line, then one tagged line per provide, require and file
+QUERY_FORMAT = ('%{NAME}\\t%{ARCH}\\t%{EPOCH}\\t%{VERSION}\\t%{RELEASE}\\t%{BUILDTIME}\\n'
+                '[P\\t%{PROVIDENAME}\\n][R\\t%{REQUIRENAME}\\n][F\\t%{FILENAMES}\\n]')
+# Options a download step may use and still be resolved together with others
+BATCHABLE_OPTIONS = ('-y', '--assumeyes', '--downloadonly')
+
+PoolPackage = namedtuple('PoolPackage', ['path', 'name', 'arch', 'epoch', 'version', 'release', 'buildtime',
+                                         'provides', 'requires', 'files'])
+
+
+def versioned_names(package: PoolPackage) -> Set[str]:
+    """
+    The spellings dnf accepts for this exact build: name-version,
+    name-version-release and name-epoch:version-release, each also with .arch.
+    """
+    name, epoch, version, release = package.name, package.epoch, package.version, package.release
+    forms = {f"{name}-{version}", f"{name}-{version}-{release}", f"{name}-{epoch}:{version}-{release}"}
+    return forms | {f"{form}.{package.arch}" for form in forms}
+
+
+class DownloadRequest:
+    """The packages one tool's downloadonly step asks for."""
+
+    def __init__(self, step_index: int, package_manager: str, packages: List[str]):
+        self.step_index = step_index
+        self.package_manager = package_manager
+        self.packages = packages
+
+
+def parse_downloadonly_step(step: Dict[str, Any]) -> Optional[DownloadRequest]:
+    """
+    Parses a `dnf|yum install --downloadonly --downloaddir={download_dir} pkg...`
+    shell step. Returns None if the step does anything else.
+    """
+    if step.get('type', 'shell') != 'shell':
+        return None
+    try:
+        tokens = shlex.split(step.get('command', ''))
+    except ValueError:
+        return None
+    if len(tokens) < 3 or tokens[0] not in ('dnf', 'yum') or tokens[1] != 'install':
+        return None
+    packages, has_downloadonly, has_downloaddir = [], False, False
+    for token in tokens[2:]:
+        if token == '--downloadonly':
+            has_downloadonly = True
+        elif token == '--downloaddir={download_dir}':
+            has_downloaddir = True
+        elif token.startswith('-'):
+            if token not in BATCHABLE_OPTIONS:
+                return None
+        else:
+            packages.append(token)
+    if not (has_downloadonly and has_downloaddir and packages):
+        return None
+    return DownloadRequest(-1, tokens[0], packages)
+
+
+def find_download_request(steps: List[Dict[str, Any]]) -> Optional[DownloadRequest]:
+    """Returns the first resolvable downloadonly step of a tool, or None."""
+    for index, step in enumerate(steps):
+        request = parse_downloadonly_step(step)
+        if request:
+            request.step_index = index
+            return request
+    return None
+
+
+def _query_package(path: str) -> Optional[PoolPackage]:
+    try:
+        result = subprocess.run(['rpm', '-qp', '--nosignature', '--nodigest', '--qf', QUERY_FORMAT, path],
+                                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True, check=True)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    lines = result.stdout.splitlines()
+    if not lines:
+        return None
+    name, arch, epoch, version, release, buildtime = lines[0].split('\t')
+    tagged = {'P': set(), 'R': set(), 'F': set()}
+    for line in lines[1:]:
+        tag, _, value = line.partition('\t')
+        if tag in tagged and value:
+            tagged[tag].add(value)
+    return PoolPackage(path, name, arch, int(epoch) if epoch.isdigit() else 0, version, release,
+                       int(buildtime) if buildtime.isdigit() else 0,
+                       tagged['P'], tagged['R'], tagged['F'])
+
+
+class RpmResolver:
+    """Downloads the RPMs of several tools in one transaction and splits them per tool."""
+
+    def __init__(self, pool_dir: Optional[str] = None):
+        self.pool_dir = pool_dir or os.path.join(default_state_dir(), POOL_DIRNAME)
+        self.packages: List[PoolPackage] = []
+        # Older builds kept because a request names them by version
+        self.pinned: List[PoolPackage] = []
+        self._providers: Dict[str, List[PoolPackage]] = {}
+        self._hashes: Dict[str, str] = {}
+        self._hash_lock = threading.Lock()
+
+    def download_command(self, requests: Iterable[DownloadRequest]) -> str:
+        """The single downloadonly command fetching every requested package into the pool."""
+        requests = list(requests)
+        package_manager = 'dnf' if any(r.package_manager == 'dnf' for r in requests) else 'yum'
+        packages = []
+        for request in requests:
+            packages.extend(p for p in request.packages if p not in packages)
+        return (f"{package_manager} install -y --downloadonly --downloaddir={shlex.quote(self.pool_dir)} "
+                f"--setopt=max_parallel_downloads={MAX_PARALLEL_DOWNLOADS} "
+                + " ".join(shlex.quote(p) for p in packages))
+
+    def index(self, requests: Iterable[DownloadRequest] = ()):
+        """
+        Reads the headers of every RPM in the pool. When the pool holds several
+        builds of the same name and arch, the newest is kept, and so is any
+        build that one of requests names by version (kubectl-1.29.0); other
+        builds are left over from previous runs and are removed.
+        """
+        wanted = {package for request in requests for package in request.packages}
+        paths = sorted(os.path.join(self.pool_dir, f) for f in os.listdir(self.pool_dir) if f.endswith('.rpm'))
+        with ThreadPoolExecutor(max_workers=QUERY_WORKERS) as pool:
+            packages = [p for p in pool.map(_query_package, paths) if p]
+
+        newest: Dict[tuple, PoolPackage] = {}
+        for package in packages:
+            key = (package.name, package.arch)
+            current = newest.get(key)
+            if current is None or (package.epoch, package.buildtime) > (current.epoch, current.buildtime):
+                newest[key] = package
+        self.packages = list(newest.values())
+        kept = {p.path for p in self.packages}
+        self.pinned = [p for p in packages if p.path not in kept and versioned_names(p) & wanted]
+        kept.update(p.path for p in self.pinned)
+        for package in packages:
+            if package.path not in kept:
+                self._discard(package)
+
+        self._providers = {}
+        for package in self.packages:
+            for capability in {package.name} | package.provides | package.files:
+                self._providers.setdefault(capability, []).append(package)
+
+    @staticmethod
+    def _discard(package: PoolPackage):
+        try:
+            os.remove(package.path)
+        except OSError:
+            pass
+
+    def closure(self, request: DownloadRequest) -> List[str]:
+        """
+        Paths of the pool packages a tool needs: the requested packages and,
+        recursively, whatever in the pool satisfies their requirements.
+        Requirements not in the pool were satisfied by the system when the
+        pool was filled and are skipped, just like a per-tool download would.
+        """
+        selected: Set[str] = set()
+        queue = []
+        for wanted in request.packages:
+            for package in self._match(wanted):
+                queue.append(package)
+        while queue:
+            package = queue.pop()
+            if package.path in selected:
+                continue
+            selected.add(package.path)
+            for requirement in package.requires:
+                queue.extend(p for p in self._providers.get(requirement, []) if p.path not in selected)
+        return sorted(selected)
+
+    def _match(self, wanted: str) -> List[PoolPackage]:
+        if wanted in self._providers:
+            return self._providers[wanted]
+        # Versioned requests such as kubectl-1.29.0 name one exact build
+        return [p for p in self.packages + self.pinned if wanted in versioned_names(p)]
+
+    def _hash(self, path: str) -> str:
+        with self._hash_lock:
+            sha256 = self._hashes.get(path)
+        if sha256 is None:
+            sha256 = hash_file(path)
+            with self._hash_lock:
+                self._hashes[path] = sha256
+        return sha256
+
+    def copy_closure(self, request: DownloadRequest, dest_dir: str, store) -> List[str]:
+        """
+        Copies a tool's closure from the pool into dest_dir, and removes RPMs
+        of earlier runs that are no longer part of it. Pool files are written
+        by dnf, so they are never linked into the store; the copies' hashes
+        are remembered for when the tool's files are stored. Returns the
+        copied file names.
+        """
+        os.makedirs(dest_dir, exist_ok=True)
+        names = []
+        for path in self.closure(request):
+            name = os.path.basename(path)
+            copy_file(path, os.path.join(dest_dir, name))
+            store.remember(os.path.join(dest_dir, name), self._hash(path))
+            names.append(name)
+        for name in os.listdir(dest_dir):
+            if name.endswith('.rpm') and name not in names:
+                os.remove(os.path.join(dest_dir, name))
+        return names
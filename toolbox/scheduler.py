@@ -0,0 +1,217 @@
+"""
+Concurrent scheduler for per-tool work (downloads, installs).
+
+Tools run on a bounded pool of worker threads. Steps that touch shared
+system state (package manager metadata, repo definitions, systemd) are serialized
+through named resource locks, and each tool's console output is buffered
+and printed as one block when the tool finishes.
+"""
+
+import re
+import sys
+import time
+import tempfile
+import contextvars
+import threading
+from contextlib import contextmanager
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, Any
+
+from colorama import Fore, Style
+
+DEFAULT_WORKERS = 4
+
+# Commands matching one of these patterns must hold the named lock while they run.
+# dnf/yum/rpm share a metadata cache and the rpmdb, and repo files in
+# /etc/yum.repos.d are read by every dnf invocation.
+# systemctl calls and unit file changes race on daemon-reload.
+RESOURCE_LOCK_PATTERNS = {
+    'pkg-manager': re.compile(r'(^|[\s;&|(])(dnf|yum|rpm)\s|/etc/yum\.repos\.d'),
+    'systemd': re.compile(r'(^|[\s;&|(])systemctl\s|/etc/systemd/'),
+}
+
+# Buffered tool output stays in memory up to this size, then spills to disk
+OUTPUT_SPOOL_MAX_SIZE = 1024 * 1024
+
+ToolResult = namedtuple('ToolResult', ['name', 'success', 'duration'])
+
+
+def locks_for_command(command: str) -> List[str]:
+    """Returns the sorted names of the resource locks a shell command needs."""
+    return sorted(name for name, pattern in RESOURCE_LOCK_PATTERNS.items()
+                  if pattern.search(command))
+
+
+class ResourceLocks:
+    """A set of named locks shared by all workers of a scheduler run."""
+
+    def __init__(self):
+        # Reentrant, so a step holding a lock can run commands needing the same lock
+        self._locks = {name: threading.RLock() for name in RESOURCE_LOCK_PATTERNS}
+        self._create_lock = threading.Lock()
+
+    def _lock(self, name: str):
+        with self._create_lock:
+            return self._locks.setdefault(name, threading.RLock())
+
+    @contextmanager
+    def hold(self, command: str = "", names: Iterable[str] = ()):
+        """Holds every lock the command needs, plus the named ones, for the duration of the block."""
+        names = sorted(set(locks_for_command(command)) | set(names))
+        # Always acquire in sorted order so two commands can never deadlock
+        locks = [self._lock(name) for name in names]
+        for lock in locks:
+            lock.acquire()
+        try:
+            yield
+        finally:
+            for lock in reversed(locks):
+                lock.release()
+
+
+class _GroupedOutput:
+    """
+    Stand-in for sys.stdout/sys.stderr that diverts writes from threads
+    inside grouped_output() into a per-thread buffer. Writes from other
+    threads go straight to the real stream.
+    """
+
+    def __init__(self, stream, local):
+        self._stream = stream
+        self._local = local
+
+    def write(self, text):
+        buffer = getattr(self._local, 'buffer', None)
+        if buffer is None:
+            return self._stream.write(text)
+        return buffer.write(text)
+
+    def flush(self):
+        if getattr(self._local, 'buffer', None) is None:
+            self._stream.flush()
+
+    def isatty(self):
+        # Buffered output is replayed later, so don't pretend to be a terminal
+        return getattr(self._local, 'buffer', None) is None and self._stream.isatty()
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+
+_output_local = threading.local()
+_redirect_lock = threading.Lock()
+_redirect_users = 0
+_real_streams = None
+
+
+def _install_redirect():
+    global _redirect_users, _real_streams
+    with _redirect_lock:
+        if _redirect_users == 0:
+            _real_streams = (sys.stdout, sys.stderr)
+            sys.stdout = _GroupedOutput(sys.stdout, _output_local)
+            sys.stderr = _GroupedOutput(sys.stderr, _output_local)
+        _redirect_users += 1
+
+
+def _remove_redirect():
+    global _redirect_users, _real_streams
+    with _redirect_lock:
+        _redirect_users -= 1
+        if _redirect_users == 0:
+            sys.stdout, sys.stderr = _real_streams
+            _real_streams = None
+
+
+@contextmanager
+def grouped_output():
+    """
+    Diverts everything the current thread prints into a buffer, which is
+    yielded. Nests: output of an inner block doesn't reach the outer buffer
+    until the caller replays it with replay_output().
+    """
+    _install_redirect()
+    previous = getattr(_output_local, 'buffer', None)
+    buffer = tempfile.SpooledTemporaryFile(max_size=OUTPUT_SPOOL_MAX_SIZE, mode='w+', encoding='utf-8')
+    _output_local.buffer = buffer
+    try:
+        yield buffer
+    finally:
+        _output_local.buffer = previous
+        _remove_redirect()
+
+
+def replay_output(buffer, header: str = ""):
+    """Writes a buffer filled by grouped_output() to sys.stdout and closes it."""
+    if header:
+        sys.stdout.write(header)
+    buffer.seek(0)
+    while True:
+        chunk = buffer.read(64 * 1024)
+        if not chunk:
+            break
+        sys.stdout.write(chunk)
+    sys.stdout.flush()
+    buffer.close()
+
+
+class ToolScheduler:
+    """Runs a function over a list of tools with a bounded number of workers."""
+
+    def __init__(self, workers: int = DEFAULT_WORKERS):
+        self.workers = max(1, int(workers))
+        self._print_lock = threading.Lock()
+
+    def run(self, tools: Iterable[Dict[str, Any]], func: Callable[[Dict[str, Any]], bool],
+            summary: bool = True) -> List[ToolResult]:
+        """
+        Calls func(tool) for every tool and returns a ToolResult per tool, in input order.
+        With more than one worker, each tool's output is printed as one block.
+        """
+        tools = list(tools)
+        if self.workers == 1 or len(tools) <= 1:
+            results = [self._run_one(tool, func, grouped=False) for tool in tools]
+        else:
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                # Each tool gets a copy of the caller's context, so trace spans nest under the run
+                futures = [pool.submit(contextvars.copy_context().run, self._run_one, tool, func, True)
+                           for tool in tools]
+                results = [future.result() for future in futures]
+
+        if summary:
+            self.print_summary(results)
+        return results
+
+    def _run_one(self, tool, func, grouped):
+        if not grouped:
+            return self._call(tool, func)
+        with grouped_output() as buffer:
+            result = self._call(tool, func)
+        # Print a finished tool's buffered output as one uninterrupted block
+        with self._print_lock:
+            replay_output(buffer, f"\n{Fore.MAGENTA}===== {tool['name']} ====={Style.RESET_ALL}\n")
+        return result
+
+    @staticmethod
+    def _call(tool, func):
+        start = time.monotonic()
+        try:
+            success = bool(func(tool))
+        except Exception as e:
+            print(f"{Fore.RED}AN UNEXPECTED ERROR OCCURRED in {tool['name']}: {e}{Style.RESET_ALL}")
+            success = False
+        return ToolResult(tool['name'], success, time.monotonic() - start)
+
+    @staticmethod
+    def print_summary(results: List[ToolResult]):
+        """Prints per-tool wall time and status."""
+        if not results:
+            return
+        print(f"\n{Fore.CYAN}Summary{Style.RESET_ALL}")
+        print("---------------------------")
+        for result in results:
+            status = f"{Fore.GREEN}OK{Style.RESET_ALL}" if result.success else f"{Fore.RED}FAILED{Style.RESET_ALL}"
+            print(f"{result.name:<25} {result.duration:>8.1f}s  {status}")
+        failed = sum(1 for r in results if not r.success)
+        print(f"{len(results) - failed} succeeded, {failed} failed.")
@@ -0,0 +1,97 @@
+"""
+Persistent state shared between Relay sessions.
+
+Stores the results of installed-tool detection and of download directory
+scans in .relay/state.json, each next to a cheap fingerprint of what the
+result depends on (file mtimes and inodes). A later session reuses an entry
+as long as its fingerprint still matches, and only re-probes what changed.
+"""
+
+import os
+import json
+import time
+import threading
+from typing import Any, Dict, Iterable, Optional
+
+STATE_DIRNAME = '.relay'
+STATE_FILENAME = 'state.json'
+STATE_VERSION = 1
+
+
+def default_state_dir() -> str:
+    """Directory for host-local Relay state (cache, state database)."""
+    return os.path.join(os.getcwd(), STATE_DIRNAME)
+
+
+def stat_fingerprint(paths: Iterable[str]) -> str:
+    """
+    Fingerprint of a set of paths built from their mtime, inode and size.
+    Missing paths are part of the fingerprint too, so they can appear later.
+    """
+    parts = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+            parts.append(f"{path}:{st.st_mtime_ns}:{st.st_ino}:{st.st_size}")
+        except OSError:
+            parts.append(f"{path}:-")
+    return "|".join(parts)
+
+
+class StateDB:
+    """Small JSON-backed key/value store with one section per kind of record."""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or os.path.join(default_state_dir(), STATE_FILENAME)
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._data = self._load()
+
+    def _load(self) -> Dict[str, Any]:
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') == STATE_VERSION:
+                return data
+        except (OSError, ValueError):
+            pass
+        return {'version': STATE_VERSION, 'detection': {}, 'downloads': {}}
+
+    def get(self, section: str, key: str, fingerprint: str, max_age: Optional[float] = None) -> Optional[Dict]:
+        """
+        Returns the record stored under section/key if it was stored with the
+        same fingerprint (and, with max_age, no more than max_age seconds ago).
+        """
+        with self._lock:
+            record = self._data.setdefault(section, {}).get(key)
+        if not record or record.get('fingerprint') != fingerprint:
+            return None
+        if max_age is not None and time.time() - record.get('updated', 0) > max_age:
+            return None
+        return record
+
+    def put(self, section: str, key: str, fingerprint: str, **values):
+        with self._lock:
+            record = dict(values, fingerprint=fingerprint, updated=time.time())
+            self._data.setdefault(section, {})[key] = record
+            self._dirty = True
+
+    def invalidate(self, section: str, key: str):
+        with self._lock:
+            if self._data.setdefault(section, {}).pop(key, None) is not None:
+                self._dirty = True
+
+    def save(self):
+        """Writes the database if anything changed. Failures are not fatal."""
+        with self._lock:
+            if not self._dirty:
+                return
+            try:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                tmp_path = self.path + '.tmp'
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(self._data, f, indent=1, sort_keys=True)
+                os.replace(tmp_path, self.path)
+                self._dirty = False
+            except OSError:
+                pass
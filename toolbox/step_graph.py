@@ -0,0 +1,145 @@
+"""
+Dependency-aware execution of a tool's steps.
+
+Steps may declare:
+
+    "id": "unit"                   name other steps refer to
+    "after": ["user", "dirs"]      ids of the steps that must finish first
+    "locks": ["systemd"]           named resource locks held while the step runs
+
+A step without "after" runs after the step before it, so a list without any
+"after" fields runs strictly in order, exactly as before. Steps whose
+dependencies are met run concurrently, up to a number of workers, and each
+step's output is printed as one block when it finishes. After the first
+failure no new steps are started.
+
+Shell commands additionally take the locks their command needs (see
+scheduler.RESOURCE_LOCK_PATTERNS), whether or not the step declares any.
+"""
+
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Any, Callable, Dict, Iterable, List, Set
+
+from colorama import Fore, Style
+
+from toolbox.scheduler import ResourceLocks, grouped_output, replay_output
+
+DEFAULT_STEP_WORKERS = 4
+
+
+class StepGraphError(ValueError):
+    """Raised for unknown or duplicate step ids and dependency cycles."""
+
+
+def step_label(steps: List[Dict[str, Any]], index: int) -> str:
+    return steps[index].get('id', f"step {index + 1}")
+
+
+def build_graph(steps: List[Dict[str, Any]], indices: Iterable[int]) -> Dict[int, Set[int]]:
+    """
+    Returns {step index: indices of the steps it waits for} for the given
+    steps. Dependencies outside indices count as already done.
+    """
+    indices = list(indices)
+    ids = {}
+    for index, step in enumerate(steps):
+        if 'id' in step:
+            if step['id'] in ids:
+                raise StepGraphError(f"duplicate step id '{step['id']}'")
+            ids[step['id']] = index
+
+    graph = {}
+    selected = set(indices)
+    for index in indices:
+        after = steps[index].get('after')
+        if after is None:
+            depends = {index - 1} if index > 0 else set()
+        else:
+            if isinstance(after, str):
+                after = [after]
+            unknown = [name for name in after if name not in ids]
+            if unknown:
+                raise StepGraphError(f"{step_label(steps, index)} waits for unknown step(s): {', '.join(unknown)}")
+            depends = {ids[name] for name in after}
+        graph[index] = depends & selected
+
+    # Kahn's algorithm: anything left unsorted is part of a cycle
+    remaining = {index: set(depends) for index, depends in graph.items()}
+    while True:
+        ready = [index for index, depends in remaining.items() if not depends]
+        if not ready:
+            break
+        for index in ready:
+            del remaining[index]
+        for depends in remaining.values():
+            depends.difference_update(ready)
+    if remaining:
+        labels = ", ".join(step_label(steps, index) for index in sorted(remaining))
+        raise StepGraphError(f"dependency cycle between {labels}")
+    return graph
+
+
+def is_sequential(graph: Dict[int, Set[int]]) -> bool:
+    """True if every step only waits for the one before it."""
+    order = sorted(graph)
+    return all(graph[index] <= {previous} for previous, index in zip([None] + order, order))
+
+
+def run_step_graph(steps: List[Dict[str, Any]], indices: Iterable[int], ctx,
+                   runner: Callable[[Dict[str, Any], Any], bool],
+                   workers: int = DEFAULT_STEP_WORKERS) -> bool:
+    """
+    Runs steps[i] for every i in indices with runner(step, ctx), honouring
+    their "after" dependencies and "locks". Returns True if all succeeded.
+    """
+    try:
+        graph = build_graph(steps, indices)
+    except StepGraphError as e:
+        print(f"{Fore.RED}ERROR: Invalid step dependencies: {e}{Style.RESET_ALL}")
+        return False
+    locks = ctx.locks if ctx.locks is not None else ResourceLocks()
+
+    def run(index: int) -> bool:
+        with locks.hold(names=steps[index].get('locks', ())):
+            return runner(steps[index], ctx)
+
+    if workers <= 1 or is_sequential(graph):
+        for index in sorted(graph):
+            if not run(index):
+                return False
+        return True
+
+    def run_grouped(index: int):
+        with grouped_output() as buffer:
+            try:
+                success = run(index)
+            except Exception as e:
+                print(f"{Fore.RED}AN UNEXPECTED ERROR OCCURRED in {step_label(steps, index)}: {e}{Style.RESET_ALL}")
+                success = False
+        return success, buffer
+
+    done: Set[int] = set()
+    pending = dict(graph)
+    running = {}
+    failed = False
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while True:
+            if not failed:
+                for index in sorted(pending):
+                    if pending[index] <= done:
+                        del pending[index]
+                        # Steps run in worker threads but nest under the caller's trace span
+                        running[pool.submit(contextvars.copy_context().run, run_grouped, index)] = index
+            if not running:
+                break
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                index = running.pop(future)
+                success, buffer = future.result()
+                replay_output(buffer)
+                if success:
+                    done.add(index)
+                else:
+                    failed = True
+    return not failed
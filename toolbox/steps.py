@@ -0,0 +1,504 @@
+"""
+Execution of download/install steps defined in tools/*.json.
+
+Each step is a dict with a "type". "shell" steps run a command through the
+shell; other types are handled natively in Python, without forking a shell
+and the usual tar/cp/cat helpers.
+"""
+
+import os
+import re
+import shutil
+import tarfile
+import tempfile
+import contextlib
+import subprocess
+import http.client
+import urllib.error
+from typing import Any, Callable, Dict, List, Optional
+
+from colorama import Fore, Style
+
+from toolbox import trace
+from toolbox.utils import execute_command
+from toolbox.transfer import download_file, segmented_download
+from toolbox.mirrors import MirrorSelector
+
+
+class StepContext:
+    """
+    Everything a step needs besides its own definition: placeholder values
+    (e.g. download_dir), the console description, simulation mode, the
+    scheduler's resource locks, the artifact store and the mirror selector.
+    """
+
+    def __init__(self, placeholders: Dict[str, str], description: str = "", simulate: bool = False,
+                 locks=None, store=None, mirrors=None):
+        self.placeholders = placeholders
+        self.description = description
+        self.simulate = simulate
+        self.locks = locks
+        self.store = store
+        self.mirrors = mirrors
+
+    def substitute(self, text: str) -> str:
+        """Replaces {placeholder} markers with their values."""
+        return substitute(text, self.placeholders)
+
+
+def substitute(text: str, placeholders: Dict[str, str]) -> str:
+    """Replaces {placeholder} markers (e.g. {download_dir}) with values from placeholders."""
+    for key, value in placeholders.items():
+        text = text.replace("{" + key + "}", value)
+    return text
+
+
+def _print_header(ctx: StepContext, line: str):
+    if ctx.description:
+        print(f"{Fore.BLUE}Executing: {ctx.description}{Style.RESET_ALL}")
+    print(f"{Fore.CYAN}{line}{Style.RESET_ALL}")
+
+
+def _run_shell(step, ctx):
+    cmd = step.get('command')
+    if not cmd:
+        return True
+    cmd = ctx.substitute(cmd)
+    if ctx.locks is None:
+        return execute_command(cmd, description=ctx.description, simulate=ctx.simulate)
+    # Steps touching shared package manager state run one at a time across tools
+    with ctx.locks.hold(cmd):
+        return execute_command(cmd, description=ctx.description, simulate=ctx.simulate)
+
+
+def _fetch_checksum(urls: List[str], filename: str, mirrors: MirrorSelector) -> Optional[str]:
+    """
+    Reads the sha256 of filename from a checksum file published at urls (the
+    fastest mirror first), in sha256sum format or holding a single hash.
+    Returns None if it can't be read.
+    """
+    try:
+        text = mirrors.fetch(urls).decode('utf-8', 'replace')
+    except (urllib.error.URLError, http.client.HTTPException, OSError) as e:
+        print(f"{Fore.RED}ERROR: Fetching checksum {urls[0]} failed: {e}{Style.RESET_ALL}")
+        return None
+    entries = [line.split() for line in text.splitlines() if re.match(r'[0-9a-fA-F]{64}\b', line)]
+    for entry in entries:
+        if (len(entry) == 1 and len(entries) == 1) or entry[-1].lstrip('*') == filename:
+            return entry[0].lower()
+    print(f"{Fore.RED}ERROR: No sha256 for {filename} in {urls[0]}{Style.RESET_ALL}")
+    return None
+
+
+def _run_http_get(step, ctx):
+    """
+    Downloads step["url"] to step["dest"]. With "connections" > 1 the file is
+    fetched as parallel byte ranges; "sha256" verifies the result and lets an
+    artifact already in the store be linked instead of downloaded again.
+    "sha256_url" names a checksum file to take the sha256 from instead, for
+    artifacts whose version (and so checksum) isn't fixed; a list names
+    mirrors of it. "urls" lists mirrors of the same file: the fastest is used
+    and the others take over if it fails.
+    """
+    urls = [ctx.substitute(url) for url in step.get('urls') or [step['url']]]
+    url = urls[0]
+    dest = ctx.substitute(step['dest'])
+    connections = int(step.get('connections', 1))
+    sha256 = step.get('sha256')
+    mirrors_note = f" (+{len(urls) - 1} mirror(s))" if len(urls) > 1 else ""
+    _print_header(ctx, f"GET {url}{mirrors_note} -> {dest}")
+    if ctx.simulate:
+        print(f"{Fore.YELLOW}[SIMULATION] Skipping actual download.{Style.RESET_ALL}")
+        return True
+
+    mirrors = ctx.mirrors
+    if mirrors is None and (len(urls) > 1 or step.get('sha256_url')):
+        mirrors = MirrorSelector()
+    if not sha256 and step.get('sha256_url'):
+        checksum_urls = step['sha256_url']
+        checksum_urls = [checksum_urls] if isinstance(checksum_urls, str) else checksum_urls
+        sha256 = _fetch_checksum([ctx.substitute(u) for u in checksum_urls], os.path.basename(dest), mirrors)
+        if not sha256:
+            return False
+    if sha256 and ctx.store is not None and ctx.store.link_object(sha256, dest, private=True):
+        print(f"{Fore.GREEN}Already in artifact store ({sha256[:12]}), copied to {dest}.{Style.RESET_ALL}")
+        return True
+
+    os.makedirs(os.path.dirname(dest) or '.', exist_ok=True)
+    if len(urls) > 1:
+        ok = mirrors.download(urls, dest, connections=connections, sha256=sha256)
+    elif connections > 1 or sha256:
+        ok = segmented_download(url, dest, connections=connections, sha256=sha256)
+    else:
+        ok = download_file(url, dest)
+    if ok and sha256 and ctx.store is not None:
+        # Verified already; stored with the rest of the tool's files once the download finishes
+        ctx.store.remember(dest, sha256)
+    return ok
+
+
+SYSTEMD_UNIT_DIR = '/etc/systemd/system'
+EXTRACT_CHUNK_SIZE = 1024 * 1024
+
+
+def _parse_mode(mode) -> Optional[int]:
+    """Accepts modes as octal strings ("0755") or integers."""
+    if mode is None:
+        return None
+    return int(mode, 8) if isinstance(mode, str) else int(mode)
+
+
+def _apply_attributes(path: str, mode: Optional[int] = None, owner: Optional[str] = None):
+    """Sets mode and "user[:group]" ownership of path."""
+    if mode is not None:
+        os.chmod(path, mode)
+    if owner:
+        user, _, group = owner.partition(':')
+        shutil.chown(path, user=user or None, group=group or None)
+
+
+def _atomic_write(dest: str, write: Callable[[Any], None], mode: Optional[int] = None,
+                  owner: Optional[str] = None):
+    """
+    Creates dest through a temporary file in the same directory, so readers
+    never see a partial file. write(f) fills the binary file object f.
+    """
+    dest_dir = os.path.dirname(dest) or '.'
+    os.makedirs(dest_dir, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix='.relay-', dir=dest_dir)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            write(f)
+        _apply_attributes(tmp_path, mode if mode is not None else 0o644, owner)
+        os.replace(tmp_path, dest)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def _member_name(name: str) -> str:
+    name = name[2:] if name.startswith('./') else name
+    return name.rstrip('/')
+
+
+def _member_target(name: str, members, dest: Optional[str]) -> Optional[tuple]:
+    """
+    Maps an archive member to (member entry, destination path, root), or None
+    if it isn't wanted. A member entry whose path is a directory covers its
+    subtree. Nothing extracted for the member may end up outside root.
+    """
+    name = _member_name(name)
+    for member in members:
+        path = member['path'].rstrip('/')
+        if name == path:
+            return member, member['dest'], os.path.dirname(member['dest'])
+        if name.startswith(path + '/'):
+            return member, os.path.join(member['dest'], name[len(path) + 1:]), member['dest']
+    if members or dest is None:
+        return None
+    return None, os.path.join(dest, name), dest
+
+
+def _within(path: str, root: str) -> bool:
+    """True if path, with symlinks resolved, is root or below it."""
+    root = os.path.realpath(root)
+    return os.path.commonpath([os.path.realpath(path), root]) == root
+
+
+def _run_extract(step, ctx):
+    """
+    Streams step["archive"] (any tar compression) and writes the selected
+    "members" straight to their destinations with their modes and owners,
+    without staging the archive in a temporary directory. Without "members",
+    everything is extracted below step["dest"].
+
+    Symlinks must point inside what is being extracted, and nothing is
+    written through a symlink that leads elsewhere, so an archive can't
+    place files outside its destination. Hardlinks are recreated as copies
+    of the member they refer to.
+    """
+    archive = ctx.substitute(step['archive'])
+    dest = ctx.substitute(step['dest']) if 'dest' in step else None
+    members = [{**member, 'path': ctx.substitute(member['path']), 'dest': ctx.substitute(member['dest'])}
+               for member in step.get('members', [])]
+    if not members and dest is None:
+        raise KeyError('members')
+    _print_header(ctx, f"EXTRACT {archive} -> {dest or ', '.join(m['dest'] for m in members)}")
+    if ctx.simulate:
+        print(f"{Fore.YELLOW}[SIMULATION] Skipping actual extraction.{Style.RESET_ALL}")
+        return True
+
+    extracted = 0
+    found = set()
+    written = {}  # member name -> path of each file extracted, for hardlinks to it
+    try:
+        with tarfile.open(archive, 'r|*') as tar:
+            for info in tar:
+                if os.path.isabs(info.name) or '..' in info.name.split('/'):
+                    print(f"{Fore.YELLOW}Skipping unsafe archive member {info.name}{Style.RESET_ALL}")
+                    continue
+                target = _member_target(info.name, members, dest)
+                if target is None:
+                    continue
+                member, path, root = target
+                member = member or {}
+                found.add(member.get('path'))
+                owner = member.get('owner')
+                if not _within(path if info.isdir() else os.path.dirname(path), root):
+                    raise tarfile.ExtractError(f"{info.name} would be written outside {root} through a symlink")
+                if info.isdir():
+                    os.makedirs(path, exist_ok=True)
+                    _apply_attributes(path, None, owner)
+                elif info.isfile() or info.islnk():
+                    mode = _parse_mode(member.get('mode'))
+                    mode = mode if mode is not None else info.mode & 0o7777
+                    if info.isfile():
+                        source = tar.extractfile(info)
+                        _atomic_write(path, lambda f: shutil.copyfileobj(source, f, EXTRACT_CHUNK_SIZE),
+                                      mode, owner)
+                    else:
+                        linked = written.get(_member_name(info.linkname))
+                        if linked is None:
+                            raise tarfile.ExtractError(f"hardlink {info.name} refers to {info.linkname}, "
+                                                       f"which was not extracted")
+                        with open(linked, 'rb') as source:
+                            _atomic_write(path, lambda f: shutil.copyfileobj(source, f, EXTRACT_CHUNK_SIZE),
+                                          mode, owner)
+                    written[_member_name(info.name)] = path
+                    extracted += 1
+                elif info.issym():
+                    link_target = os.path.join(os.path.dirname(path), info.linkname)
+                    if os.path.isabs(info.linkname) or not _within(link_target, root):
+                        raise tarfile.ExtractError(f"symlink {info.name} -> {info.linkname} points outside {root}")
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    if os.path.lexists(path):
+                        os.remove(path)
+                    os.symlink(info.linkname, path)
+                else:
+                    raise tarfile.ExtractError(f"{info.name} is a device or fifo, which extract doesn't support")
+    except (OSError, tarfile.TarError) as e:
+        print(f"{Fore.RED}ERROR: Extracting {archive} failed: {e}{Style.RESET_ALL}")
+        return False
+
+    missing = [m['path'] for m in members if m['path'] not in found]
+    if missing:
+        print(f"{Fore.RED}ERROR: Not found in {archive}: {', '.join(missing)}{Style.RESET_ALL}")
+        return False
+    print(f"{Fore.GREEN}Extracted {extracted} file(s).{Style.RESET_ALL}")
+    return True
+
+
+def _run_copy(step, ctx):
+    """Copies step["src"] (a file or a directory tree) to step["dest"], with optional "mode" and "owner"."""
+    src = ctx.substitute(step['src'])
+    dest = ctx.substitute(step['dest'])
+    mode = _parse_mode(step.get('mode'))
+    owner = step.get('owner')
+    _print_header(ctx, f"COPY {src} -> {dest}")
+    if ctx.simulate:
+        print(f"{Fore.YELLOW}[SIMULATION] Skipping actual copy.{Style.RESET_ALL}")
+        return True
+
+    try:
+        if os.path.isdir(src):
+            # Like cp -r: copying into an existing directory nests the source
+            if os.path.isdir(dest):
+                dest = os.path.join(dest, os.path.basename(src.rstrip('/')))
+            shutil.copytree(src, dest, symlinks=True, dirs_exist_ok=True)
+            if owner or mode is not None:
+                for dirpath, dirnames, filenames in os.walk(dest):
+                    _apply_attributes(dirpath, None, owner)
+                    for filename in filenames:
+                        _apply_attributes(os.path.join(dirpath, filename), mode, owner)
+        else:
+            if os.path.isdir(dest):
+                dest = os.path.join(dest, os.path.basename(src))
+            with open(src, 'rb') as source:
+                _atomic_write(dest, lambda f: shutil.copyfileobj(source, f, EXTRACT_CHUNK_SIZE),
+                              mode if mode is not None else os.stat(src).st_mode & 0o7777, owner)
+    except OSError as e:
+        print(f"{Fore.RED}ERROR: Copying {src} failed: {e}{Style.RESET_ALL}")
+        return False
+    print(f"{Fore.GREEN}Copied to {dest}.{Style.RESET_ALL}")
+    return True
+
+
+def _run_write_file(step, ctx):
+    """Writes step["content"] to step["path"] atomically, with optional "mode" and "owner"."""
+    path = ctx.substitute(step['path'])
+    content = ctx.substitute(step['content'])
+    _print_header(ctx, f"WRITE {path}")
+    if ctx.simulate:
+        print(f"{Fore.YELLOW}[SIMULATION] Skipping actual write.{Style.RESET_ALL}")
+        return True
+    try:
+        _atomic_write(path, lambda f: f.write(content.encode('utf-8')),
+                      _parse_mode(step.get('mode')), step.get('owner'))
+    except OSError as e:
+        print(f"{Fore.RED}ERROR: Writing {path} failed: {e}{Style.RESET_ALL}")
+        return False
+    print(f"{Fore.GREEN}Wrote {len(content)} characters to {path}.{Style.RESET_ALL}")
+    return True
+
+
+def _systemctl(*args) -> bool:
+    result = subprocess.run(['systemctl'] + list(args), stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    if result.returncode != 0:
+        print(f"{Fore.RED}ERROR: systemctl {' '.join(args)} failed with exit code {result.returncode}"
+              f"{Style.RESET_ALL}")
+        if result.stdout:
+            print(f"{Fore.RED}{result.stdout.strip()}{Style.RESET_ALL}")
+        return False
+    return True
+
+
+def _run_systemd_unit(step, ctx):
+    """
+    Installs step["content"] as unit step["name"] in /etc/systemd/system.
+    systemd is only reloaded when the unit file changed. "enable" and "start"
+    (both default true) enable and start the unit.
+    """
+    name = step['name']
+    if '.' not in name:
+        name += '.service'
+    content = ctx.substitute(step['content'])
+    path = os.path.join(SYSTEMD_UNIT_DIR, name)
+    enable = step.get('enable', True)
+    start = step.get('start', True)
+    _print_header(ctx, f"UNIT {path}")
+    if ctx.simulate:
+        print(f"{Fore.YELLOW}[SIMULATION] Skipping unit installation.{Style.RESET_ALL}")
+        return True
+
+    # The unit is compared and published under the lock, so no other tool's daemon-reload sees it half-installed
+    locks = ctx.locks.hold(names=['systemd']) if ctx.locks is not None else contextlib.nullcontext()
+    with locks:
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                changed = f.read() != content
+        except OSError:
+            changed = True
+        try:
+            if changed:
+                _atomic_write(path, lambda f: f.write(content.encode('utf-8')), 0o644)
+        except OSError as e:
+            print(f"{Fore.RED}ERROR: Writing {path} failed: {e}{Style.RESET_ALL}")
+            return False
+
+        actions = [('daemon-reload',)] if changed else []
+        if enable:
+            actions.append(('enable', name))
+        if start:
+            # A running unit only picks up a changed definition on restart
+            actions.append(('restart' if changed else 'start', name))
+        try:
+            for action in actions:
+                if not _systemctl(*action):
+                    return False
+        except OSError as e:
+            print(f"{Fore.RED}ERROR: systemctl not available: {e}{Style.RESET_ALL}")
+            return False
+    print(f"{Fore.GREEN}Unit {name} {'installed' if changed else 'unchanged'}.{Style.RESET_ALL}")
+    return True
+
+
+def _run_ansible_collections(step, ctx):
+    """
+    Installs every collection tarball in step["src"] (a directory, or a
+    single tarball) under step["dest"], in parallel and without
+    ansible-galaxy. dest defaults to where ansible-galaxy would install them
+    (see collection_install). Each tarball is checked against its
+    MANIFEST.json and FILES.json checksums; collections already installed at
+    the same version are skipped unless "force" is true.
+    """
+    from toolbox.collection_install import (install_collections, unmet_dependencies,
+                                            default_collections_path, DEFAULT_JOBS)
+    src = ctx.substitute(step['src'])
+    dest = ctx.substitute(step['dest']) if 'dest' in step else default_collections_path()
+    _print_header(ctx, f"COLLECTIONS {src} -> {dest}")
+    if ctx.simulate:
+        print(f"{Fore.YELLOW}[SIMULATION] Skipping collection installation.{Style.RESET_ALL}")
+        return True
+
+    if os.path.isdir(src):
+        tarballs = sorted(os.path.join(src, f) for f in os.listdir(src) if f.endswith('.tar.gz'))
+    else:
+        tarballs = [src]
+    if not tarballs:
+        print(f"{Fore.RED}ERROR: No collection tarballs found in {src}.{Style.RESET_ALL}")
+        return False
+
+    results = install_collections(tarballs, dest, jobs=int(step.get('jobs', DEFAULT_JOBS)),
+                                  force=bool(step.get('force', False)))
+    for result in sorted(results, key=lambda r: r.name):
+        if result.status == 'failed':
+            print(f"{Fore.RED}  {result.name}: {result.detail}{Style.RESET_ALL}")
+        elif result.status == 'installed':
+            print(f"{Fore.GREEN}  {result.name} {result.version} {result.detail}{Style.RESET_ALL}")
+    for problem in unmet_dependencies(tarballs, dest):
+        print(f"{Fore.YELLOW}Warning: {problem}, which is not installed.{Style.RESET_ALL}")
+
+    counts = {status: sum(1 for r in results if r.status == status) for status in ('installed', 'skipped', 'failed')}
+    summary = f"{counts['installed']} installed, {counts['skipped']} already up to date, {counts['failed']} failed."
+    if counts['failed']:
+        print(f"{Fore.RED}ERROR: Collections: {summary}{Style.RESET_ALL}")
+        return False
+    print(f"{Fore.GREEN}Collections: {summary}{Style.RESET_ALL}")
+    return True
+
+
+STEP_TYPES: Dict[str, Callable[[Dict[str, Any], StepContext], bool]] = {
+    'shell': _run_shell,
+    'http_get': _run_http_get,
+    'extract': _run_extract,
+    'copy': _run_copy,
+    'write_file': _run_write_file,
+    'systemd_unit': _run_systemd_unit,
+    'ansible_collections': _run_ansible_collections,
+}
+
+
+# Fields each step type cannot do without; extract needs "members" or "dest" as well
+REQUIRED_FIELDS: Dict[str, tuple] = {
+    'shell': ('command',),
+    'http_get': ('dest',),
+    'extract': ('archive',),
+    'copy': ('src', 'dest'),
+    'write_file': ('path', 'content'),
+    'systemd_unit': ('name', 'content'),
+    'ansible_collections': ('src',),
+}
+
+
+def validate_step(step: Any) -> Optional[str]:
+    """Returns what is wrong with a step definition, or None if it is valid."""
+    if not isinstance(step, dict):
+        return "step is not an object"
+    step_type = step.get('type', 'shell')
+    if step_type not in STEP_TYPES:
+        return f"unknown step type '{step_type}'"
+    missing = [field for field in REQUIRED_FIELDS.get(step_type, ()) if field not in step]
+    if step_type == 'extract' and 'members' not in step and 'dest' not in step:
+        missing.append('members')
+    if step_type == 'http_get' and 'url' not in step and not step.get('urls'):
+        missing.append('url')
+    if missing:
+        return f"'{step_type}' step is missing required field(s) {', '.join(missing)}"
+    return None
+
+
+def run_step(step: Dict[str, Any], ctx: StepContext) -> bool:
+    """Runs one step. Returns True on success."""
+    step_type = step.get('type', 'shell')
+    handler = STEP_TYPES.get(step_type)
+    if handler is None:
+        print(f"{Fore.RED}ERROR: Unknown step type '{step_type}'.{Style.RESET_ALL}")
+        return False
+    with trace.span('step', step.get('id', step_type), type=step_type) as span:
+        try:
+            success = bool(handler(step, ctx))
+        except KeyError as e:
+            print(f"{Fore.RED}ERROR: '{step_type}' step is missing required field {e}.{Style.RESET_ALL}")
+            success = False
+        span.set(success=success)
+        return success
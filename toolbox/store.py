@@ -0,0 +1,299 @@
+"""
+Content-addressed artifact store shared by all tools.
+
+Every downloaded file is stored once under downloads/.store/objects, named
+by its sha256. Per-tool directories (downloads/<tool>/) are views made of
+hardlinks (or reflinks/copies where hardlinks aren't possible) into the
+store, and downloads/.store/manifests/<tool>.json records which objects make
+up each tool. Files shared between tools are kept on disk only once, and a
+tool directory can be rebuilt from its manifest at any time.
+
+A hardlinked view shares its inode with the object, so a step that
+rewrites a file in place (curl -o, say) would rewrite the object too.
+Before download steps run, the view is therefore detached: its linked files
+are replaced by private copies (reflinks where the filesystem supports
+them), whose hashes are remembered. When the download finishes, files that
+are still unchanged are linked back to their objects without being hashed
+again, and the rest are hashed and stored.
+"""
+
+import os
+import json
+import mmap
+import shutil
+import hashlib
+import tempfile
+import threading
+from typing import Dict, Optional
+
+STORE_DIRNAME = '.store'
+HASH_BUFFER_SIZE = 4 * 1024 * 1024
+# Files at least this large are hashed through a memory map
+MMAP_MIN_SIZE = 16 * 1024 * 1024
+# Files left behind by interrupted transfers are never stored
+IGNORED_SUFFIXES = ('.part',)
+
+# ioctl request number for FICLONE (copy-on-write clone on btrfs/XFS)
+FICLONE = 0x40049409
+
+
+def hash_file(path: str) -> str:
+    """
+    Returns the hex sha256 of a file. Large files are memory-mapped and the
+    rest are read into one reused buffer; hashlib releases the GIL while
+    hashing either, so several threads hash on several cores.
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size >= MMAP_MIN_SIZE:
+            try:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    if hasattr(mapped, 'madvise'):
+                        mapped.madvise(mmap.MADV_SEQUENTIAL)
+                    with memoryview(mapped) as view:
+                        for offset in range(0, size, HASH_BUFFER_SIZE):
+                            digest.update(view[offset:offset + HASH_BUFFER_SIZE])
+                return digest.hexdigest()
+            except (OSError, ValueError):
+                # Not mappable (e.g. some network filesystems): read it instead
+                digest = hashlib.sha256()
+                f.seek(0)
+        buffer = bytearray(HASH_BUFFER_SIZE)
+        with memoryview(buffer) as view:
+            while True:
+                count = f.readinto(buffer)
+                if not count:
+                    break
+                digest.update(view[:count])
+    return digest.hexdigest()
+
+
+def _reflink(src: str, dest: str) -> bool:
+    """Tries to create dest as a copy-on-write clone of src. Returns True on success."""
+    try:
+        import fcntl
+    except ImportError:
+        return False
+    try:
+        with open(src, 'rb') as s, open(dest, 'wb') as d:
+            fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+        return True
+    except OSError:
+        if os.path.exists(dest):
+            os.remove(dest)
+        return False
+
+
+def _replace(dest: str, create):
+    """Calls create(tmp_path) for a temporary path next to dest, then moves the result over dest."""
+    fd, tmp_path = tempfile.mkstemp(prefix='.link-', dir=os.path.dirname(dest))
+    os.close(fd)
+    os.remove(tmp_path)
+    try:
+        create(tmp_path)
+        os.replace(tmp_path, dest)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def link_file(src: str, dest: str):
+    """
+    Makes dest refer to the same content as src: a hardlink if possible,
+    otherwise a reflink, otherwise a plain copy. Replaces dest atomically.
+    """
+    def create(tmp_path):
+        try:
+            os.link(src, tmp_path)
+        except OSError:
+            if not _reflink(src, tmp_path):
+                shutil.copy2(src, tmp_path)
+    _replace(dest, create)
+
+
+def copy_file(src: str, dest: str):
+    """
+    Makes dest a copy of src that shares no inode with it: a reflink if
+    possible, otherwise a plain copy. Keeps src's mode and mtime and replaces
+    dest atomically.
+    """
+    def create(tmp_path):
+        if not _reflink(src, tmp_path):
+            shutil.copyfile(src, tmp_path)
+        shutil.copystat(src, tmp_path)
+    _replace(dest, create)
+
+
+def _stat_key(st: os.stat_result) -> tuple:
+    # ctime can't be set from user space, so any rewrite of the file changes it
+    return st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns, st.st_ctime_ns
+
+
+class ArtifactStore:
+    """sha256-addressed object store with per-tool manifests under <downloads_dir>/.store."""
+
+    def __init__(self, downloads_dir: str):
+        self.downloads_dir = downloads_dir
+        self.root = os.path.join(downloads_dir, STORE_DIRNAME)
+        self.objects_dir = os.path.join(self.root, 'objects')
+        self.manifests_dir = os.path.join(self.root, 'manifests')
+        # abspath -> (sha256, stat key) of files whose content is known without hashing
+        self._known: Dict[str, tuple] = {}
+        self._known_lock = threading.Lock()
+
+    def object_path(self, sha256: str) -> str:
+        return os.path.join(self.objects_dir, sha256[:2], sha256)
+
+    def has(self, sha256: str) -> bool:
+        return os.path.exists(self.object_path(sha256))
+
+    def manifest_path(self, tool_name: str) -> str:
+        return os.path.join(self.manifests_dir, f"{tool_name}.json")
+
+    def load_manifest(self, tool_name: str) -> Optional[Dict]:
+        """Returns a tool's manifest ({"tool": ..., "files": {relpath: {"sha256", "size"}}}) or None."""
+        try:
+            with open(self.manifest_path(tool_name), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def save_manifest(self, tool_name: str, files: Dict[str, Dict]):
+        os.makedirs(self.manifests_dir, exist_ok=True)
+        path = self.manifest_path(tool_name)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"tool": tool_name, "files": files}, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, path)
+
+    def add_file(self, path: str, sha256: Optional[str] = None) -> str:
+        """
+        Stores the content of path (if not already stored) and turns path into
+        a link to the stored object. Returns the content's sha256.
+        """
+        sha256 = sha256 or hash_file(path)
+        object_path = self.object_path(sha256)
+        os.makedirs(os.path.dirname(object_path), exist_ok=True)
+        try:
+            # Adopt this file as the object: same inode, no extra copy
+            os.link(path, object_path)
+            return sha256
+        except FileExistsError:
+            pass
+        except OSError:
+            # No hardlinks here (e.g. a different filesystem); store a copy
+            if not os.path.exists(object_path):
+                link_file(path, object_path)
+                return sha256
+        if not os.path.samefile(path, object_path):
+            link_file(object_path, path)
+        return sha256
+
+    def remember(self, path: str, sha256: str):
+        """
+        Records that path holds content sha256, so ingest_tool doesn't hash it
+        again as long as the file is left as it is now.
+        """
+        st = os.stat(path)
+        with self._known_lock:
+            self._known[os.path.abspath(path)] = (sha256, _stat_key(st))
+
+    def _recall(self, path: str, st: os.stat_result) -> Optional[str]:
+        with self._known_lock:
+            known = self._known.pop(os.path.abspath(path), None)
+        return known[0] if known and known[1] == _stat_key(st) else None
+
+    def link_object(self, sha256: str, dest: str, private: bool = False) -> bool:
+        """
+        Creates dest from a stored object. With private, dest is a copy that
+        may be modified without affecting the store. Returns False if the
+        object isn't stored.
+        """
+        object_path = self.object_path(sha256)
+        if not os.path.exists(object_path):
+            return False
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        if private:
+            copy_file(object_path, dest)
+            self.remember(dest, sha256)
+        else:
+            link_file(object_path, dest)
+        return True
+
+    def detach(self, tool_name: str, tool_dir: str) -> int:
+        """
+        Replaces every file in tool_dir that shares its inode with another
+        file (a store object, usually) by a private copy, so steps writing to
+        the view can't change the store or the views of other tools. Returns
+        the number of files copied.
+        """
+        recorded = (self.load_manifest(tool_name) or {}).get('files', {})
+        copied = 0
+        for dirpath, _, filenames in os.walk(tool_dir):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                if os.path.islink(path) or not os.path.isfile(path) or os.stat(path).st_nlink < 2:
+                    continue
+                entry = recorded.get(os.path.relpath(path, tool_dir).replace(os.sep, '/'))
+                if entry and self.has(entry['sha256']) and os.path.samefile(path, self.object_path(entry['sha256'])):
+                    self.link_object(entry['sha256'], path, private=True)
+                else:
+                    copy_file(path, path)
+                copied += 1
+        return copied
+
+    def ingest_tool(self, tool_name: str, tool_dir: str) -> Dict[str, Dict]:
+        """
+        Moves every file in tool_dir into the store, replaces duplicates with
+        links and writes the tool's manifest. Returns the manifest's file map.
+        Files are hashed unless remember() vouched for their current content.
+        """
+        files = {}
+        for dirpath, _, filenames in os.walk(tool_dir):
+            for filename in filenames:
+                if filename.endswith(IGNORED_SUFFIXES):
+                    continue
+                path = os.path.join(dirpath, filename)
+                if os.path.islink(path) or not os.path.isfile(path):
+                    continue
+                relpath = os.path.relpath(path, tool_dir).replace(os.sep, '/')
+                st = os.stat(path)
+                sha256 = self.add_file(path, self._recall(path, st))
+                files[relpath] = {"sha256": sha256, "size": st.st_size}
+
+        self.save_manifest(tool_name, files)
+        return files
+
+    def materialize(self, tool_name: str, tool_dir: str) -> bool:
+        """
+        Recreates any files of a tool's view that are missing from tool_dir.
+        Returns True if the view is complete afterwards.
+        """
+        manifest = self.load_manifest(tool_name)
+        if not manifest:
+            return False
+        complete = True
+        for relpath, entry in manifest.get('files', {}).items():
+            dest = os.path.join(tool_dir, *relpath.split('/'))
+            if os.path.exists(dest):
+                continue
+            if not self.link_object(entry['sha256'], dest):
+                complete = False
+        return complete
+
+    def prune(self) -> int:
+        """Removes objects that no manifest references. Returns the number removed."""
+        referenced = set()
+        if os.path.isdir(self.manifests_dir):
+            for filename in os.listdir(self.manifests_dir):
+                if filename.endswith('.json'):
+                    manifest = self.load_manifest(filename[:-len('.json')]) or {}
+                    referenced.update(e['sha256'] for e in manifest.get('files', {}).values())
+        removed = 0
+        for dirpath, _, filenames in os.walk(self.objects_dir):
+            for filename in filenames:
+                if filename not in referenced:
+                    os.remove(os.path.join(dirpath, filename))
+                    removed += 1
+        return removed
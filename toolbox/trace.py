@@ -0,0 +1,264 @@
+"""
+Per-run trace and metrics.
+
+While a download or install run is traced, spans are recorded around every
+tool, step, shell command and file transfer, with durations, exit codes,
+bytes transferred, throughput and retries. A span opened in a worker thread
+nests under the span that scheduled it and inherits its tool and phase.
+
+When the run ends it is exported twice:
+
+- as a JSON trace in Chrome trace event format (.relay/traces/), which
+  chrome://tracing and Perfetto display as a timeline,
+- as a Prometheus textfile-collector file (.relay/metrics/relay_<phase>.prom)
+  with per-tool and per-run totals, for node_exporter's
+  --collector.textfile.directory.
+
+Outside a traced run, spans cost almost nothing and are not kept.
+"""
+
+import os
+import json
+import time
+import threading
+import itertools
+import contextvars
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+from toolbox.state import default_state_dir
+
+TRACE_DIRNAME = 'traces'
+METRICS_DIRNAME = 'metrics'
+# Oldest trace files beyond this count are removed
+MAX_TRACE_FILES = 100
+# Spans kept per run; later spans are counted but dropped
+MAX_SPANS = 100000
+# Attributes a span copies from its parent unless given explicitly
+INHERITED_ATTRS = ('phase', 'tool')
+
+_current_span = contextvars.ContextVar('relay_current_span', default=None)
+_span_ids = itertools.count(1)
+
+
+class Span:
+    """One timed operation. Attributes are set with set(); success=False marks it failed."""
+
+    def __init__(self, kind: str, name: str, parent: Optional['Span'], attrs: Dict[str, Any]):
+        self.id = next(_span_ids)
+        self.kind = kind
+        self.name = name
+        self.parent_id = parent.id if parent else None
+        self.attrs = {key: parent.attrs[key] for key in INHERITED_ATTRS if parent and key in parent.attrs}
+        self.attrs.update((key, value) for key, value in attrs.items() if value is not None)
+        self.thread = threading.get_ident()
+        self.start = time.time()
+        self._start = time.perf_counter()
+        self.duration = None
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    @property
+    def success(self) -> bool:
+        return self.attrs.get('success', True) is not False
+
+    def finish(self):
+        self.duration = time.perf_counter() - self._start
+        if self.attrs.get('bytes') and self.duration > 0:
+            self.attrs['throughput_bps'] = round(self.attrs['bytes'] / self.duration)
+
+
+class Tracer:
+    """Collects the spans of the current run."""
+
+    def __init__(self):
+        self.spans: List[Span] = []
+        self.dropped = 0
+        self.recording = False
+        self._lock = threading.Lock()
+
+    def reset(self):
+        with self._lock:
+            self.spans = []
+            self.dropped = 0
+
+    @contextmanager
+    def span(self, kind: str, name: str, **attrs):
+        """Records a span for the duration of the block and yields it."""
+        span = Span(kind, name, _current_span.get(), attrs)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.set(success=False, error=type(e).__name__)
+            raise
+        finally:
+            _current_span.reset(token)
+            span.finish()
+            if self.recording:
+                with self._lock:
+                    if len(self.spans) < MAX_SPANS:
+                        self.spans.append(span)
+                    else:
+                        self.dropped += 1
+
+    @contextmanager
+    def run(self, phase: str, trace_path: Optional[str] = None, metrics_dir: Optional[str] = None,
+            **attrs):
+        """
+        Traces a whole run: records every span opened in the block and exports
+        the trace and metrics when it ends. Without metrics_dir, no metrics
+        file is written. Yields the run's span.
+        """
+        self.reset()
+        self.recording = True
+        try:
+            with self.span('run', phase, phase=phase, **attrs) as span:
+                yield span
+        finally:
+            self.recording = False
+            spans, self.spans = self.spans, []
+            try:
+                if trace_path is None:
+                    trace_path = default_trace_path(phase)
+                    write_trace(trace_path, spans, self.dropped)
+                    _prune_traces(os.path.dirname(trace_path))
+                else:
+                    write_trace(trace_path, spans, self.dropped)
+                print(f"Trace written to {trace_path}")
+                if metrics_dir:
+                    metrics_path = os.path.join(metrics_dir, f"relay_{phase}.prom")
+                    write_metrics(metrics_path, spans, phase)
+                    print(f"Metrics written to {metrics_path}")
+            except OSError as e:
+                print(f"Could not export the trace of this run: {e}")
+
+
+tracer = Tracer()
+
+
+def span(kind: str, name: str, **attrs):
+    """Records a span in the current run; see Tracer.span."""
+    return tracer.span(kind, name, **attrs)
+
+
+def default_trace_path(phase: str) -> str:
+    return os.path.join(default_state_dir(), TRACE_DIRNAME,
+                        f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{phase}.json")
+
+
+def default_metrics_dir() -> str:
+    return os.path.join(default_state_dir(), METRICS_DIRNAME)
+
+
+def _atomic_write_text(path: str, text: str):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+def write_trace(path: str, spans: List[Span], dropped: int = 0):
+    """Writes spans as Chrome trace events, with times relative to the first span."""
+    origin = min((s.start for s in spans), default=time.time())
+    threads = {}
+    events = []
+    for s in sorted(spans, key=lambda s: s.start):
+        args = dict(s.attrs, span_id=s.id)
+        if s.parent_id is not None:
+            args['parent_id'] = s.parent_id
+        events.append({
+            'name': s.name,
+            'cat': s.kind,
+            'ph': 'X',
+            'ts': round((s.start - origin) * 1e6),
+            'dur': round(s.duration * 1e6),
+            'pid': os.getpid(),
+            'tid': threads.setdefault(s.thread, len(threads) + 1),
+            'args': args,
+        })
+    _atomic_write_text(path, json.dumps({
+        'traceEvents': events,
+        'displayTimeUnit': 'ms',
+        'otherData': {'started': origin, 'dropped_spans': dropped},
+    }))
+
+
+def _prune_traces(trace_dir: str):
+    traces = sorted(f for f in os.listdir(trace_dir) if f.endswith('.json'))
+    for old in traces[:max(0, len(traces) - MAX_TRACE_FILES)]:
+        os.remove(os.path.join(trace_dir, old))
+
+
+def _labels(labels: Dict[str, Any]) -> str:
+    def escape(value):
+        return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    pairs = [f'{key}="{escape(value)}"' for key, value in labels.items() if value is not None]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+# name -> help text; every metric is a gauge describing the latest run of a phase
+METRICS = {
+    'relay_run_timestamp_seconds': "Time the latest run of this phase finished.",
+    'relay_run_duration_seconds': "Wall time of the latest run.",
+    'relay_run_tools': "Tools processed by the latest run, by result.",
+    'relay_tool_duration_seconds': "Wall time spent on a tool.",
+    'relay_tool_success': "1 if the tool succeeded, 0 if it failed.",
+    'relay_commands': "Shell commands run, by result.",
+    'relay_command_duration_seconds': "Time spent in shell commands.",
+    'relay_transferred_bytes': "Bytes downloaded.",
+    'relay_transfer_duration_seconds': "Time spent downloading.",
+    'relay_transfer_retries': "Download attempts that were retried.",
+    'relay_transfer_failures': "Downloads that failed.",
+}
+
+
+def collect_metrics(spans: List[Span], phase: str) -> Dict[str, Dict[tuple, float]]:
+    """Aggregates spans into {metric name: {label tuple: value}}."""
+    values = {name: {} for name in METRICS}
+
+    def add(name, labels, value):
+        key = tuple(sorted(labels.items()))
+        values[name][key] = values[name].get(key, 0) + value
+
+    tool_success = {}
+    for s in spans:
+        tool = s.attrs.get('tool')
+        labels = {'phase': phase, 'tool': tool}
+        if s.kind == 'run':
+            add('relay_run_timestamp_seconds', {'phase': phase}, round(s.start + s.duration, 3))
+            add('relay_run_duration_seconds', {'phase': phase}, s.duration)
+        elif s.kind == 'tool' and tool:
+            add('relay_tool_duration_seconds', labels, s.duration)
+            tool_success[tool] = tool_success.get(tool, True) and s.success
+        elif s.kind == 'command':
+            add('relay_commands', dict(labels, result='ok' if s.success else 'failed'), 1)
+            add('relay_command_duration_seconds', labels, s.duration)
+        elif s.kind == 'transfer' and 'bytes' in s.attrs:
+            add('relay_transferred_bytes', labels, s.attrs['bytes'])
+            add('relay_transfer_duration_seconds', labels, s.duration)
+            add('relay_transfer_retries', labels, s.attrs.get('retries', 0))
+            add('relay_transfer_failures', labels, 0 if s.success else 1)
+
+    for tool, success in tool_success.items():
+        add('relay_tool_success', {'phase': phase, 'tool': tool}, 1 if success else 0)
+    for result in ('ok', 'failed'):
+        add('relay_run_tools', {'phase': phase, 'result': result},
+            sum(1 for success in tool_success.values() if success == (result == 'ok')))
+    return values
+
+
+def write_metrics(path: str, spans: List[Span], phase: str):
+    """Writes the metrics of a run in the Prometheus text exposition format."""
+    lines = []
+    for name, series in collect_metrics(spans, phase).items():
+        if not series:
+            continue
+        lines.append(f"# HELP {name} {METRICS[name]}")
+        lines.append(f"# TYPE {name} gauge")
+        for labels, value in sorted(series.items(), key=lambda item: str(item[0])):
+            value = round(value, 6) if isinstance(value, float) else value
+            lines.append(f"{name}{_labels(dict(labels))} {value}")
+    _atomic_write_text(path, "\n".join(lines) + "\n")
@@ -0,0 +1,380 @@
+"""
+HTTP file transfer with large reused buffers, resume and retry.
+
+Downloads are written to '<dest>.part' and atomically renamed into place
+once complete. If a transfer fails, the partial file is kept and the next
+attempt asks the server for the remaining bytes with a Range request.
+Large files can also be fetched as several byte ranges in parallel. Such a
+partial file has holes, so each segment's progress is recorded next to it
+in '<dest>.segments.part', and the next segmented attempt (possibly from
+another mirror) fetches only what is missing from each segment.
+"""
+
+import os
+import json
+import time
+import random
+import threading
+import http.client
+import urllib.error
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+
+from tqdm import tqdm
+
+from toolbox import trace
+from toolbox.http_client import ConnectionPool
+from toolbox.store import hash_file
+
+# Read buffer starts small and doubles while reads keep filling it
+MIN_BUFFER_SIZE = 64 * 1024
+MAX_BUFFER_SIZE = 4 * 1024 * 1024
+# Seconds between progress bar refreshes
+PROGRESS_INTERVAL = 0.25
+
+DEFAULT_RETRIES = 5
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 30.0
+# HTTP statuses worth retrying; other 4xx errors fail immediately
+RETRYABLE_STATUSES = (408, 425, 429, 500, 502, 503, 504)
+
+PART_SUFFIX = '.part'
+SEGMENTS_SUFFIX = '.segments' + PART_SUFFIX
+
+
+def backoff_delay(attempt: int) -> float:
+    """Exponential backoff with jitter for the given (0-based) retry attempt."""
+    delay = min(BACKOFF_MAX, BACKOFF_BASE * (2 ** attempt))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+def parse_content_range(value: Optional[str]):
+    """Parses 'bytes start-end/total' into (start, end, total); missing parts are None."""
+    if not value or not value.startswith('bytes '):
+        return None, None, None
+    span, _, total = value[6:].partition('/')
+    total = int(total) if total.isdigit() else None
+    if span == '*':
+        return None, None, total
+    start, _, end = span.partition('-')
+    return int(start), int(end), total
+
+
+def _discard(*paths):
+    for path in paths:
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def copy_stream(response, out_file, progress_bar=None) -> int:
+    """
+    Copies a response body into an open file using one reused buffer,
+    growing the read size while reads keep filling it. Returns bytes copied.
+    """
+    buffer = bytearray(MAX_BUFFER_SIZE)
+    view = memoryview(buffer)
+    size = MIN_BUFFER_SIZE
+    copied = 0
+    pending = 0
+    last_update = time.monotonic()
+
+    while True:
+        n = response.readinto(view[:size])
+        if not n:
+            break
+        out_file.write(view[:n])
+        copied += n
+        if n == size and size < MAX_BUFFER_SIZE:
+            size *= 2
+
+        if progress_bar is not None:
+            pending += n
+            now = time.monotonic()
+            if now - last_update >= PROGRESS_INTERVAL:
+                progress_bar.update(pending)
+                pending = 0
+                last_update = now
+
+    if progress_bar is not None and pending:
+        progress_bar.update(pending)
+    return copied
+
+
+def _transfer_once(pool, url, part_path, headers, progress):
+    """Makes one attempt at fetching the remainder of part_path. Returns (final size, bytes received)."""
+    offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    request_headers = dict(headers or {})
+    if offset:
+        request_headers['Range'] = f'bytes={offset}-'
+
+    try:
+        response = pool.get(url, headers=request_headers)
+    except urllib.error.HTTPError as e:
+        if e.code == 416 and offset:
+            # Nothing left to fetch if the partial file already holds the whole body
+            _, _, total = parse_content_range(e.headers.get('Content-Range') if e.headers else None)
+            if total == offset:
+                return offset, 0
+            # The partial file doesn't match the remote file; start over on the next attempt
+            os.remove(part_path)
+            raise urllib.error.URLError(f"cannot resume {url} at byte {offset}")
+        raise
+
+    with response:
+        if offset and response.status == 206:
+            start, _, total = parse_content_range(response.headers.get('Content-Range'))
+            if start != offset:
+                # Can't splice this body onto the partial file; start over on the next attempt
+                os.remove(part_path)
+                raise urllib.error.URLError(f"server resumed at byte {start}, expected {offset}")
+            mode = 'ab'
+            print(f"Resuming {os.path.basename(part_path[:-len(PART_SUFFIX)])} at byte {offset}")
+        else:
+            # Server ignored the Range header (or nothing to resume): start over
+            offset = 0
+            mode = 'wb'
+            length = response.headers.get('Content-Length')
+            total = int(length) if length and length.isdigit() else None
+
+        with open(part_path, mode) as out_file, \
+                tqdm(total=total, initial=offset, unit='iB', unit_scale=True,
+                     desc=os.path.basename(part_path[:-len(PART_SUFFIX)]), disable=not progress) as bar:
+            copied = copy_stream(response, out_file, bar)
+
+    size = offset + copied
+    if total is not None and size != total:
+        raise http.client.IncompleteRead(b'', total - size)
+    return size, copied
+
+
+def download_file(url: str, dest_path: str, pool: Optional[ConnectionPool] = None,
+                  progress: bool = True, retries: int = DEFAULT_RETRIES,
+                  headers: Optional[Dict[str, str]] = None) -> bool:
+    """
+    Downloads url to dest_path, resuming partial transfers and retrying with
+    backoff. Returns True on success, False otherwise.
+    """
+    pool = pool or ConnectionPool()
+    part_path = dest_path + PART_SUFFIX
+    print(f"Downloading {url} to {dest_path}...")
+    if os.path.exists(dest_path + SEGMENTS_SUFFIX):
+        # Left by a segmented download: it has holes, so a single stream can't resume it
+        _discard(part_path, dest_path + SEGMENTS_SUFFIX)
+
+    with trace.span('transfer', os.path.basename(dest_path), url=url, connections=1) as span:
+        received = 0
+        for attempt in range(retries + 1):
+            span.set(retries=attempt)
+            try:
+                size, copied = _transfer_once(pool, url, part_path, headers, progress)
+                received += copied
+                os.replace(part_path, dest_path)
+                span.set(bytes=received, size=size, success=True)
+                print(f"Successfully downloaded to {dest_path}")
+                return True
+            except urllib.error.HTTPError as e:
+                span.set(status=e.code)
+                if e.code not in RETRYABLE_STATUSES:
+                    print(f"Error downloading {url}: {e}")
+                    span.set(bytes=received, success=False)
+                    return False
+                error = e
+            except (urllib.error.URLError, http.client.HTTPException, OSError) as e:
+                error = e
+
+            if attempt < retries:
+                delay = backoff_delay(attempt)
+                print(f"Transfer of {url} failed ({error}). Retrying in {delay:.1f}s "
+                      f"(attempt {attempt + 2}/{retries + 1})...")
+                time.sleep(delay)
+
+        print(f"Error downloading {url}: {error}")
+        span.set(bytes=received, success=False, error=str(error))
+        return False
+
+
+# Files smaller than this are not worth splitting across connections
+MIN_SEGMENT_SIZE = 4 * 1024 * 1024
+DEFAULT_CONNECTIONS = 4
+
+
+def probe_ranges(pool: ConnectionPool, url: str, headers: Optional[Dict[str, str]] = None):
+    """
+    Asks the server for the first byte of url. Returns (final_url, total_size)
+    if it answers with a satisfiable byte range, or (final_url, None) if it
+    ignores Range requests or doesn't report the size.
+    """
+    request_headers = dict(headers or {})
+    request_headers['Range'] = 'bytes=0-0'
+    with pool.get(url, headers=request_headers) as response:
+        final_url = response.url
+        if response.status != 206:
+            return final_url, None
+        response.read()
+        _, _, total = parse_content_range(response.headers.get('Content-Range'))
+        return final_url, total
+
+
+def _plan_segments(dest_path: str, total: int, connections: int) -> list:
+    """
+    Returns the byte ranges of a segmented download as [start, end, position]
+    lists, position being the next byte to fetch. The recorded progress of an
+    earlier attempt at a file of the same size is reused as is, and a partial
+    file left by a single stream is kept as the finished start of the file.
+    """
+    part_path = dest_path + PART_SUFFIX
+    state_path = dest_path + SEGMENTS_SUFFIX
+    done = 0
+    if os.path.exists(state_path):
+        try:
+            with open(state_path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+            if state['total'] == total and os.path.getsize(part_path) == total:
+                return [[int(start), int(end), int(position)] for start, end, position in state['segments']]
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+        _discard(part_path, state_path)
+    elif os.path.exists(part_path):
+        done = os.path.getsize(part_path)
+        if done > total:
+            _discard(part_path)
+            done = 0
+
+    remaining = total - done
+    connections = min(connections, max(1, remaining // MIN_SEGMENT_SIZE))
+    segment_size = max(1, -(-remaining // connections))
+    return [[start, min(start + segment_size, total) - 1, start] for start in range(done, total, segment_size)]
+
+
+def _save_segments(dest_path: str, total: int, segments: list):
+    tmp_path = f"{dest_path}{SEGMENTS_SUFFIX}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({'total': total, 'segments': segments}, f)
+    os.replace(tmp_path, dest_path + SEGMENTS_SUFFIX)
+
+
+def _fetch_segment(pool, url, fd, segment, headers, retries, bar, bar_lock):
+    """
+    Fetches the rest of segment ([start, end, position], end inclusive) into
+    fd at the same offsets, resuming within the segment and keeping
+    segment[2] at the next byte to fetch. Returns the number of retries it
+    needed.
+    """
+    _, end, position = segment
+    if position > end:
+        return 0
+    buffer = bytearray(MAX_BUFFER_SIZE)
+    view = memoryview(buffer)
+
+    for attempt in range(retries + 1):
+        request_headers = dict(headers or {})
+        request_headers['Range'] = f'bytes={position}-{end}'
+        try:
+            with pool.get(url, headers=request_headers) as response:
+                if response.status != 206:
+                    raise urllib.error.URLError(f"server ignored range request for bytes {position}-{end}")
+                got_start, _, _ = parse_content_range(response.headers.get('Content-Range'))
+                if got_start != position:
+                    raise urllib.error.URLError(f"server returned byte {got_start}, expected {position}")
+                while position <= end:
+                    n = response.readinto(view[:min(MAX_BUFFER_SIZE, end - position + 1)])
+                    if not n:
+                        break
+                    os.pwrite(fd, view[:n], position)
+                    position += n
+                    segment[2] = position
+                    if bar is not None:
+                        with bar_lock:
+                            bar.update(n)
+            if position > end:
+                return attempt
+            raise http.client.IncompleteRead(b'', end - position + 1)
+        except urllib.error.HTTPError as e:
+            if e.code not in RETRYABLE_STATUSES or attempt == retries:
+                raise
+        except (urllib.error.URLError, http.client.HTTPException, OSError):
+            if attempt == retries:
+                raise
+        time.sleep(backoff_delay(attempt))
+
+
+def _download_segments(pool, url, final_url, dest_path, total, connections, progress, retries, headers) -> bool:
+    """
+    Fetches final_url as parallel byte ranges into dest_path. On failure the
+    partial file and each segment's progress are kept for the next attempt.
+    Returns True on success.
+    """
+    segments = _plan_segments(dest_path, total, connections)
+    done = total - sum(end + 1 - position for _, end, position in segments)
+    part_path = dest_path + PART_SUFFIX
+    resumed = f", resuming at {done} of {total} bytes" if done else ""
+    print(f"Downloading {url} to {dest_path} over {len(segments)} connections{resumed}...")
+
+    with trace.span('transfer', os.path.basename(dest_path), url=url, connections=len(segments)) as span:
+        # Preallocate a sparse file of the final size; segments write at their own offsets
+        fd = os.open(part_path, os.O_WRONLY | os.O_CREAT, 0o644)
+        bar_lock = threading.Lock()
+        try:
+            os.ftruncate(fd, total)
+            with tqdm(total=total, initial=done, unit='iB', unit_scale=True, desc=os.path.basename(dest_path),
+                      disable=not progress) as bar, \
+                    ThreadPoolExecutor(max_workers=max(1, len(segments))) as executor:
+                futures = [executor.submit(_fetch_segment, pool, final_url, fd, segment,
+                                           headers, retries, bar, bar_lock)
+                           for segment in segments]
+                span.set(retries=sum(future.result() for future in futures))
+            os.fsync(fd)
+        except (urllib.error.URLError, http.client.HTTPException, OSError) as e:
+            print(f"Error downloading {url}: {e}")
+            received = total - done - sum(end + 1 - position for _, end, position in segments)
+            try:
+                # Only bytes known to be on disk are recorded as fetched
+                os.fsync(fd)
+                _save_segments(dest_path, total, segments)
+            except OSError:
+                _discard(part_path, dest_path + SEGMENTS_SUFFIX)
+            finally:
+                os.close(fd)
+            span.set(bytes=received, success=False, error=str(e))
+            return False
+        os.close(fd)
+
+        os.replace(part_path, dest_path)
+        _discard(dest_path + SEGMENTS_SUFFIX)
+        span.set(bytes=total - done, size=total, success=True)
+        print(f"Successfully downloaded to {dest_path}")
+        return True
+
+
+def segmented_download(url: str, dest_path: str, connections: int = DEFAULT_CONNECTIONS,
+                       pool: Optional[ConnectionPool] = None, progress: bool = True,
+                       sha256: Optional[str] = None, retries: int = DEFAULT_RETRIES,
+                       headers: Optional[Dict[str, str]] = None) -> bool:
+    """
+    Downloads url over several parallel connections, each fetching one byte
+    range into a preallocated file. Falls back to a single stream when the
+    server doesn't support ranges or the file is small. Given sha256, the
+    downloaded file is verified and removed if it doesn't match.
+    Returns True on success, False otherwise.
+    """
+    pool = pool or ConnectionPool()
+    try:
+        final_url, total = probe_ranges(pool, url, headers)
+    except (urllib.error.URLError, http.client.HTTPException, OSError) as e:
+        print(f"Could not probe {url} for range support ({e}); using a single connection.")
+        final_url, total = url, None
+
+    if connections <= 1 or total is None or total < MIN_SEGMENT_SIZE:
+        if not download_file(url, dest_path, pool=pool, progress=progress, retries=retries, headers=headers):
+            return False
+    elif not _download_segments(pool, url, final_url, dest_path, total, connections, progress, retries, headers):
+        return False
+
+    if sha256:
+        actual = hash_file(dest_path)
+        if actual.lower() != sha256.lower():
+            print(f"Checksum mismatch for {dest_path}: expected {sha256}, got {actual}")
+            os.remove(dest_path)
+            return False
+        print(f"Checksum verified for {dest_path}")
+    return True
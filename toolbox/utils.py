@@ -1,16 +1,116 @@
 import subprocess
 import os
+import re
 import sys
+import time
+import codecs
 import platform
 import shutil
 import socket # For internet connectivity check
+import threading
+import itertools
+import selectors
+import collections
 from colorama import Fore, Style
 
-def execute_command(command: str, description: str = "", simulate: bool = False) -> bool:
+from toolbox import trace
+
+# Lines of output kept in memory for the failure report; everything else only goes to the log
+OUTPUT_TAIL_LINES = 200
+# Longer lines are cut into pieces so a step without newlines can't grow memory
+MAX_LINE_LENGTH = 64 * 1024
+READ_SIZE = 64 * 1024
+LOG_DIRNAME = 'logs'
+# Oldest step logs beyond this count are removed
+MAX_LOG_FILES = 1000
+
+_log_counter = itertools.count(1)
+_pruned_log_dirs = set()
+_log_lock = threading.Lock()
+
+
+def default_log_dir():
+    """Directory for per-step command logs."""
+    from toolbox.state import default_state_dir
+    return os.path.join(default_state_dir(), LOG_DIRNAME)
+
+
+def _open_step_log(log_dir, description):
+    """Creates a new log file for one command. Returns (file, path), or (None, None) if logging isn't possible."""
+    slug = re.sub(r'[^A-Za-z0-9_.-]+', '-', description or 'command').strip('-')[:60] or 'command'
+    with _log_lock:
+        number = next(_log_counter)
+        prune = log_dir not in _pruned_log_dirs
+        _pruned_log_dirs.add(log_dir)
+    name = f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{number:04d}-{slug}.log"
+    try:
+        os.makedirs(log_dir, exist_ok=True)
+        if prune:
+            logs = sorted(f for f in os.listdir(log_dir) if f.endswith('.log'))
+            for old in logs[:max(0, len(logs) - MAX_LOG_FILES)]:
+                os.remove(os.path.join(log_dir, old))
+        path = os.path.join(log_dir, name)
+        return open(path, 'wb'), path
+    except OSError:
+        return None, None
+
+
+def _stream_process(process, log_file, tail):
+    """
+    Reads stdout and stderr of process as data arrives, without blocking on
+    either pipe. Complete lines are printed live and kept in the bounded
+    tail; raw output is written to log_file.
+    """
+    selector = selectors.DefaultSelector()
+    decoders = {}
+    partial = {}
+    for name, pipe in (('stdout', process.stdout), ('stderr', process.stderr)):
+        selector.register(pipe, selectors.EVENT_READ, name)
+        decoders[name] = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        partial[name] = ''
+
+    def emit(name, line):
+        tail.append((name, line))
+        color = Fore.WHITE if name == 'stdout' else Fore.YELLOW
+        print(f"{color}{line}{Style.RESET_ALL}")
+
+    while selector.get_map():
+        for key, _ in selector.select():
+            name = key.data
+            data = os.read(key.fileobj.fileno(), READ_SIZE)
+            if log_file:
+                log_file.write(data)
+            if not data:
+                selector.unregister(key.fileobj)
+            lines = (partial[name] + decoders[name].decode(data, final=not data)).split('\n')
+            rest = lines.pop()
+            for line in lines:
+                emit(name, line.rstrip('\r'))
+            while len(rest) > MAX_LINE_LENGTH:
+                emit(name, rest[:MAX_LINE_LENGTH])
+                rest = rest[MAX_LINE_LENGTH:]
+            if not data and rest:
+                emit(name, rest)
+                rest = ''
+            partial[name] = rest
+    selector.close()
+
+
+def execute_command(command: str, description: str = "", simulate: bool = False, log_dir: str = None) -> bool:
     """
-    Executes a shell command and prints its output.
+    Executes a shell command, printing its output live.
+    Full output goes to a per-command log file in log_dir (.relay/logs by
+    default); only the last OUTPUT_TAIL_LINES lines are kept in memory for
+    the failure report. The command is recorded as a span of the current trace.
     Returns True if the command was successful, False otherwise.
     """
+    with trace.span('command', description or command, command=command, simulate=simulate or None) as span:
+        success = _execute_command(command, description, simulate, log_dir, span)
+        span.set(success=success)
+        return success
+
+
+def _execute_command(command, description, simulate, log_dir, span):
     if description:
         print(f"{Fore.BLUE}Executing: {description}{Style.RESET_ALL}")
     print(f"{Fore.CYAN}$ {command}{Style.RESET_ALL}")
@@ -19,40 +119,55 @@ def execute_command(command: str, description: str = "", simulate: bool = False)
         print(f"{Fore.YELLOW}[SIMULATION] Skipping actual command execution.{Style.RESET_ALL}")
         return True
 
+    log_file, log_path = _open_step_log(log_dir or default_log_dir(), description)
+    if log_file:
+        log_file.write(f"$ {command}\n".encode('utf-8'))
+    tail = collections.deque(maxlen=OUTPUT_TAIL_LINES)
+    returncode = None
+    start = time.monotonic()
     try:
         # Using shell=True for convenience with piping and complex commands
         # In a real-world product, carefully consider shlex.split and direct execution
         # to avoid shell injection if commands were user-provided. Here, they are hardcoded.
-        result = subprocess.run(
+        process = subprocess.Popen(
             command,
             shell=True,
-            check=True,  # Raises CalledProcessError for non-zero exit codes
-            capture_output=True,
-            text=True,   # Capture output as text (decoded)
-            encoding='utf-8' # Ensure proper decoding
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
         )
-
-        if result.stdout:
-            print(f"{Fore.WHITE}Output:\n{result.stdout.strip()}{Style.RESET_ALL}")
-        if result.stderr:
-            print(f"{Fore.YELLOW}Error Output (if any):\n{result.stderr.strip()}{Style.RESET_ALL}")
-
-        print(f"{Fore.GREEN}Command successful.{Style.RESET_ALL}")
-        return True
-    except subprocess.CalledProcessError as e:
-        print(f"{Fore.RED}ERROR: Command failed with exit code {e.returncode}{Style.RESET_ALL}")
-        print(f"{Fore.RED}Command: {e.cmd}{Style.RESET_ALL}")
-        if e.stdout:
-            print(f"{Fore.RED}Stdout:\n{e.stdout.strip()}{Style.RESET_ALL}")
-        if e.stderr:
-            print(f"{Fore.RED}Stderr:\n{e.stderr.strip()}{Style.RESET_ALL}")
-        return False
+        try:
+            _stream_process(process, log_file, tail)
+        finally:
+            returncode = process.wait()
     except FileNotFoundError:
         print(f"{Fore.RED}ERROR: Command '{command.split()[0]}' not found.{Style.RESET_ALL}")
         return False
     except Exception as e:
         print(f"{Fore.RED}AN UNEXPECTED ERROR OCCURRED: {e}{Style.RESET_ALL}")
         return False
+    finally:
+        duration = time.monotonic() - start
+        if log_file:
+            log_file.write(f"\n[exit status {returncode}, {duration:.1f}s]\n".encode('utf-8'))
+            log_file.close()
+
+    span.set(exit_code=returncode, log=log_path)
+    log_note = f" Log: {log_path}" if log_path else ""
+    if returncode == 0:
+        print(f"{Fore.GREEN}Command successful (exit status 0, {duration:.1f}s).{log_note}{Style.RESET_ALL}")
+        return True
+
+    print(f"{Fore.RED}ERROR: Command failed with exit code {returncode} after {duration:.1f}s{Style.RESET_ALL}")
+    print(f"{Fore.RED}Command: {command}{Style.RESET_ALL}")
+    stderr_lines = [line for name, line in tail if name == 'stderr']
+    if stderr_lines:
+        print(f"{Fore.RED}Stderr (last {len(stderr_lines)} lines):\n" + "\n".join(stderr_lines) + Style.RESET_ALL)
+    elif tail:
+        print(f"{Fore.RED}Output (last {len(tail)} lines):\n" + "\n".join(line for _, line in tail) + Style.RESET_ALL)
+    if log_path:
+        print(f"{Fore.RED}Full output: {log_path}{Style.RESET_ALL}")
+    return False
 
 
 def clear_screen():
@@ -0,0 +1,114 @@
+"""
+Integrity verification of downloaded artifacts.
+
+Every file of a tool's download directory is checked against the sha256
+and size recorded in the tool's store manifest before anything is
+installed, so corruption from the transfer medium is reported up front
+instead of as a failed dnf or tar halfway through an install.
+
+Files are hashed concurrently (see store.hash_file). A file is hashed once
+per run even if several tools link to it, and a file whose size, mtime,
+ctime and inode still match the record of an earlier successful
+verification is not hashed again; those records live in the "verified" section of
+.relay/state.json.
+"""
+
+import os
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional
+
+from toolbox.state import StateDB, stat_fingerprint
+from toolbox.store import ArtifactStore, hash_file
+from toolbox import trace
+
+DEFAULT_JOBS = os.cpu_count() or 4
+STATE_SECTION = 'verified'
+
+Problem = namedtuple('Problem', ['path', 'reason'])
+VerifyResult = namedtuple('VerifyResult', ['name', 'files', 'hashed', 'problems'])
+
+
+def _fingerprint(path: str) -> str:
+    # ctime can't be set from user space, so a rewrite that restores the mtime still shows
+    try:
+        return f"{stat_fingerprint([path])}:{os.stat(path).st_ctime_ns}"
+    except OSError:
+        return stat_fingerprint([path])
+
+
+class Verifier:
+    """Checks tool download directories against their store manifests."""
+
+    def __init__(self, store: ArtifactStore, state: Optional[StateDB] = None, jobs: int = DEFAULT_JOBS,
+                 full: bool = False):
+        self.store = store
+        self.state = state
+        self.jobs = max(1, jobs)
+        # Hash every file, ignoring earlier verification records
+        self.full = full
+
+    def _known_good(self, path: str, sha256: str) -> bool:
+        if self.full or self.state is None:
+            return False
+        record = self.state.get(STATE_SECTION, path, _fingerprint(path))
+        return bool(record) and record.get('sha256') == sha256
+
+    def verify(self, tool_names: Iterable[str]) -> Dict[str, VerifyResult]:
+        """
+        Verifies the download directory of each tool. Returns a VerifyResult
+        per tool; a tool passed if its problems list is empty. A tool without
+        a store manifest has nothing to check against and is reported with a
+        single problem.
+        """
+        tool_names = list(tool_names)
+        problems = {name: [] for name in tool_names}
+        counts = dict.fromkeys(tool_names, 0)
+        # (st_dev, st_ino) -> [(tool, path, expected sha256)]; hardlinked files are hashed once
+        pending: Dict[tuple, List[tuple]] = {}
+
+        for name in tool_names:
+            manifest = self.store.load_manifest(name)
+            if manifest is None:
+                problems[name].append(Problem(os.path.join(self.store.downloads_dir, name),
+                                              "no store manifest to verify against"))
+                continue
+            tool_dir = os.path.join(self.store.downloads_dir, name)
+            for relpath, entry in sorted(manifest.get('files', {}).items()):
+                counts[name] += 1
+                path = os.path.abspath(os.path.join(tool_dir, *relpath.split('/')))
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    problems[name].append(Problem(path, "missing"))
+                    continue
+                if st.st_size != entry['size']:
+                    problems[name].append(Problem(path, f"size {st.st_size}, expected {entry['size']}"))
+                elif not self._known_good(path, entry['sha256']):
+                    pending.setdefault((st.st_dev, st.st_ino), []).append((name, path, entry['sha256']))
+
+        hashed = dict.fromkeys(tool_names, 0)
+        with trace.span('stage', 'verify', tools=len(tool_names), files=sum(counts.values()),
+                        hashed=len(pending)) as span:
+            with ThreadPoolExecutor(max_workers=self.jobs) as pool:
+                digests = pool.map(lambda files: self._hash(files[0][1]), pending.values())
+                for files, actual in zip(pending.values(), digests):
+                    for name, path, expected in files:
+                        hashed[name] += 1
+                        if actual is None:
+                            problems[name].append(Problem(path, "unreadable"))
+                        elif actual != expected:
+                            problems[name].append(Problem(path, f"sha256 {actual}, expected {expected}"))
+                        elif self.state is not None:
+                            self.state.put(STATE_SECTION, path, _fingerprint(path), sha256=actual)
+            span.set(success=not any(problems.values()))
+        if self.state is not None:
+            self.state.save()
+        return {name: VerifyResult(name, counts[name], hashed[name], problems[name]) for name in tool_names}
+
+    @staticmethod
+    def _hash(path: str) -> Optional[str]:
+        try:
+            return hash_file(path)
+        except OSError:
+            return None
@@ -0,0 +1,216 @@
+"""
+Upstream version resolution for tool definitions.
+
+A tool may take its version from its upstream releases instead of
+hard-coding it:
+
+    "version": {"github": "helm/helm", "spec": ">=3.13.0,<4.0.0", "default": "3.13.0"}
+
+and then use {version} in its steps, e.g.
+"https://get.helm.sh/helm-v{version}-linux-amd64.tar.gz". The version is
+the highest release whose tag matches "tag_regex" (default: v1.2.3 or
+1.2.3, so pre-releases are left out) and satisfies "spec". Drafts and
+releases marked as pre-releases are skipped. "default" is used when the
+feed cannot be reached.
+
+Resolved versions are pinned in downloads/versions.lock.json. Later
+downloads reuse the pinned version until the tool's version definition
+changes or an update is requested, and installs read the same lockfile,
+which travels with the bundle into the airgap, so a tool is installed at
+exactly the version that was downloaded.
+
+Release feeds of several tools are queried concurrently over one
+keep-alive connection pool, and responses are cached with a TTL (see
+http_cache), so resolving versions on every run costs no requests while
+the cache is fresh. The GitHub API base URL can be overridden with
+RELAY_GITHUB_API, e.g. to point at a local stand-in; GITHUB_TOKEN is sent
+when set, to lift GitHub's rate limit.
+"""
+
+import os
+import re
+import json
+import time
+import threading
+import urllib.error
+import http.client
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional
+
+from toolbox.http_client import ConnectionPool
+from toolbox.http_cache import HTTPCache
+from toolbox.download_collections import parse_version, version_matches
+
+LOCK_FILENAME = 'versions.lock.json'
+LOCK_VERSION = 1
+GITHUB_API = 'https://api.github.com'
+DEFAULT_TAG_REGEX = r'v?(\d+\.\d+\.\d+)'
+# Release listings are cached this long before being revalidated
+FEED_TTL = 3600
+FEED_WORKERS = 8
+RELEASES_PER_PAGE = 100
+VERSION_KEYS = ('github', 'spec', 'default', 'tag_regex')
+
+
+def validate_version(definition: Any) -> List[str]:
+    """Returns the problems of a tool's "version" object."""
+    if not isinstance(definition, dict):
+        return ["'version' is not an object"]
+    problems = [f"unknown version key '{key}'" for key in definition if key not in VERSION_KEYS]
+    if not isinstance(definition.get('github'), str) or definition['github'].count('/') != 1:
+        problems.append("'version' needs 'github' as owner/repo")
+    if not isinstance(definition.get('default'), str):
+        problems.append("'version' needs a 'default' version")
+    try:
+        re.compile(definition.get('tag_regex', DEFAULT_TAG_REGEX))
+    except re.error as e:
+        problems.append(f"invalid 'tag_regex': {e}")
+    return problems
+
+
+def _source(definition: Dict[str, Any]) -> str:
+    return f"github:{definition['github']}"
+
+
+class VersionResolver:
+    """Resolves, pins and looks up the versions of tools with a "version" definition."""
+
+    def __init__(self, lock_path: str, cache: Optional[HTTPCache] = None, pool: Optional[ConnectionPool] = None,
+                 github_api: Optional[str] = None, workers: int = FEED_WORKERS):
+        self.lock_path = lock_path
+        self.cache = cache if cache is not None else HTTPCache(ttl=FEED_TTL)
+        self.github_api = (github_api or os.environ.get('RELAY_GITHUB_API') or GITHUB_API).rstrip('/')
+        self.workers = workers
+        self._pool = pool
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._entries = self._load()
+
+    @property
+    def pool(self) -> ConnectionPool:
+        if self._pool is None:
+            headers = {'Accept': 'application/vnd.github+json', 'User-Agent': 'relay'}
+            if os.environ.get('GITHUB_TOKEN'):
+                headers['Authorization'] = f"Bearer {os.environ['GITHUB_TOKEN']}"
+            self._pool = ConnectionPool(headers=headers)
+        return self._pool
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            with open(self.lock_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') == LOCK_VERSION:
+                return data.get('tools', {})
+        except (OSError, ValueError):
+            pass
+        return {}
+
+    def releases(self, definition: Dict[str, Any]) -> List[str]:
+        """Versions of every published, non-draft, non-prerelease release of the feed, in feed order."""
+        url = f"{self.github_api}/repos/{definition['github']}/releases?per_page={RELEASES_PER_PAGE}"
+        pattern = re.compile(definition.get('tag_regex', DEFAULT_TAG_REGEX))
+        versions = []
+        for release in self.cache.get_json(self.pool, url):
+            if release.get('draft') or release.get('prerelease'):
+                continue
+            match = pattern.fullmatch(release.get('tag_name') or '')
+            if match:
+                versions.append(match.group(1) if pattern.groups else match.group(0))
+        return versions
+
+    def latest(self, definition: Dict[str, Any]) -> Optional[str]:
+        """The highest release satisfying the definition's spec, or None."""
+        spec = definition.get('spec', '*')
+        candidates = [v for v in self.releases(definition) if version_matches(v, spec)]
+        return max(candidates, key=parse_version) if candidates else None
+
+    def locked(self, tool: Dict[str, Any], resolved_only: bool = False) -> Optional[str]:
+        """
+        The version pinned for tool, if it was pinned for its current version
+        definition. With resolved_only, defaults pinned while the feed was
+        unavailable don't count.
+        """
+        definition = tool.get('version')
+        with self._lock:
+            entry = self._entries.get(tool['name'])
+        if not definition or not entry or (resolved_only and not entry.get('resolved')):
+            return None
+        if entry.get('source') != _source(definition) or entry.get('spec') != definition.get('spec', '*'):
+            return None
+        return entry.get('version')
+
+    def version_for(self, tool: Dict[str, Any]) -> Optional[str]:
+        """The version to use for tool: pinned if possible, otherwise its default."""
+        definition = tool.get('version')
+        if not definition:
+            return None
+        return self.locked(tool) or definition.get('default')
+
+    def _pin(self, tool: Dict[str, Any], version: str, resolved: bool):
+        definition = tool['version']
+        with self._lock:
+            self._entries[tool['name']] = {
+                'version': version,
+                'source': _source(definition),
+                'spec': definition.get('spec', '*'),
+                'resolved': resolved,
+                'updated': time.time(),
+            }
+            self._dirty = True
+
+    def resolve(self, tools: Iterable[Dict[str, Any]], update: bool = False) -> Dict[str, str]:
+        """
+        Returns {tool name: version} for the tools with a version definition.
+        Pinned versions are kept unless update is True; the others are looked
+        up concurrently and pinned. A tool whose feed fails keeps its pinned
+        version, or gets its default, which is looked up again next time.
+        """
+        tools = [tool for tool in tools if tool.get('version')]
+        versions = {}
+        pending = []
+        for tool in tools:
+            pinned = None if update else self.locked(tool, resolved_only=True)
+            if pinned:
+                versions[tool['name']] = pinned
+            else:
+                pending.append(tool)
+
+        def lookup(tool):
+            try:
+                return tool, self.latest(tool['version']), None
+            except (urllib.error.URLError, http.client.HTTPException, OSError, ValueError) as e:
+                return tool, None, e
+
+        if pending:
+            with ThreadPoolExecutor(max_workers=max(1, min(self.workers, len(pending)))) as pool:
+                for tool, version, error in pool.map(lookup, pending):
+                    if version:
+                        self._pin(tool, version, True)
+                        versions[tool['name']] = version
+                        continue
+                    fallback = self.locked(tool) or tool['version']['default']
+                    reason = f"feed unavailable ({error})" if error else "no release matches"
+                    print(f"{tool['name']}: {reason}; using version {fallback}")
+                    if not self.locked(tool):
+                        self._pin(tool, fallback, False)
+                    versions[tool['name']] = fallback
+        return versions
+
+    def save(self):
+        """Writes the lockfile if any version was pinned."""
+        with self._lock:
+            if not self._dirty:
+                return
+            os.makedirs(os.path.dirname(os.path.abspath(self.lock_path)), exist_ok=True)
+            tmp_path = f"{self.lock_path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'version': LOCK_VERSION, 'tools': self._entries}, f, indent=2, sort_keys=True)
+                f.write("\n")
+            os.replace(tmp_path, self.lock_path)
+            self._dirty = False
+
+    def close(self):
+        """Closes the feed connections, if any were opened."""
+        if self._pool is not None:
+            self._pool.close()
+            self._pool = None